@@ -0,0 +1,172 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Writes the events of a run as a Chrome trace ('<name>.trace.json'),
+# which chrome://tracing and Perfetto (ui.perfetto.dev) open quickly
+# even for long runs.  The file is in the Trace Event json array
+# format, one trace event per line, written as events are matched:
+#    [
+#    {...trace event...},
+#    ...
+#    ]
+# Both tools read files that stop without the closing bracket, so
+# a run that stops early still leaves its trace behind.  Each server
+# is a thread, named after the server, showing:
+# - the server's state (PRIMARY, SECONDARY, DOWN...) as spans
+# - every event with the server as target, as an instant
+# - fsync locks as spans of their own ("lock" category)
+# - syncs as flow arrows from the syncing server to its source
+
+import json
+import logging
+
+from datetime import datetime
+
+LOGGER = logging.getLogger(__name__)
+
+TRACE_SUFFIX = ".trace.json"
+# all servers are threads of one process
+PID = 1
+# events written between flushes of the output file
+FLUSH_EVERY = 1000
+
+
+def timestamp(date):
+    """Returns a datetime as microseconds since the epoch,
+    the unit of trace timestamps."""
+    delta = date - datetime(1970, 1, 1)
+    return ((delta.days * 86400 + delta.seconds) * 1000000 +
+            delta.microseconds)
+
+
+def thread_id(server):
+    """Returns the thread of a server_num in the trace."""
+    try:
+        return int(server)
+    except ValueError:
+        return abs(hash(server))
+
+
+class TraceWriter(object):
+    """Writes events to an open file as they are matched, as
+    a Chrome trace, flushing it every 'flush_every' events."""
+
+    def __init__(self, out, flush_every=FLUSH_EVERY):
+        self.out = out
+        self.flush_every = flush_every
+        self.count = 0
+        # server -> (state, start) of the state span in progress
+        self.states = {}
+        # servers holding an fsync lock
+        self.locks = set()
+        self.flows = 0
+        self.last = None
+        self.out.write("[\n")
+
+    def write(self, trace_event):
+        """Writes one trace event."""
+        if self.count:
+            self.out.write(",")
+        self.out.write(json.dumps(trace_event))
+        self.out.write("\n")
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.out.flush()
+
+    def span(self, server, state, start, end):
+        """Writes a span of a server's state."""
+        self.write({"name": state, "cat": "state", "ph": "X",
+                    "ts": start, "dur": max(end - start, 1),
+                    "pid": PID, "tid": thread_id(server)})
+
+    def set_state(self, server, state, ts):
+        """Ends the state span of a server in progress, if it
+        changed, and starts a span of its new state."""
+        previous = self.states.get(server)
+        if previous and previous[0] == state:
+            return
+        if previous:
+            self.span(server, previous[0], previous[1], ts)
+        self.states[server] = (state, ts)
+
+    def lock(self, server, locked, ts):
+        """Starts or ends the fsync lock span of a server."""
+        if locked == (server in self.locks):
+            return
+        if locked:
+            self.locks.add(server)
+        else:
+            self.locks.remove(server)
+        self.write({"name": "LOCKED", "cat": "lock",
+                    "ph": "b" if locked else "e", "id": thread_id(server),
+                    "ts": ts, "pid": PID, "tid": thread_id(server)})
+
+    def write_event(self, e):
+        """Writes the trace events of one matched event."""
+        ts = timestamp(e["date"])
+        target = str(e["target"])
+        self.last = ts
+        if e["type"] == "status":
+            self.set_state(target, e["state"], ts)
+        elif e["type"] == "exit":
+            self.set_state(target, "DOWN", ts)
+        elif e["type"] in ["LOCKED", "FSYNC"]:
+            self.lock(target, True, ts)
+        elif e["type"] == "UNLOCKED":
+            self.lock(target, False, ts)
+        self.write({"name": e["type"], "cat": "event", "ph": "i",
+                    "s": "t", "ts": ts, "pid": PID,
+                    "tid": thread_id(target),
+                    "args": {"summary": e["summary"],
+                             "witnesses": e["witnesses"],
+                             "dissenters": e["dissenters"]}})
+        if e["type"] == "sync":
+            self.flows += 1
+            self.write({"name": "sync", "cat": "sync", "ph": "s",
+                        "id": self.flows, "ts": ts, "pid": PID,
+                        "tid": thread_id(target)})
+            self.write({"name": "sync", "cat": "sync", "ph": "f",
+                        "bp": "e", "id": self.flows, "ts": ts + 1,
+                        "pid": PID, "tid": thread_id(e["sync_to"])})
+
+    def traced(self, events):
+        """Writes each event from an iterable, passing it on"""
+        for e in events:
+            self.write_event(e)
+            yield e
+
+    def close(self, names):
+        """Ends the spans still in progress at the last event,
+        names each server's thread after the server, as given
+        by 'names' (see get_server_names()), and closes the file.
+        """
+        for server in sorted(self.states):
+            state, start = self.states[server]
+            self.span(server, state, start, self.last)
+        for server in sorted(self.locks):
+            self.lock(server, False, self.last)
+        for server, self_name in sorted(names["self_name"].items()):
+            name = self_name
+            if name == "unknown":
+                name = names["network_name"].get(server, server)
+            self.write({"name": "thread_name", "ph": "M", "pid": PID,
+                        "tid": thread_id(server),
+                        "args": {"name": "{0} ({1})".format(name, server)}})
+        self.write({"name": "process_name", "ph": "M", "pid": PID,
+                    "args": {"name": "edda"}})
+        self.out.write("]\n")
+        self.out.close()
+        LOGGER.debug("Wrote {0} trace events".format(self.count))
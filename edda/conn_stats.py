@@ -0,0 +1,144 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Busy servers log thousands of connections per second, so
+# instead of storing one entry per connection edda aggregates
+# them into one entry per server per time bucket:
+# doc = {
+#    "date" : date of the last connection message in the bucket
+#    "type" : "conn_stats"
+#    "origin_server" : server_num
+#    "info" : {
+#          "server"   : "self"
+#          "start"    : start of the bucket, datetime
+#          "width"    : length of the bucket, in seconds
+#          "opened"   : connections opened during the bucket
+#          "closed"   : connections closed during the bucket
+#          "open"     : connections open at the end of the bucket
+#          "max_open" : most connections open at once during the bucket
+#          "clients"  : [ [host, connections opened], ...] busiest first
+#     }
+# }
+# The number of open connections is counted from the start of
+# each log file, so it is only a lower bound for servers whose
+# log starts while connections are already open.
+
+import logging
+
+from datetime import timedelta
+
+LOGGER = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 60
+TOP_CLIENTS = 5
+
+
+def new_tracker(width=BUCKET_SECONDS):
+    """Returns an empty connection tracker, aggregating
+    connections into buckets of 'width' seconds.
+    """
+    tracker = {}
+    tracker["width"] = width
+    tracker["buckets"] = {}
+    tracker["open"] = {}
+    return tracker
+
+
+def bucket_start(date, width):
+    """Returns the start of the bucket containing date."""
+    seconds = date.hour * 3600 + date.minute * 60 + date.second
+    start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start + timedelta(seconds=seconds - seconds % width)
+
+
+def new_bucket(server_num, start, width, open_conns):
+    """Returns an empty bucket for this server."""
+    doc = {}
+    doc["date"] = start
+    doc["type"] = "conn_stats"
+    doc["origin_server"] = server_num
+    doc["info"] = {}
+    doc["info"]["server"] = "self"
+    doc["info"]["start"] = start
+    doc["info"]["width"] = width
+    doc["info"]["opened"] = 0
+    doc["info"]["closed"] = 0
+    doc["info"]["open"] = open_conns
+    doc["info"]["max_open"] = open_conns
+    doc["info"]["clients"] = {}
+    return doc
+
+
+def add_conn(tracker, server_num, doc, entries):
+    """Adds a 'conn' document from the conn_msg filter to the
+    tracker.  Buckets are stored in 'entries' as soon as a later
+    bucket is started for the same server.  Returns the number
+    of documents stored.
+    """
+    info = doc["info"]
+    if not "conn_addr" in info:
+        LOGGER.debug("Skipping malformed connection message")
+        return 0
+    stored = 0
+    width = tracker["width"]
+    start = bucket_start(doc["date"], width)
+    bucket = tracker["buckets"].get(server_num)
+    if bucket and bucket["info"]["start"] != start:
+        entries.insert(finish_bucket(bucket))
+        stored += 1
+        bucket = None
+    open_conns = tracker["open"].get(server_num, 0)
+    if not bucket:
+        bucket = new_bucket(server_num, start, width, open_conns)
+        tracker["buckets"][server_num] = bucket
+    bucket["date"] = doc["date"]
+
+    if info["subtype"] == "new_conn":
+        open_conns += 1
+        bucket["info"]["opened"] += 1
+        host = info["conn_addr"].rsplit(":", 1)[0]
+        clients = bucket["info"]["clients"]
+        clients[host] = clients.get(host, 0) + 1
+    else:
+        open_conns = max(0, open_conns - 1)
+        bucket["info"]["closed"] += 1
+    tracker["open"][server_num] = open_conns
+    bucket["info"]["open"] = open_conns
+    bucket["info"]["max_open"] = max(bucket["info"]["max_open"], open_conns)
+    return stored
+
+
+def flush(tracker, entries):
+    """Stores all unfinished buckets in 'entries'.  Returns
+    the number of documents stored.
+    """
+    stored = 0
+    for server_num in sorted(tracker["buckets"]):
+        entries.insert(finish_bucket(tracker["buckets"][server_num]))
+        stored += 1
+    tracker["buckets"] = {}
+    return stored
+
+
+def finish_bucket(bucket):
+    """Replaces the bucket's client counts with a list of its
+    busiest clients, and returns the bucket.
+    """
+    clients = bucket["info"]["clients"]
+    if isinstance(clients, dict):
+        top = sorted(clients.items(), key=lambda c: (-c[1], c[0]))
+        bucket["info"]["clients"] = [list(c) for c in top[:TOP_CLIENTS]]
+    return bucket
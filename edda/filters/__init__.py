@@ -12,10 +12,163 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import rs_status
-import rs_exit
-import rs_sync
-import rs_reconfig
-import fsync_lock
-import init_and_listen
-import stale_secondary
+# Registry of the filters log lines are passed through.
+# Filters are found automatically: every module in this package
+# (except template.py, which documents how to write one) and every
+# module or object registered under the ENTRY_POINT_GROUP entry
+# point group by other installed packages.  A filter has a
+# process(msg, date) function, and may declare:
+#    NAME        : name of the filter (default: its module name)
+#    TRIGGERS    : strings, one of which every line the filter
+#                  matches contains.  Lines without any of them are
+#                  not passed to process().  (default: every line)
+#    EVENT_TYPES : types of the documents the filter returns
+#    PRIORITY    : filters are tried in increasing order of
+#                  priority, until one returns a document
+#                  (default: DEFAULT_PRIORITY)
+#    DEFAULT     : False if the filter only runs when asked for
+#                  (default: True)
+# The registry keeps one document per filter:
+# filter = {
+#    "name", "triggers", "event_types", "priority", "default"
+#    "process"  : the process function
+#    "calls"    : lines passed to process()
+#    "matches"  : documents returned by process()
+#    "time"     : seconds spent in process()
+# }
+# Runs reading logs at the same time, as in batch mode, keep these
+# statistics apart, in dictionaries made by new_stats().
+
+import logging
+import pkgutil
+import time
+
+try:
+    import pkg_resources
+except ImportError:
+    pkg_resources = None
+
+LOGGER = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "edda.filters"
+DEFAULT_PRIORITY = 100
+# modules of this package that are not filters
+NOT_FILTERS = ["template"]
+
+FILTERS = {}
+
+
+def register(process, name, triggers=None, event_types=(),
+             priority=DEFAULT_PRIORITY, default=True):
+    """Adds a filter to the registry, replacing any
+    filter of the same name.  Returns the filter document.
+    """
+    f = {}
+    f["name"] = name
+    f["process"] = process
+    f["triggers"] = list(triggers) if triggers else None
+    f["event_types"] = list(event_types)
+    f["priority"] = priority
+    f["default"] = default
+    f["calls"] = 0
+    f["matches"] = 0
+    f["time"] = 0.0
+    if name in FILTERS:
+        LOGGER.info("Replacing filter {0}".format(name))
+    FILTERS[name] = f
+    return f
+
+
+def register_module(module, name=None):
+    """Adds a filter module, or any object with a process
+    function, using the attributes it declares."""
+    if not name:
+        name = getattr(module, "__name__", "").rsplit(".", 1)[-1]
+    return register(module.process,
+                    getattr(module, "NAME", name),
+                    getattr(module, "TRIGGERS", None),
+                    getattr(module, "EVENT_TYPES", ()),
+                    getattr(module, "PRIORITY", DEFAULT_PRIORITY),
+                    getattr(module, "DEFAULT", True))
+
+
+def discover():
+    """Registers the filters of this package and of the entry
+    points of installed packages.  Returns the names of the
+    modules of this package that were registered.
+    """
+    names = []
+    for loader, name, is_pkg in pkgutil.iter_modules(__path__):
+        if name in NOT_FILTERS or name.startswith("_"):
+            continue
+        module = __import__(__name__ + "." + name, fromlist=[name])
+        register_module(module)
+        names.append(name)
+    if pkg_resources:
+        for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+            try:
+                register_module(entry_point.load(), entry_point.name)
+            except Exception as e:
+                LOGGER.warning("Unable to load filter {0}: {1}"
+                               .format(entry_point.name, e))
+    return names
+
+
+def enabled_filters(extra=()):
+    """Returns the filters that run by default, and those
+    named in 'extra', in the order they are tried."""
+    filters = [f for f in FILTERS.values()
+               if f["default"] or f["name"] in extra]
+    for name in extra:
+        if not name in FILTERS:
+            LOGGER.warning("No filter named {0}".format(name))
+    return sorted(filters, key=lambda f: (f["priority"], f["name"]))
+
+
+def new_stats(filters):
+    """Returns zeroed statistics for each of the given filters,
+    keyed by filter name, for run_filters() to update."""
+    stats = {}
+    for f in filters:
+        stats[f["name"]] = {"name": f["name"], "calls": 0,
+                            "matches": 0, "time": 0.0}
+    return stats
+
+
+def run_filters(msg, date, filters, stats=None):
+    """Passes the message through the given filters, and
+    returns the document of the first filter it matches,
+    or None.  The statistics of each filter are updated in
+    'stats', as made by new_stats(), if given, and otherwise
+    in the registry."""
+    for f in filters:
+        triggers = f["triggers"]
+        if triggers:
+            for trigger in triggers:
+                if trigger in msg:
+                    break
+            else:
+                continue
+        if stats is None:
+            counts = f
+        else:
+            counts = stats[f["name"]]
+        start = time.time()
+        doc = f["process"](msg, date)
+        counts["time"] += time.time() - start
+        counts["calls"] += 1
+        if doc:
+            counts["matches"] += 1
+            return doc
+    return None
+
+
+def reset_stats():
+    """Zeroes the statistics of every filter."""
+    for f in FILTERS.values():
+        f["calls"] = 0
+        f["matches"] = 0
+        f["time"] = 0.0
+
+
+__all__ = discover()
@@ -21,6 +21,13 @@ START_CONN_NUMBER = re.compile("#[0-9]+")
 END_CONN_NUMBER = re.compile("\[conn[0-9]+\]")
 ANY_NUMBER = re.compile("[0-9]+")
 
+NAME = "conn_msg"
+TRIGGERS = ["connection accepted", "end connection"]
+EVENT_TYPES = ["conn"]
+PRIORITY = 80
+# only run when connections are tracked (--conns)
+DEFAULT = False
+
 
 def criteria(msg):
     """Determing if the given message is an instance
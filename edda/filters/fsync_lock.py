@@ -12,6 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+NAME = "fsync_lock"
+TRIGGERS = ["command: unlock requested", "CMD fsync: sync:1 lock:1",
+            "db is now locked"]
+EVENT_TYPES = ["fsync"]
+PRIORITY = 20
+
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
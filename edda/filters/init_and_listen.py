@@ -22,6 +22,11 @@ PORT_NUMBER = re.compile("port=[0-9]{1,5}")
 # global logger
 LOGGER = logging.getLogger(__name__)
 
+NAME = "init_and_listen"
+TRIGGERS = ["[initandlisten] MongoDB starting", "db version"]
+EVENT_TYPES = ["init"]
+PRIORITY = 40
+
 
 def criteria(msg):
     """ Does the given log line fit the criteria for this filter?
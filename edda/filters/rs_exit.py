@@ -14,6 +14,11 @@
 
 #!/usr/bin/env python
 
+NAME = "rs_exit"
+TRIGGERS = ["dbexit: really exiting now"]
+EVENT_TYPES = ["exit"]
+PRIORITY = 60
+
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
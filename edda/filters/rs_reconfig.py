@@ -12,6 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+NAME = "rs_reconfig"
+TRIGGERS = ["replSetReconfig"]
+EVENT_TYPES = ["reconfig"]
+PRIORITY = 70
+
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
@@ -14,46 +14,66 @@
 
 #!/usr/bin/env python
 
-from edda.supporting_methods import capture_address
+import re
+
+NAME = "rs_status"
+TRIGGERS = ["replSet "]
+EVENT_TYPES = ["status"]
+PRIORITY = 10
+
+LABELS = ["STARTUP1", "PRIMARY", "SECONDARY",
+          "RECOVERING", "FATAL", "STARTUP2",
+          "UNKNOWN", "ARBITER", "DOWN", "ROLLBACK",
+          "REMOVED"]
+CODES = dict((label, code) for code, label in enumerate(LABELS))
+
+# one anchored pattern per message shape, each matched right
+# after the "replSet " token.  'addr' is the address the message
+# is about, if any, and 'state' the new state of that server
+_ADDR = r"(?P<addr>\S+:[0-9]{1,5})"
+_STATE = "(?P<state>" + "|".join(LABELS[1:]) + ")"
+SHAPES = [
+    # replSet I am host:port
+    re.compile("I am(?: " + _ADDR + r")?\s*$"),
+    # replSet member host:port is now in state SECONDARY
+    # replSet member host:port has been REMOVED
+    re.compile("member (?:" + _ADDR + " )?"
+               "(?:is now in state|has been) " + _STATE + r"\s*$"),
+    # replSet encountered a FATAL ERROR, replSet FATAL ...
+    re.compile(r"(?:member )?(?:encountered (?:a )?)?(?P<state>FATAL)\b"),
+    # replSet PRIMARY, replSet is RECOVERING
+    re.compile("(?:is )?" + _STATE + r"\s*$")
+]
+TOKEN = "replSet "
+
+
+def match(msg):
+    """Matches the given log line against the known replSet
+    status messages.  Returns a (state code, address) tuple,
+    where address is None if the message does not name a server,
+    or None if the line is not a status message.
+    """
+    pos = msg.find(TOKEN)
+    # the token must start the message, after the date and thread
+    if pos < 0 or (pos > 0 and msg[pos - 2:pos] != "] "):
+        return None
+    pos += len(TOKEN)
+    for shape in SHAPES:
+        m = shape.match(msg, pos)
+        if m:
+            groups = m.groupdict()
+            return CODES[groups.get("state") or "STARTUP1"], groups.get("addr")
+    return None
 
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
     If yes, return an integer code.  Otherwise, return -1.
     """
-    # state STARTUP1
-    if '[rsStart] replSet I am' in msg:
-        return 0
-    # state PRIMARY
-    if 'PRIMARY' in msg:
-        return 1
-    # state SECONDARY
-    if 'SECONDARY' in msg:
-        return 2
-    # state RECOVERING
-    if 'RECOVERING' in msg:
-        return 3
-    # state FATAL ERROR
-    if 'FATAL' in msg:
-        return 4
-    # state STARTUP2
-    if 'STARTUP2' in msg:
-        return 5
-    # state UNKNOWN
-    if 'UNKNOWN' in msg:
-        return 6
-    # state ARBITER
-    if 'ARBITER' in msg:
-        return 7
-    # state DOWN
-    if 'DOWN' in msg:
-        return 8
-    # state ROLLBACK
-    if 'ROLLBACK' in msg:
-        return 9
-    # state REMOVED
-    if 'REMOVED' in msg:
-        return 10
+    m = match(msg)
+    if not m:
+        return -1
+    return m[0]
 
 
 def process(msg, date):
@@ -72,30 +92,26 @@ def process(msg, date):
           }
     }
     """
-    result = criteria(msg)
-    if result < 0:
+    m = match(msg)
+    if not m:
         return None
-    labels = ["STARTUP1", "PRIMARY", "SECONDARY",
-              "RECOVERING", "FATAL", "STARTUP2",
-              "UNKNOWN", "ARBITER", "DOWN", "ROLLBACK",
-              "REMOVED"]
+    result, addr = m
     doc = {}
     doc["date"] = date
     doc["type"] = "status"
     doc["info"] = {}
     doc["msg"] = msg
     doc["info"]["state_code"] = result
-    doc["info"]["state"] = labels[result]
+    doc["info"]["state"] = LABELS[result]
 
-    # if this is a startup message, and includes server address, do something special!!!
-    # add an extra field to capture the IP
-    n = capture_address(msg[20:])
-    if n:
+    # a startup message names the server itself: keep its
+    # address in an extra field
+    if addr:
         if result == 0:
             doc["info"]["server"] = "self"
-            doc["info"]["addr"] = n
+            doc["info"]["addr"] = addr
         else:
-            doc["info"]["server"] = n
+            doc["info"]["server"] = addr
     else:
         # if no server found, assume self is target
         doc["info"]["server"] = "self"
@@ -17,6 +17,11 @@
 
 import logging
 
+NAME = "rs_sync"
+TRIGGERS = ["[rsSync]"]
+EVENT_TYPES = ["sync"]
+PRIORITY = 30
+
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
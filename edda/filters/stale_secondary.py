@@ -12,6 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+NAME = "stale_secondary"
+TRIGGERS = ["too stale to catch up"]
+EVENT_TYPES = ["stale"]
+PRIORITY = 50
+
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
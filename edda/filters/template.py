@@ -14,6 +14,21 @@
 
 #!/usr/bin/env python
 
+# Filters in this directory are found and registered automatically
+# (see __init__.py).  Filters in other packages can be registered
+# under the "edda.filters" entry point group.
+# name of the filter, used in statistics (default: module name)
+NAME = "your_filter_name"
+# strings, one of which every matching line contains
+# (lines without any of them are not passed to process())
+TRIGGERS = ["some text"]
+# values of "type" in the documents this filter returns
+EVENT_TYPES = ["your_filter_name"]
+# filters are tried in increasing order of priority
+PRIORITY = 100
+# set to False for filters that only run when asked for
+DEFAULT = True
+
 
 def criteria(msg):
     """Does the given log line fit the criteria for this filter?
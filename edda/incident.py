@@ -0,0 +1,164 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# A compact binary file holding a processed incident, that
+# can be reopened without reading all of its frames.
+# An incident file is laid out as follows:
+#    header  : HEADER, see below
+#    frames  : one zlib compressed json document per frame
+#    table   : frame_count + 1 little-endian unsigned 64 bit
+#              offsets, where frame i is stored between
+#              offsets i and i + 1
+#    meta    : zlib compressed json {"names": ..., "admin": ...}
+# header = {
+#    magic         : MAGIC
+#    version       : INCIDENT_VERSION
+#    frame_count   : number of frames
+#    table_offset  : offset of the frame offset table
+#    meta_offset   : offset of the meta document, which
+#                    runs to the end of the file
+# }
+# Frames are written as they are generated and the header is
+# rewritten once they are all written, so a file is only valid
+# once write_incident() returns.
+
+import json
+import logging
+import mmap
+import struct
+import zlib
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = "EDDA"
+INCIDENT_VERSION = 1
+INCIDENT_SUFFIX = ".edda"
+HEADER = struct.Struct("<4sHHIQQ")
+OFFSET = struct.Struct("<Q")
+
+
+def is_incident(path):
+    """Returns True if the file at path is an incident file."""
+    try:
+        f = open(path, "rb")
+        magic = f.read(len(MAGIC))
+        f.close()
+    except IOError:
+        return False
+    return magic == MAGIC
+
+
+def write_incident(path, frames, names, admin):
+    """Writes an incident file from frames, given in order
+    as any iterable, and the names and admin dictionaries.
+    Returns the number of frames written.
+    """
+    out = open(path, "wb")
+    out.write(HEADER.pack(MAGIC, INCIDENT_VERSION, 0, 0, 0, 0))
+    offsets = [HEADER.size]
+    for frame in frames:
+        out.write(zlib.compress(json.dumps(frame, separators=(",", ":"))))
+        offsets.append(out.tell())
+    table_offset = out.tell()
+    for offset in offsets:
+        out.write(OFFSET.pack(offset))
+    meta_offset = out.tell()
+    meta = {"names": names, "admin": admin}
+    out.write(zlib.compress(json.dumps(meta, separators=(",", ":"))))
+    frame_count = len(offsets) - 1
+    out.seek(0)
+    out.write(HEADER.pack(MAGIC, INCIDENT_VERSION, 0,
+                          frame_count, table_offset, meta_offset))
+    out.close()
+    LOGGER.debug("Wrote {0} frames to {1}".format(frame_count, path))
+    return frame_count
+
+
+def open_incident(path):
+    """Opens an incident file, and returns a tuple of
+    (frames, names, admin), where frames is an IncidentFrames.
+    Raises ValueError if the file is not a valid incident file.
+    """
+    frames = IncidentFrames(path)
+    meta = json.loads(zlib.decompress(frames.data[frames.meta_offset:]))
+    return frames, meta["names"], meta["admin"]
+
+
+class IncidentFrames(object):
+    """Read-only dictionary of the frames in an incident file,
+    keyed by frame number as a string like the dictionary returned
+    by generate_frames().  The file is memory mapped, and frames
+    are only decompressed when they are looked up.
+    """
+
+    def __init__(self, path):
+        f = open(path, "rb")
+        try:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error) as e:
+            raise ValueError("{0} is not an incident file: {1}"
+                             .format(path, e))
+        finally:
+            f.close()
+        if len(self.data) < HEADER.size:
+            raise ValueError("{0} is not an incident file".format(path))
+        (magic, version, flags, self.count,
+         self.table_offset, self.meta_offset) = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError("{0} is not an incident file".format(path))
+        if version != INCIDENT_VERSION:
+            raise ValueError("{0} has unsupported incident version {1}"
+                             .format(path, version))
+        if self.table_offset == 0:
+            raise ValueError("{0} was not completely written".format(path))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        try:
+            n = int(key)
+        except ValueError:
+            return False
+        return 0 <= n < self.count
+
+    def __getitem__(self, key):
+        return json.loads(self.raw(key))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [str(n) for n in range(self.count)]
+
+    def itervalues(self):
+        """Generates the frames in order"""
+        for n in range(self.count):
+            yield self[str(n)]
+
+    def raw(self, key):
+        """Returns the json of frame 'key', as a string"""
+        if not key in self:
+            raise KeyError(key)
+        n = int(key)
+        start = OFFSET.unpack_from(self.data,
+                                   self.table_offset + n * OFFSET.size)[0]
+        end = OFFSET.unpack_from(self.data,
+                                 self.table_offset + (n + 1) * OFFSET.size)[0]
+        return zlib.decompress(self.data[start:end])
+
+    def close(self):
+        self.data.close()
@@ -0,0 +1,251 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Records per-stage timings and counters for a run of edda.
+# A stage is stored as a document of the following format:
+# stage = {
+#    "name"      : name of the stage
+#    "wall"      : wall clock seconds spent in the stage
+#    "cpu"       : user + system CPU seconds spent in the stage
+#    "peak_rss"  : peak resident set size of the process at
+#                  the end of the stage, in kilobytes
+#    "counters"  : {
+#          counter_name : int, ("lines_read", "documents_written"...)
+#     }
+#    "matches"   : {
+#          filter_name : number of lines matched by that filter
+#     }
+#    "filter_time" : {
+#          filter_name : seconds spent in that filter
+#     }
+#    "latency"   : {
+#          operation : {"count": times it was done,
+#                       "seconds": total seconds it took}
+#     }
+# }
+# Stages may run in several threads at once, as when clusters
+# are processed in batch mode; their times then add up.
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+LOGGER = logging.getLogger(__name__)
+
+STAGES = []
+STATS = {}
+RUNNING = {}
+LOCK = threading.Lock()
+
+
+def reset():
+    """Forget all recorded stages."""
+    del STAGES[:]
+    STATS.clear()
+    RUNNING.clear()
+
+
+def get_stage(name):
+    """Returns the stats document for stage 'name',
+    creating an empty one if necessary.
+    """
+    if not name in STATS:
+        STATS[name] = {"name": name,
+                       "wall": 0.0,
+                       "cpu": 0.0,
+                       "peak_rss": 0,
+                       "counters": {},
+                       "matches": {},
+                       "filter_time": {},
+                       "latency": {}}
+        STAGES.append(name)
+    return STATS[name]
+
+
+def start_stage(name):
+    """Starts timing stage 'name'.  Restarting a stage
+    that has already ended adds to its existing totals.
+    """
+    with LOCK:
+        get_stage(name)
+        RUNNING[running_key(name)] = (time.time(), cpu_time())
+
+
+def end_stage(name):
+    """Stops timing stage 'name' and records the time
+    spent since start_stage() was called for it.
+    """
+    key = running_key(name)
+    if not key in RUNNING:
+        LOGGER.debug("Stage {0} was never started".format(name))
+        return
+    with LOCK:
+        wall, cpu = RUNNING.pop(key)
+        doc = get_stage(name)
+        doc["wall"] += time.time() - wall
+        doc["cpu"] += cpu_time() - cpu
+        doc["peak_rss"] = max(doc["peak_rss"], peak_rss())
+    LOGGER.debug("Stage {0} took {1:.3f}s".format(name, doc["wall"]))
+
+
+def running_key(name):
+    """Returns the key under which the start of stage
+    'name' is kept for the calling thread.
+    """
+    return (name, threading.current_thread().ident)
+
+
+@contextmanager
+def stage(name):
+    """Context manager timing everything run inside
+    of it as part of stage 'name'.
+    """
+    start_stage(name)
+    try:
+        yield get_stage(name)
+    finally:
+        end_stage(name)
+
+
+def count(name, counter, n=1):
+    """Adds n to 'counter' for stage 'name'."""
+    with LOCK:
+        counters = get_stage(name)["counters"]
+        counters[counter] = counters.get(counter, 0) + n
+
+
+def count_items(items, name, counter):
+    """Passes on the items of an iterable, such as a
+    generator, counting them in 'counter' for stage 'name'.
+    """
+    for item in items:
+        count(name, counter)
+        yield item
+
+
+def count_match(name, filter_name, n=1, seconds=0.0):
+    """Adds n to the number of lines matched by
+    'filter_name' during stage 'name', and 'seconds'
+    to the time spent in that filter.
+    """
+    with LOCK:
+        doc = get_stage(name)
+        doc["matches"][filter_name] = doc["matches"].get(filter_name, 0) + n
+        if seconds:
+            times = doc["filter_time"]
+            times[filter_name] = times.get(filter_name, 0.0) + seconds
+
+
+def observe(name, operation, seconds, n=1):
+    """Records that 'operation' was done n times during
+    stage 'name', taking 'seconds' in all."""
+    with LOCK:
+        latency = get_stage(name)["latency"]
+        if not operation in latency:
+            latency[operation] = {"count": 0, "seconds": 0.0}
+        latency[operation]["count"] += n
+        latency[operation]["seconds"] += seconds
+
+
+def running_stages():
+    """Returns a dictionary of the stages running now, with
+    the seconds they have been running for, added up over
+    the threads running them."""
+    now = time.time()
+    running = {}
+    with LOCK:
+        for (name, thread), (wall, cpu) in RUNNING.items():
+            running[name] = running.get(name, 0.0) + now - wall
+    return running
+
+
+def cpu_time():
+    """Returns user + system CPU seconds used by this process."""
+    t = os.times()
+    return t[0] + t[1]
+
+
+def peak_rss():
+    """Returns the peak resident set size of this process,
+    in kilobytes, or 0 if it cannot be determined.
+    """
+    if not resource:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # OS X reports bytes, Linux reports kilobytes
+    if sys.platform == "darwin":
+        rss /= 1024
+    return rss
+
+
+def current_rss():
+    """Returns the resident set size of this process now, in
+    kilobytes, where the system tells it, or else its peak."""
+    try:
+        statm = open("/proc/self/statm")
+        try:
+            pages = int(statm.read().split()[1])
+        finally:
+            statm.close()
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024
+    except (IOError, OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def report():
+    """Returns the recorded stages formatted as
+    a plain text table.
+    """
+    lines = []
+    header = "{0:<20}{1:>10}{2:>10}{3:>14}".format(
+        "stage", "wall (s)", "cpu (s)", "peak RSS (KB)")
+    lines.append(header)
+    lines.append("-" * len(header))
+    for name in STAGES:
+        doc = STATS[name]
+        lines.append("{0:<20}{1:>10.3f}{2:>10.3f}{3:>14}".format(
+            name, doc["wall"], doc["cpu"], doc["peak_rss"]))
+        for counter in sorted(doc["counters"]):
+            lines.append("    {0:<26}{1:>24}".format(
+                counter, doc["counters"][counter]))
+        for filter_name in sorted(doc["matches"]):
+            line = "    {0:<26}{1:>24}".format(
+                "matched by " + filter_name, doc["matches"][filter_name])
+            if filter_name in doc["filter_time"]:
+                line += "{0:>10.3f}s".format(doc["filter_time"][filter_name])
+            lines.append(line)
+        for operation in sorted(doc["latency"]):
+            latency = doc["latency"][operation]
+            if latency["count"]:
+                lines.append("    {0:<26}{1:>21.3f}ms".format(
+                    operation + " latency",
+                    1000 * latency["seconds"] / latency["count"]))
+    return "\n".join(lines)
+
+
+def to_json():
+    """Returns the recorded stages, in order, as a JSON string."""
+    return json.dumps([STATS[name] for name in STAGES], indent=2)
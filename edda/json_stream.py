@@ -0,0 +1,213 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Writes and reads the '.json' file of a run one frame at a time.
+# The file is a single json document, the same as dumping
+# dicts_to_json(), laid out with one frame per line:
+#    {"frames": {
+#    "0": {...frame 0...}
+#    ,"1": {...frame 1...}
+#    ...
+#    },
+#    "names": {...}, "admin": {...}}
+# Names and admin are written last, as they are only complete
+# once all frames have been generated.  If a run stops before
+# then, the frames written so far can still be read back.
+# open_json() reopens a file by scanning it once for the offset
+# of each frame, and reads frames only when they are looked up.
+
+import json
+import logging
+import mmap
+
+LOGGER = logging.getLogger(__name__)
+
+HEADER = '{"frames": {\n'
+# frames written between flushes of the output file
+FLUSH_EVERY = 100
+
+
+class FrameWriter(object):
+    """Writes frames to an open file as they are generated,
+    flushing it every 'flush_every' frames."""
+
+    def __init__(self, out, flush_every=FLUSH_EVERY):
+        self.out = out
+        self.flush_every = flush_every
+        self.count = 0
+        self.out.write(HEADER)
+
+    def write_frame(self, frame):
+        """Writes the next frame, numbered in order from 0"""
+        if self.count:
+            self.out.write(",")
+        self.out.write('"{0}": '.format(self.count))
+        self.out.write(json.dumps(frame))
+        self.out.write("\n")
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.out.flush()
+
+    def written(self, frames):
+        """Writes each frame from an iterable, passing it on"""
+        for frame in frames:
+            self.write_frame(frame)
+            yield frame
+
+    def close(self, names, admin):
+        """Writes the names and admin dictionaries, and
+        closes the file."""
+        self.out.write('},\n"names": ')
+        self.out.write(json.dumps(names))
+        self.out.write(', "admin": ')
+        self.out.write(json.dumps(admin))
+        self.out.write("}\n")
+        self.out.close()
+        LOGGER.debug("Wrote {0} frames".format(self.count))
+
+
+def iter_frames(f):
+    """Generates (frame number, frame) pairs from a file written
+    by a FrameWriter, leaving the file after the last frame.
+    Returns at the end of the frames or the end of the file.
+    """
+    for line in iter(f.readline, ""):
+        if line.startswith("}"):
+            return
+        line = line.lstrip(",")
+        key, sep, frame = line.partition(": ")
+        try:
+            yield json.loads(key), json.loads(frame)
+        except ValueError:
+            # the last line of an incomplete file
+            LOGGER.warning("Ignoring incomplete frame {0}".format(key))
+            return
+
+
+def load(f):
+    """Reads a '.json' file one frame at a time, and returns a
+    tuple of (frames, names, admin).  Files written in one piece
+    by older versions of edda are read all at once.  A file that
+    was not completely written returns the frames it holds, with
+    empty names and admin.
+    """
+    first = f.readline()
+    if first != HEADER:
+        large_dict = json.loads(first + f.read())
+        return large_dict["frames"], large_dict["names"], large_dict["admin"]
+    frames = {}
+    for key, frame in iter_frames(f):
+        frames[key] = frame
+    rest = f.read()
+    try:
+        trailer = json.loads("{" + rest)
+    except ValueError:
+        LOGGER.warning("File was not completely written, "
+                       "recovered {0} frames".format(len(frames)))
+        return frames, {}, {}
+    return frames, trailer["names"], trailer["admin"]
+
+
+def open_json(path):
+    """Opens a '.json' file without reading its frames, and returns
+    a tuple of (frames, names, admin), where frames is a JsonFrames.
+    Files written in one piece by older versions of edda are read
+    all at once, and their frames returned as a dictionary.
+    """
+    f = open(path, "r")
+    first = f.readline()
+    f.close()
+    if first != HEADER:
+        f = open(path, "r")
+        try:
+            return load(f)
+        finally:
+            f.close()
+    frames = JsonFrames(path)
+    return frames, frames.names, frames.admin
+
+
+class JsonFrames(object):
+    """Read-only dictionary of the frames in a file written by a
+    FrameWriter, keyed by frame number as a string.  The file is
+    scanned once for the position of each frame, then memory mapped,
+    and frames are only parsed when they are looked up.
+    """
+
+    def __init__(self, path):
+        # (start, end) of the json of each frame
+        self.spans = []
+        self.names = {}
+        self.admin = {}
+        f = open(path, "r")
+        offset = len(f.readline())
+        trailer = None
+        for line in iter(f.readline, ""):
+            if line.startswith("}"):
+                trailer = f.read()
+                break
+            if not line.endswith("\n"):
+                LOGGER.warning("Ignoring incomplete frame {0}"
+                               .format(len(self.spans)))
+                break
+            start = offset + line.index(": ") + 2
+            offset += len(line)
+            self.spans.append((start, offset - 1))
+        try:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            doc = json.loads("{" + trailer)
+            self.names = doc["names"]
+            self.admin = doc["admin"]
+        except (TypeError, ValueError, KeyError):
+            LOGGER.warning("File was not completely written, "
+                           "recovered {0} frames".format(len(self.spans)))
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __contains__(self, key):
+        try:
+            n = int(key)
+        except ValueError:
+            return False
+        return 0 <= n < len(self.spans)
+
+    def __getitem__(self, key):
+        return json.loads(self.raw(key))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [str(n) for n in range(len(self.spans))]
+
+    def itervalues(self):
+        """Generates the frames in order"""
+        for n in range(len(self.spans)):
+            yield self[str(n)]
+
+    def raw(self, key):
+        """Returns the json of frame 'key', as a string"""
+        if not key in self:
+            raise KeyError(key)
+        start, end = self.spans[int(key)]
+        return self.data[start:end]
+
+    def close(self):
+        self.data.close()
@@ -0,0 +1,124 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Sparse timestamp indexes for log files, so that edda can
+# start reading a large log at an arbitrary time.
+# An index is saved next to its log file, as json:
+# index = {
+#    "version"  : INDEX_VERSION
+#    "size"     : size of the log file, in bytes
+#    "mtime"    : modification time of the log file
+#    "every"    : number of lines between entries
+#    "entries"  : [ [date, offset], [date, offset]... ]
+# }
+# Offsets count uncompressed bytes, so for gzipped logs
+# seeking to an offset still decompresses everything before it,
+# but none of it is split into lines or parsed.
+
+import json
+import logging
+import os
+
+from bisect import bisect_left
+from datetime import datetime
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_EVERY = 1000
+INDEX_SUFFIX = ".eddaidx"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def index_path(log_path):
+    """Returns the path of the index for this log file."""
+    return log_path + INDEX_SUFFIX
+
+
+def new_index(log_path, every=INDEX_EVERY):
+    """Returns an empty index for this log file."""
+    info = os.stat(log_path)
+    index = {}
+    index["version"] = INDEX_VERSION
+    index["size"] = info.st_size
+    index["mtime"] = info.st_mtime
+    index["every"] = every
+    index["entries"] = []
+    index["dates"] = []
+    return index
+
+
+def add_entry(index, date, offset):
+    """Records that the line starting at byte 'offset'
+    was logged at 'date'.  Entries must be added in order.
+    """
+    index["entries"].append([date.strftime(DATE_FORMAT), offset])
+    index["dates"].append(date)
+
+
+def save_index(log_path, index):
+    """Saves this index next to its log file.  Returns
+    True on success, or False if the index could not be written.
+    """
+    doc = dict(index)
+    del doc["dates"]
+    try:
+        f = open(index_path(log_path), "w")
+        json.dump(doc, f)
+        f.close()
+    except IOError as e:
+        LOGGER.info("Unable to save index for {0}: {1}".format(log_path, e))
+        return False
+    LOGGER.debug("Saved index of {0} entries for {1}"
+                 .format(len(index["entries"]), log_path))
+    return True
+
+
+def load_index(log_path):
+    """Loads the index for this log file.  Returns None if
+    there is no index, or if the log has changed since
+    the index was built.
+    """
+    path = index_path(log_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        f = open(path, "r")
+        index = json.load(f)
+        f.close()
+    except (IOError, ValueError) as e:
+        LOGGER.warning("Ignoring unreadable index {0}: {1}".format(path, e))
+        return None
+    info = os.stat(log_path)
+    if (index.get("version") != INDEX_VERSION or
+        index.get("size") != info.st_size or
+        index.get("mtime") != info.st_mtime):
+        LOGGER.info("Ignoring out of date index {0}".format(path))
+        return None
+    index["dates"] = [datetime.strptime(entry[0], DATE_FORMAT)
+                      for entry in index["entries"]]
+    return index
+
+
+def find_offset(index, date):
+    """Returns the offset of an indexed line logged before 'date',
+    at most index["every"] lines before the first line logged at
+    or after 'date', or 0 if no such line is indexed.
+    """
+    i = bisect_left(index["dates"], date)
+    if i == 0:
+        return 0
+    return index["entries"][i - 1][1]
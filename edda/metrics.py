@@ -0,0 +1,185 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Renders the progress of a run in the Prometheus text format,
+# served at '/metrics' by the edda server, and during ingestion
+# too with --metrics.  Most metrics come from the stages recorded
+# by edda/instrumentation.py, so they show the stage running now,
+# lines and bytes read (and their rate), documents written, and
+# insert latency.  Numbers that are not kept in a stage, like the
+# matches of each filter or the length of a queue, come from
+# sources: functions returning a list of samples, each a tuple
+#    (family, labels, value)
+# whose family is one of FAMILIES.
+
+import logging
+import threading
+
+import instrumentation
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# (family, type, help), in the order they are rendered
+FAMILIES = [
+    ("edda_stage_running", "gauge",
+     "Whether a stage is running now"),
+    ("edda_stage_seconds_total", "counter",
+     "Wall clock seconds spent in a stage"),
+    ("edda_stage_cpu_seconds_total", "counter",
+     "CPU seconds spent in finished runs of a stage"),
+    ("edda_stage_items_total", "counter",
+     "Items counted by a stage (lines_read, bytes_read...)"),
+    ("edda_stage_items_per_second", "gauge",
+     "Items counted by a stage per second spent in it"),
+    ("edda_latency_seconds", "summary",
+     "Time taken by an operation of a stage"),
+    ("edda_filter_matches_total", "counter",
+     "Log lines matched by a filter"),
+    ("edda_filter_seconds_total", "counter",
+     "Seconds spent in a filter"),
+    ("edda_queue_depth", "gauge",
+     "Items waiting in a queue of a run"),
+    ("edda_resident_memory_bytes", "gauge",
+     "Resident set size of the process"),
+    ("edda_peak_resident_memory_bytes", "gauge",
+     "Peak resident set size of the process"),
+]
+KNOWN = set(family for family, kind, text in FAMILIES)
+
+SOURCES = {}
+SOURCES_LOCK = threading.Lock()
+
+
+def add_source(key, source):
+    """Registers a function returning samples, replacing
+    the source registered before under the same key."""
+    with SOURCES_LOCK:
+        SOURCES[key] = source
+
+
+def remove_source(key):
+    """Stops rendering the samples of a source, if registered."""
+    with SOURCES_LOCK:
+        SOURCES.pop(key, None)
+
+
+def stage_samples():
+    """Returns samples for each recorded stage, counting
+    the time spent so far in the stages running now."""
+    running = instrumentation.running_stages()
+    samples = []
+    with instrumentation.LOCK:
+        for name in instrumentation.STAGES:
+            doc = instrumentation.STATS[name]
+            labels = {"stage": name}
+            wall = doc["wall"] + running.get(name, 0.0)
+            samples.append(("edda_stage_running", labels,
+                            int(name in running)))
+            samples.append(("edda_stage_seconds_total", labels, wall))
+            samples.append(("edda_stage_cpu_seconds_total", labels,
+                            doc["cpu"]))
+            for counter, n in sorted(doc["counters"].items()):
+                labels = {"stage": name, "counter": counter}
+                samples.append(("edda_stage_items_total", labels, n))
+                if wall:
+                    samples.append(("edda_stage_items_per_second",
+                                    labels, n / wall))
+            for operation, latency in sorted(doc["latency"].items()):
+                labels = {"stage": name, "operation": operation}
+                samples.append(("edda_latency_seconds_count", labels,
+                                latency["count"]))
+                samples.append(("edda_latency_seconds_sum", labels,
+                                latency["seconds"]))
+    return samples
+
+
+def memory_samples():
+    """Returns samples for the memory used by the process."""
+    return [("edda_resident_memory_bytes", {},
+             instrumentation.current_rss() * 1024),
+            ("edda_peak_resident_memory_bytes", {},
+             instrumentation.peak_rss() * 1024)]
+
+
+def filter_samples(filters, run=None):
+    """Returns samples for the matches and time of each filter,
+    from the dictionaries run_filters() updates as it goes,
+    labelled with 'run', if given."""
+    samples = []
+    for f in filters:
+        labels = {"filter": f["name"]}
+        if run:
+            labels["run"] = run
+        samples.append(("edda_filter_matches_total", labels, f["matches"]))
+        samples.append(("edda_filter_seconds_total", labels, f["time"]))
+    return samples
+
+
+def escape(value):
+    """Escapes a label value, as unicode, decoding byte
+    strings as UTF-8."""
+    if isinstance(value, str):
+        value = value.decode("utf-8", "replace")
+    return (unicode(value).replace(u"\\", u"\\\\")
+            .replace(u"\"", u"\\\"").replace(u"\n", u"\\n"))
+
+
+def sample_line(name, labels, value):
+    """Returns a sample as a unicode line of the text format."""
+    if labels:
+        name += u"{" + u",".join(u"{0}=\"{1}\"".format(k, escape(labels[k]))
+                                 for k in sorted(labels)) + u"}"
+    if isinstance(value, float):
+        value = repr(value)
+    return u"{0} {1}".format(name, value)
+
+
+def family_of(name):
+    """Returns the family of a sample, the name of a summary's
+    samples having a _count or _sum suffix."""
+    for suffix in ("_count", "_sum"):
+        if name.endswith(suffix) and name[:-len(suffix)] in KNOWN:
+            return name[:-len(suffix)]
+    return name
+
+
+def render():
+    """Returns every metric, in the Prometheus text format, as
+    unicode to be encoded as UTF-8."""
+    samples = stage_samples()
+    with SOURCES_LOCK:
+        sources = SOURCES.items()
+    for key, source in sorted(sources):
+        try:
+            samples.extend(source())
+        except Exception:
+            LOGGER.exception("Metrics source {0} failed".format(key))
+    samples.extend(memory_samples())
+
+    by_family = {}
+    for name, labels, value in samples:
+        by_family.setdefault(family_of(name), []).append(
+            sample_line(name, labels, value))
+    lines = []
+    for family, kind, text in FAMILIES:
+        if not family in by_family:
+            continue
+        lines.append(u"# HELP {0} {1}".format(family, text))
+        lines.append(u"# TYPE {0} {1}".format(family, kind))
+        lines.extend(by_family[family])
+    return u"\n".join(lines) + u"\n"
@@ -29,15 +29,15 @@ from datetime import timedelta
 import logging
 
 
-def server_clock_skew(db, coll_name):
+def server_clock_skew(storage):
     """ Given the mongodb entries generated by edda,
         attempts to detect and resolve clock skew
         across different servers.
     """
     logger = logging.getLogger(__name__)
 
-    clock_skew = db[coll_name + ".clock_skew"]
-    servers = db[coll_name + ".servers"]
+    clock_skew = storage.clock_skew
+    servers = storage.servers
 
     for doc_a in servers.find():
         a_name = doc_a["network_name"]
@@ -63,7 +63,7 @@ def server_clock_skew(db, coll_name):
                 continue
             logger.info("Finding clock skew "
                 "for {0} - {1}...".format(a_name, b_name))
-            skew_a["partners"][b_num] = detect(a_name, b_name, db, coll_name)
+            skew_a["partners"][b_num] = detect(a_name, b_name, storage)
             if not skew_a["partners"][b_num]:
                 continue
             skew_b = clock_skew.find_one({"server_num": b_num})
@@ -82,7 +82,7 @@ def server_clock_skew(db, coll_name):
             clock_skew.save(skew_b)
 
 
-def detect(a, b, db, coll_name):
+def detect(a, b, storage):
     """ Compares each entry from cursor_a against every entry from
         cursor_b.  In the case of matching messages, advances both cursors.
         Calculates time skew.  While entries continue to match, adds
@@ -91,7 +91,7 @@ def detect(a, b, db, coll_name):
         KNOWN BUGS: this algorithm may count some matches twice.
     """
 
-    entries = db[coll_name + ".entries"]
+    entries = storage.entries
 
     # set up cursors
     cursor_a = entries.find({
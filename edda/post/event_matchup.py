@@ -15,16 +15,31 @@
 #!/usr/bin/env python
 
 
+import heapq
 import logging
+import multiprocessing
 
 from datetime import timedelta
+from edda.storage import reopen
 from edda.supporting_methods import *
 from operator import itemgetter
 
 LOGGER = logging.getLogger(__name__)
 
+# normal network delay between corresponding entries
+DELAY = timedelta(seconds=2)
+# largest clock skew resolve_dissenters() corrects for,
+# when events are streamed; clocks set to the wrong time zone
+# are hours apart (the bundled 'hp' logs by almost three)
+SKEW_WINDOW = timedelta(days=1)
+# when matching in several processes, each gets about
+# this many partitions of the timeline
+PARTITIONS_PER_WORKER = 4
+# the fields of entries read to partition the timeline
+TIMELINE_FIELDS = ["date"]
 
-def event_matchup(db, coll_name):
+
+def event_matchup(storage):
     """This method sorts through the db's entries to
     find discrete events that happen across servers.  It will
     organize these entries into a list of "events", which are
@@ -41,12 +56,15 @@ def event_matchup(db, coll_name):
         "sync_to"    = for sync type messages
         "conn_addr"    = for new_conn or end_conn messages
         "conn_num"   = for new_conn or end_conn messages
+        "conn_stats" = for conn_stats messages, the "info" field
+                       of the aggregated entry (see conn_stats.py)
         "state"      = for status type messages (label, not code)
         }
 
     possible event types include:
     "new_conn" : new user connections
     "end_conn" : end a user connection
+    "conn_stats" : user connections aggregated over a time bucket
     "status"   : a status change for a server
     "sync"     : a new sync pattern for a server
     "stale"    : a secondary is going stale
@@ -56,40 +74,230 @@ def event_matchup(db, coll_name):
     "reconfig" : new config information was received
 
     This module assumes that normal network delay can account
-    for up to 4 seconds of lag between server logs.  Beyond this
+    for up to 2 seconds of lag between server logs.  Beyond this
     margin, module assumes that servers are no longer in sync.
+
+    Returns the events as a list; see stream_events() to handle
+    them one at a time instead.
+    """
+    return list(stream_events(storage))
+
+
+def stream_events(storage, skew=SKEW_WINDOW, workers=1):
+    """Generates the same events as event_matchup(), in order
+    by date, without loading all entries into memory.  Entries are
+    read from one date-ordered cursor per server, and only those
+    within the matching window are kept in memory.  Events are held
+    back until no clock-skewed event within 'skew' can be merged
+    into them by resolve_dissenters().  With more than one of
+    'workers', entries are matched in that many processes, see
+    iter_partitioned_events().
+    """
+    server_nums = storage.servers.distinct("server_num")
+    if workers > 1:
+        events = iter_partitioned_events(server_nums, storage, workers)
+    else:
+        server_entries = entry_queues(server_nums, storage)
+        events = iter_events(server_nums, server_entries, storage)
+    return iter_resolve_dissenters(events, skew)
+
+
+def entry_queues(server_nums, storage, query=None):
+    """Returns a dictionary with an EntryQueue for each server,
+    of its entries matching 'query', ordered by date."""
+    server_entries = {}
+    for num in server_nums:
+        server_query = dict(query or {}, origin_server=num)
+        cursor = storage.entries.find(server_query).sort("date", 1)
+        server_entries[num] = EntryQueue(cursor)
+    return server_entries
+
+
+def merged_timeline(server_nums, storage):
+    """Generates the entries of all servers, with only their
+    TIMELINE_FIELDS, in the order next_event() takes them: by
+    date, and among entries of the same date, from the server
+    last in 'server_nums' first."""
+    def server_timeline(i, num):
+        cursor = storage.entries.find({"origin_server": num},
+                                      TIMELINE_FIELDS).sort("date", 1)
+        for n, entry in enumerate(cursor):
+            yield entry["date"], -i, n, entry
+    timelines = [server_timeline(i, num)
+                 for i, num in enumerate(server_nums)]
+    for date, i, n, entry in heapq.merge(*timelines):
+        yield entry
+
+
+def partition_timeline(server_nums, storage, parts):
+    """Splits the merged timeline of all servers into about
+    'parts' partitions of similar size, at quiet gaps where
+    consecutive entries are more than DELAY apart.  Entries on
+    either side of such a gap are never matched into one event,
+    so each partition can be matched on its own.  Returns the date
+    each partition starts at, but the first.
+    """
+    # (date, number of entries before it) of each quiet gap
+    gaps = []
+    last = None
+    count = 0
+    for entry in merged_timeline(server_nums, storage):
+        if last is not None and entry["date"] - last > DELAY:
+            gaps.append((entry["date"], count))
+        last = entry["date"]
+        count += 1
+    size = count / float(parts)
+    starts = []
+    for date, before in gaps:
+        if before >= size * (len(starts) + 1):
+            starts.append(date)
+    return starts
+
+
+def iter_partitioned_events(server_nums, storage, workers):
+    """Generates the same events as iter_events(), matching the
+    partitions found by partition_timeline() in a pool of 'workers'
+    processes, and passing on their events in order.
+
+    Workers only look server numbers up.  The addresses they find
+    no server for are registered here, event by event, in the order
+    next_event() would register them in a single pass.
+    """
+    starts = partition_timeline(server_nums, storage,
+                                workers * PARTITIONS_PER_WORKER)
+    if not starts:
+        server_entries = entry_queues(server_nums, storage)
+        for event in iter_events(server_nums, server_entries, storage):
+            yield event
+        return
+    location = storage.location()
+    partitions = [(location, server_nums, start, end)
+                  for start, end in zip([None] + starts, starts + [None])]
+    LOGGER.info("Matching events in {0} partitions with {1} processes"
+                .format(len(partitions), workers))
+    pool = multiprocessing.Pool(min(workers, len(partitions)))
+    try:
+        servers = storage.servers
+        for events in pool.imap(match_partition, partitions):
+            for event in events:
+                yield register_unresolved(event, servers)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def match_partition(partition):
+    """Matches the entries of one partition of the timeline, from
+    its start date up to its end date, either of which may be None.
+    Runs in a worker process, and returns the events as a list,
+    with the addresses no server was found for left unresolved,
+    see register_unresolved().
     """
-    # put events in ordered lists by date, one per origin_server
-    # last communication with the db!
-    entries = organize_servers(db, coll_name)
-    events = []
+    location, server_nums, start, end = partition
+    storage = reopen(location)
+    dates = {}
+    if start:
+        dates["$gte"] = start
+    if end:
+        dates["$lt"] = end
+    query = {}
+    if dates:
+        query["date"] = dates
+    server_entries = entry_queues(server_nums, storage, query)
+    return list(iter_events(server_nums, server_entries, storage, False))
+
+
+def register_unresolved(event, servers):
+    """Registers the addresses of an event that next_event() found
+    no server for, in the order it found them, fills in their
+    server numbers and summarizes the event.  Returns the event.
+    """
+    unresolved = event.pop("unresolved", None)
+    if not unresolved:
+        return event
+    for field, addr in unresolved["addresses"]:
+        event[field] = get_server_num(addr, False, servers)
+    # summarized as next_event() would, before corresponding
+    # entries could change the type of the event
+    event["summary"] = summarize(dict(event, type=unresolved["type"]),
+                                 servers)
+    return event
 
-    server_coll = db[coll_name + ".servers"]
-    server_nums = server_coll.distinct("server_num")
 
-    # make events
-    while(True):
-        event = next_event(server_nums, entries, db, coll_name)
+def iter_events(servers, server_entries, storage, register=True):
+    """Generates events from the entries with next_event(),
+    until all entries are used up."""
+    while True:
+        event = next_event(servers, server_entries, storage, register)
         if not event:
-            break
-        events.append(event)
+            return
+        yield event
 
-    # attempt to resolve any undetected skew in events
-    events = resolve_dissenters(events)
-    return events
 
+class EntryQueue(object):
+    """A queue of entries read lazily from a cursor, that
+    next_event() and get_corresponding_events() can use in place
+    of a list.  Entries are only read from the cursor when they
+    are iterated over, so a queue holds at most the entries
+    within the matching window of its first entry.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = iter(cursor)
+        self.buffer = []
+
+    def fill(self, n):
+        """Reads entries until n are buffered, or the cursor
+        is exhausted.  Returns True if n entries are buffered."""
+        while len(self.buffer) < n:
+            try:
+                self.buffer.append(next(self.cursor))
+            except StopIteration:
+                return False
+        return True
 
-def next_event(servers, server_entries, db, coll_name):
+    def __len__(self):
+        """Returns the number of buffered entries, reading
+        one from the cursor if none are buffered"""
+        self.fill(1)
+        return len(self.buffer)
+
+    def __getitem__(self, i):
+        self.fill(i + 1)
+        return self.buffer[i]
+
+    def __iter__(self):
+        i = 0
+        while self.fill(i + 1):
+            yield self.buffer[i]
+            i += 1
+
+    def pop(self, i=-1):
+        if i >= 0:
+            self.fill(i + 1)
+        return self.buffer.pop(i)
+
+    def remove(self, entry):
+        self.buffer.remove(entry)
+
+
+def next_event(servers, server_entries, storage, register=True):
     """Given lists of entries from servers ordered by date,
     and a list of server numbers, finds a new event
-    and returns it.  Returns None if out of entries"""
+    and returns it.  Returns None if out of entries.
+
+    Unless 'register', servers are not added for addresses that
+    none is found for.  Their fields are then left as None, and the
+    event is not summarized yet; its "unresolved" field lists the
+    (field, address) pairs, see register_unresolved().
+    """
     # NOTE: this method makes no attempt to adjust for clock skew,
     # only normal network delay.
     # find the first entry from any server
 
     # these are messages that do not involve
     # corresponding messages across servers
-    loners = ["conn", "fsync", "sync", "stale", "init"]
+    loners = ["conn", "conn_stats", "fsync", "sync", "stale", "init"]
 
     first_server = None
     for s in servers:
@@ -106,17 +314,25 @@ def next_event(servers, server_entries, db, coll_name):
 
     first = server_entries[first_server].pop(0)
 
-    servers_coll = db[coll_name + ".servers"]
+    servers_coll = storage.servers
     event = {}
     event["witnesses"] = []
     event["dissenters"] = []
+    unresolved = []
+
+    def server_num(field, addr):
+        if register:
+            return get_server_num(addr, False, servers_coll)
+        num = find_server_num(addr, servers_coll)
+        if num is None:
+            unresolved.append((field, addr))
+        return num
 
     # get and use server number for the target
     if first["info"]["server"] == "self":
         event["target"] = str(first["origin_server"])
     else:
-        event["target"] = get_server_num(first["info"]["server"],
-                                         False, servers_coll)
+        event["target"] = server_num("target", first["info"]["server"])
     # define other event fields
     event["type"] = first["type"]
     event["date"] = first["date"]
@@ -140,26 +356,21 @@ def next_event(servers, server_entries, db, coll_name):
     # sync events
     if event["type"] == "sync":
         # must have a server number for this server
-        num = get_server_num(first["info"]["sync_server"], False, servers_coll)
-        event["sync_to"] = num
+        event["sync_to"] = server_num("sync_to", first["info"]["sync_server"])
 
     # conn messages
     if first["type"] == "conn":
         event["type"] = first["info"]["subtype"]
         event["conn_addr"] = first["info"]["conn_addr"]
         event["conn_number"] = first["info"]["conn_number"]
+    if first["type"] == "conn_stats":
+        event["conn_stats"] = first["info"]
 
-    # get a hostname
-    label = ""
-    num, self_name, network_name = name_me(event["target"], servers_coll)
-    if self_name:
-        label = self_name
-    elif network_name:
-        label = network_name
+    if unresolved:
+        event["unresolved"] = {"type": event["type"],
+                               "addresses": unresolved}
     else:
-        label = event["target"]
-
-    event["summary"] = generate_summary(event, label)
+        event["summary"] = summarize(event, servers_coll)
 
     # handle corresponding messages
     event["witnesses"].append(first["origin_server"])
@@ -169,12 +380,27 @@ def next_event(servers, server_entries, db, coll_name):
     return event
 
 
+def summarize(event, servers):
+    """Returns the summary of an event, naming its target
+    by the best known name of that server"""
+    # get a hostname
+    label = ""
+    num, self_name, network_name = name_me(event["target"], servers)
+    if self_name:
+        label = self_name
+    elif network_name:
+        label = network_name
+    else:
+        label = event["target"]
+    return generate_summary(event, label)
+
+
 def get_corresponding_events(servers, server_entries,
                              event, first, servers_coll):
     """Given a list of server names and entries
     organized by server, find all events that correspond to
     this one and combine them"""
-    delay = timedelta(seconds=2)
+    delay = DELAY
 
     # find corresponding messages
     for s in servers:
@@ -267,30 +493,71 @@ def resolve_dissenters(events):
                 "Attempting to resolve dissenters"
                 "--------------------------------")
     for a in events[:]:
-        if len(a["dissenters"]) >= len(a["witnesses"]):
-            events_b = events[:]
-            for b in events_b:
-                if a["summary"] == b["summary"]:
-                    for wit_a in a["witnesses"]:
-                        if wit_a in b["witnesses"]:
-                            break
-                    else:
-                        LOGGER.debug("Corresponding, "
-                                     "clock-skewed events found, merging events")
-                        LOGGER.debug("skew is {0}".format(a["date"] - b["date"]))
-                        events.remove(a)
-                        # resolve witnesses and dissenters lists
-                        for wit_a in a["witnesses"]:
-                            b["witnesses"].append(wit_a)
-                            if wit_a in b["dissenters"]:
-                                b["dissenters"].remove(wit_a)
-                        # we've already found a match, stop looking
-                        break
-                    LOGGER.debug("Match not found for this event")
-                    continue
+        merge_dissenter(a, events)
     return events
 
 
+def iter_resolve_dissenters(events, skew=SKEW_WINDOW):
+    """Like resolve_dissenters(), but takes and generates events
+    in order by date, only matching events up to 'skew' apart.
+    Holds back only the events within that window.
+    """
+    pending = []
+    # the first 'checked' pending events have been resolved
+    checked = 0
+    for event in events:
+        pending.append(event)
+        # resolve the events whose whole window has been read
+        while (checked < len(pending) and
+               pending[checked]["date"] + skew < event["date"]):
+            if not merge_dissenter(pending[checked], pending, skew):
+                checked += 1
+        # pass on the events that can no longer be merged into
+        while (checked and checked < len(pending) and
+               pending[0]["date"] + skew < pending[checked]["date"]):
+            yield pending.pop(0)
+            checked -= 1
+    for a in pending[checked:]:
+        merge_dissenter(a, pending, skew)
+    for event in pending:
+        yield event
+
+
+def merge_dissenter(a, events, skew=None):
+    """If event a has as many dissenters as witnesses, looks
+    in events for the first corresponding event seen only by other
+    servers, at most 'skew' apart if given.  If one is found, merges
+    a into it and removes a from events.  Returns True if a was merged.
+    """
+    if len(a["dissenters"]) < len(a["witnesses"]):
+        return False
+    for b in events:
+        if b is a or a["summary"] != b["summary"]:
+            continue
+        if skew is not None and abs(a["date"] - b["date"]) > skew:
+            continue
+        for wit_a in a["witnesses"]:
+            if wit_a in b["witnesses"]:
+                break
+        else:
+            LOGGER.debug("Corresponding, "
+                         "clock-skewed events found, merging events")
+            LOGGER.debug("skew is {0}".format(a["date"] - b["date"]))
+            for i, e in enumerate(events):
+                if e is a:
+                    del events[i]
+                    break
+            # resolve witnesses and dissenters lists
+            for wit_a in a["witnesses"]:
+                b["witnesses"].append(wit_a)
+                if wit_a in b["dissenters"]:
+                    b["dissenters"].remove(wit_a)
+            # we've already found a match, stop looking
+            return True
+        LOGGER.debug("Match not found for this event")
+    return False
+
+
 def generate_summary(event, hostname):
     """Given an event, generates and returns a one-line,
     mnemonic summary for that event
@@ -306,6 +573,12 @@ def generate_summary(event, hostname):
         summary += " is now " + event["state"]
         #if event["state"] == "ARBITER":
 
+    # for aggregated connection messages
+    elif event["type"] == "conn_stats":
+        stats = event["conn_stats"]
+        summary += (" opened {0} and closed {1} connections, {2} open"
+                    .format(stats["opened"], stats["closed"], stats["open"]))
+
     # for connection messages
     elif (event["type"].find("conn") >= 0):
         if event["type"] == "new_conn":
@@ -345,7 +618,7 @@ def generate_summary(event, hostname):
     return summary
 
 
-def organize_servers(db, collName):
+def organize_servers(storage):
     """Organizes entries from .entries collection into lists
     sorted by date, one per origin server, as follows:
     { "server1" : [doc1, doc2, doc3...]}
@@ -354,8 +627,8 @@ def organize_servers(db, collName):
     specific lists indexed by server_num"""
     servers_list = {}
 
-    entries = db[collName + ".entries"]
-    servers = db[collName + ".servers"]
+    entries = storage.entries
+    servers = storage.servers
 
     for server in servers.find():
         num = server["server_num"]
@@ -27,18 +27,18 @@ import logging
 from datetime import timedelta
 
 
-def replace_clock_skew(db, collName):
+def replace_clock_skew(storage):
     logger = logging.getLogger(__name__)
     fixed_servers = {}
     first = True
     """"Using clock skew values that we have recieved from the
         clock skew method, fixes these values in the
         original DB, (.entries)."""""
-    entries = db[collName + ".entries"]
-    clock_skew = db[collName + ".clock_skew"]
-    servers = db[collName + ".servers"]
+    entries = storage.entries
+    clock_skew = storage.clock_skew
+    servers = storage.servers
     logger.debug("\n------------List of Collections------------"
-        "\n".format(db.collection_names()))
+        "\n".format(storage.db.collection_names()))
 
     for doc in clock_skew.find():
         #if !doc["name"] in fixed_servers:
@@ -25,32 +25,53 @@ in edda/filters/template.py.
 __version__ = "0.7.0"
 
 import argparse
+import cProfile
 import gzip
 import os
 import sys
 import json
+import pstats
+import re
+import time
+import chrome_trace
+import conn_stats
+import filters
+import incident
+import instrumentation
+import json_stream
+import log_index
+import metrics
+import storage
 
 from bson import objectid
-from datetime import datetime
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 from filters import *
 from post.server_matchup import address_matchup
-from post.event_matchup import event_matchup
-from pymongo import Connection
+from post.event_matchup import SKEW_WINDOW
+from post.event_matchup import stream_events
 from supporting_methods import *
-from ui.frames import generate_frames
+from ui.frames import iter_coalesced
+from ui.frames import iter_frames
+from ui.frames import iter_parallel_frames
+from ui.frames import store_frames
+from ui.frames import timelines_from_dates
+from ui.connection import send_batch_to_js
 from ui.connection import send_to_js
+from ui.connection import start_server
+from ui.density import EventCounts
+from ui.event_index import EventIndex
 
-PARSERS = [
-    rs_status.process,
-    fsync_lock.process,
-    rs_sync.process,
-    init_and_listen.process,
-    stale_secondary.process,
-    rs_exit.process,
-    rs_reconfig.process
-]
+# filters that log lines are passed through, in order
+PARSERS = filters.enabled_filters()
+# clusters processed at once in batch mode
+BATCH_WORKERS = 4
+# cluster names in a batch manifest, which are used in urls
+CLUSTER_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+# lines read between updates of the live ingest counters
+PUBLISH_EVERY = 10000
 
-LOGGER = None
+LOGGER = logging.getLogger(__name__)
 
 
 def main():
@@ -65,7 +86,6 @@ def main():
     if (len(sys.argv) < 2):
         print "Missing argument: please provide a filename"
         return
-    mongo_version = ""
     # argparse methods
     parser = argparse.ArgumentParser(
     description='Process and visualize log files from mongo servers')
@@ -77,15 +97,71 @@ def main():
     parser.add_argument('--version', action='version',
                         version="Running edda version {0}".format(__version__))
     parser.add_argument('--db', '-d', help="Specify DB name")
+    parser.add_argument('--pool_size', type=int, default=storage.POOL_SIZE,
+                        help="Number of pooled connections to the MongoDB "
+                        "server (default: %(default)s)")
     parser.add_argument('--collection', '-c')  # Fixed
-    parser.add_argument('filename', nargs='+')
+    parser.add_argument('--since', type=date_arg,
+                        help="Only read log lines from this time on, "
+                        "e.g. 'Jun 11 15:56:16'")
+    parser.add_argument('--until', type=date_arg,
+                        help="Only read log lines up to this time")
+    parser.add_argument('--servers',
+                        help="Only read log files from these servers, given as "
+                        "a comma-separated list of host:port addresses or "
+                        "log file names")
+    parser.add_argument('--conns', action='store_true',
+                        help="Track client connections, aggregated into "
+                        "time buckets per server")
+    parser.add_argument('--conn_bucket', type=int,
+                        default=conn_stats.BUCKET_SECONDS, metavar='SECONDS',
+                        help="Length of the connection tracking buckets "
+                        "(default: %(default)s)")
+    parser.add_argument('--coalesce', action='store_true',
+                        help="Merge consecutive events that do not change "
+                        "the topology into one frame")
+    parser.add_argument('--no_index', action='store_true',
+                        help="Do not build or use timestamp indexes "
+                        "saved next to the log files")
+    parser.add_argument('--binary', action='store_true',
+                        help="Save the processed logs as a binary '.edda' "
+                        "file, which reopens faster than a '.json' file")
+    parser.add_argument('--stats_json',
+                        help="Write per-stage timings and counters to this file")
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="Profile the run and print the hottest functions, "
+                        "optionally saving the raw profile to FILE")
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help="Process the log files of many clusters, listed "
+                        "in a json file mapping each cluster name to its "
+                        "log files, and serve them all at once")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS,
+                        help="Number of clusters processed at once in "
+                        "batch mode (default: %(default)s)")
+    parser.add_argument('--match_workers', type=int, default=1,
+                        help="Number of processes matching events "
+                        "across servers at once (default: %(default)s)")
+    parser.add_argument('--skew_window', type=int, metavar='MINUTES',
+                        default=int(SKEW_WINDOW.total_seconds() / 60),
+                        help="Largest clock skew between servers that "
+                        "events are merged across (default: %(default)s)")
+    parser.add_argument('--frame_workers', type=int, default=1,
+                        help="Number of processes generating frames "
+                        "at once (default: %(default)s)")
+    parser.add_argument('--trace', action='store_true',
+                        help="Also save the events as a Chrome trace, "
+                        "'<name>.trace.json', for chrome://tracing "
+                        "or Perfetto")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Serve Prometheus metrics at /metrics on the "
+                        "HTTP port while the logs are read, not only once "
+                        "they are ready")
+    parser.add_argument('filename', nargs='*')
     namespace = parser.parse_args()
+    if not namespace.filename and not namespace.batch:
+        parser.error("please provide a filename")
 
     # handle captured arguments
-    if namespace.json:
-        has_json = True
-    else:
-        has_json = False
     if namespace.http_port:
         http_port = namespace.http_port
     else:
@@ -126,41 +202,141 @@ def main():
     global LOGGER
     LOGGER = logging.getLogger(__name__)
 
+    profiler = None
+    if namespace.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
     # exit gracefully if no server is running
+    if namespace.db:
+        db_name = namespace.db[0]
+    else:
+        db_name = storage.DB_NAME
     try:
-        connection = Connection(uri)
+        db = storage.connect(uri, db_name, namespace.pool_size)
     except:
         LOGGER.critical("Unable to connect to {0}, exiting".format(uri))
         return
-
-    if namespace.db:
-        db = connection[namespace.db[0]]
-    else:
-        db = connection.edda
-    entries = db[coll_name].entries
-    servers = db[coll_name].servers
-
-    now = datetime.now()
-
     # some verbose comments
     LOGGER.info('Connection opened with edda mongod, using {0} on port {1}'
                 .format(host, port))
 
+    if namespace.conns:
+        PARSERS[:] = filters.enabled_filters(["conn_msg"])
+    if namespace.metrics:
+        start_server(http_port)
+
+    if namespace.batch:
+        try:
+            clusters = read_manifest(namespace.batch)
+        except (IOError, ValueError) as e:
+            print "\nError: Unable to read batch manifest {0}".format(
+                namespace.batch)
+            print e
+            return
+        incidents = process_batch(clusters, db, namespace)
+        report_stats(namespace, profiler)
+        if not incidents:
+            LOGGER.critical("No cluster had meaningful events, exiting.")
+            return
+        send_batch_to_js([(name, frames, names, admin)
+                          for name, run, frames, names, admin
+                          in incidents], http_port)
+        for incident_info in incidents:
+            incident_info[1].drop()
+        return
+
+    run = storage.Storage(db, coll_name)
+    result = process_logs(namespace.filename, run, namespace)
+    if not result:
+        report_stats(namespace, profiler)
+        return
+    frames, names, admin = result
+    report_stats(namespace, profiler)
+    send_to_js(frames, names, admin, http_port)
+    LOGGER.info('-' * 64)
+    LOGGER.info('=' * 64)
+    LOGGER.warning('Completed post processing.\nExiting.')
+
+    # Drop the collections created for this run.
+    run.drop()
+
+
+def process_logs(file_args, run, namespace, out_name=None, progress=True):
+    """Reads the given log files into the collections of 'run',
+    a Storage, matches up their servers and events, and
+    generates frames, which are also saved to a '.json' or
+    '.edda' file named after 'out_name' (by default, the
+    name of the run).  A saved file among the arguments is
+    loaded instead.  Returns (frames, names, admin), or None
+    if no servers or events were found.
+    """
+    coll_name = run.name
+    if not out_name:
+        out_name = coll_name
+    has_json = bool(namespace.json)
+    selected_servers = []
+    if namespace.servers:
+        selected_servers = [s.strip().lower()
+                            for s in namespace.servers.split(",") if s.strip()]
+    mongo_version = ""
+    entries = run.entries
+    servers = run.servers
+    # servers are looked up by name for every line that
+    # mentions one, so index them before reading the logs
+    with instrumentation.stage("build_indexes"):
+        instrumentation.count("build_indexes", "indexes",
+                              len(ensure_indexes(servers, SERVER_INDEXES)))
+
+    conn_tracker = None
+    if namespace.conns:
+        conn_tracker = conn_stats.new_tracker(namespace.conn_bucket)
+
+    # filter statistics are kept per run, as batch mode
+    # reads the logs of several clusters at once
+    filter_stats = filters.new_stats(PARSERS)
+    metrics.add_source("filters " + out_name,
+                       lambda: metrics.filter_samples(
+                           filter_stats.values(), out_name))
+
+    # the length of each queue of this run, for /metrics
+    queues = {}
+    if conn_tracker:
+        queues["connection_buckets"] = lambda: len(conn_tracker["buckets"])
+    metrics.add_source("queues " + out_name,
+                       lambda: [("edda_queue_depth",
+                                 {"run": out_name, "queue": name}, depth())
+                                for name, depth in sorted(queues.items())])
+
     # read in from each log file
+    instrumentation.start_stage("ingest")
     file_names = []
     f = None
     previous_version = False
     version_change = False
     first = True
-    for arg in namespace.filename:
+    saved = None
+    for arg in file_args:
         gzipped = False
+        if incident.is_incident(arg):
+            print "\n\nFound file {}, of type 'edda'".format(arg)
+            if not first:
+                print "Ignoring previously processed files"
+                " and loading configuration found in '.edda' file."
+            try:
+                saved = incident.open_incident(arg)
+            except ValueError as e:
+                print "\nError: Unable to read file {0}".format(arg)
+                print e
+                return None
+            has_json = True
+            break
         if ".json" in arg:
             print "\n\nFound file {}, of type 'json'".format(arg)
             if not first:
                 print "Ignoring previously processed files"
                 " and loading configuration found in '.json' file."
-            json_file = open(arg, "r")
-            json_obj = json.loads(json_file.read())
+            saved = json_stream.open_json(arg)
             has_json = True
             break
         first = False
@@ -178,36 +354,65 @@ def main():
         file_names.append(arg)
         counter = 0
         stored = 0
+        inserts = 0
+        insert_seconds = 0.0
         server_num = -1
+        if gzipped:
+            log_file = opened_file
+        else:
+            log_file = f
+
+        # find out which server wrote this file before reading it
+        self_addr = None
+        if selected_servers or namespace.since:
+            self_addr = identify_server(log_file)
+        if selected_servers:
+            if not server_selected(arg, self_addr, selected_servers):
+                print "\nSkipping log-file {0} from unselected server {1}".format(
+                    arg, self_addr)
+                file_names.remove(arg)
+                continue
 
         LOGGER.warning('Reading from logfile {0}...'.format(arg))
         previous = "none"
         print "\nCurrently parsing log-file: {}".format(arg)
         total_characters = 0
-        total_chars = 0
-
-        # Build log lines out of characters
-        if gzipped:
-            text = opened_file.read()
-            #for char in text:
-            total_chars = len(text)
-            array = text.split('\n')
-            file_lines = array
-        else:
-            file_lines = f
+        file_lines = log_file
 
-        LOGGER.debug(("Finished processing gzipped with a time of: " + str(datetime.now() - now)))
         file_info = os.stat(arg)
         total = 0
         total = file_info.st_size
         # Make sure the progress bar works with gzipped file.
         if gzipped:
-            intermediate_total = total_chars
-            total = int(intermediate_total * .98)
-
-        point = total / 100
-        increment = total / 100
+            total = gzip_size(arg)
+
+        # skip straight to the start of the time window
+        index = None
+        if not namespace.no_index:
+            index = log_index.load_index(arg)
+        if namespace.since:
+            if index:
+                total_characters = log_index.find_offset(index, namespace.since)
+                log_file.seek(total_characters)
+            elif not gzipped:
+                total_characters = seek_to_date(f, namespace.since, total)
+            instrumentation.count("ingest", "bytes_skipped", total_characters)
+            # we may have skipped this server's startup message
+            if total_characters and self_addr:
+                server_num = get_server_num(self_addr[0], self_addr[1], servers)
+
+        # index this file if we are going to read all of it
+        new_index = None
+        if not index and not namespace.no_index and total_characters == 0:
+            new_index = log_index.new_index(arg)
+            next_indexed = 0
+        complete = True
+
+        # the size of a gzipped file is only known modulo 4GiB
+        point = max(total / 100, 1)
+        increment = point
         old_total = -1
+        published = (0, 0, total_characters, 0, 0.0)
         for line in file_lines:
             ratio = total_characters / point
             total_characters += len(line)
@@ -216,7 +421,7 @@ def main():
             else:
                 percent_string = str(total_characters / point)
 
-            if ratio != old_total or ratio >= 99:
+            if progress and (ratio != old_total or ratio >= 99):
                 sys.stdout.flush()
                 sys.stdout.write("\r[" + "=" * (
                     (total_characters) / increment) + " " * (
@@ -224,6 +429,11 @@ def main():
                 old_total = ratio
 
             counter += 1
+            if counter % PUBLISH_EVERY == 0:
+                progress_now = (counter, stored, total_characters,
+                                inserts, insert_seconds)
+                publish_ingest(published, progress_now)
+                published = progress_now
             # handle restart lines
             if '******' in line:
                 LOGGER.debug("Skipping restart message")
@@ -235,7 +445,16 @@ def main():
                     LOGGER.warning("Line {0} has a malformatted date, skipping"
                                    .format(counter))
                     continue
-                doc = traffic_control(line, date)
+                if new_index and counter > next_indexed:
+                    log_index.add_entry(new_index, date,
+                                        total_characters - len(line))
+                    next_indexed = counter + new_index["every"] - 1
+                if namespace.since and date < namespace.since:
+                    continue
+                if namespace.until and date > namespace.until:
+                    complete = False
+                    break
+                doc = traffic_control(line, date, filter_stats)
                 if doc:
                     # see if we have captured a new server address
                     # if server_num is at -1, this is a new server
@@ -256,14 +475,21 @@ def main():
                                      .format(doc["info"]["addr"], server_num))
                         if server_num == -1:
                             server_num = get_server_num(
-                                str(doc["info"]["server"]), False, servers)
+                                str(doc["info"]["addr"]), False, servers)
                         else:
                             assign_address(server_num,
-                                           str(doc["info"]["server"]), False, servers)
+                                           str(doc["info"]["addr"]), False, servers)
                     # is there a server number for us yet?  If not, get one
                     if server_num == -1:
                         server_num = get_server_num("unknown", False, servers)
 
+                    # aggregate connections instead of storing each one
+                    if doc["type"] == "conn":
+                        instrumentation.count("ingest", "connections")
+                        stored += conn_stats.add_conn(conn_tracker, server_num,
+                                                      doc, entries)
+                        continue
+
                     if doc["type"] == "version":
                         update_mongo_version(doc["version"], server_num, servers)
                         if not previous_version:
@@ -278,81 +504,300 @@ def main():
                     if doc["type"] == "exit" and previous == "exit":
                         continue
                     doc["origin_server"] = server_num
+                    start = time.time()
                     entries.insert(doc)
+                    insert_seconds += time.time() - start
+                    inserts += 1
+                    stored += 1
                     LOGGER.debug('Stored line {0} of {1} to db'.format(counter, arg))
                     previous = doc["type"]
+        if conn_tracker:
+            stored += conn_stats.flush(conn_tracker, entries)
+        if new_index and complete:
+            log_index.save_index(arg, new_index)
         LOGGER.warning('-' * 64)
         LOGGER.warning('Finished running on {0}'.format(arg))
         LOGGER.info('Stored {0} of {1} log lines to db'.format(stored, counter))
         LOGGER.warning('=' * 64)
-    LOGGER.debug(("Finished processing everything with a time of: " + str(datetime.now() - now)))
+        publish_ingest(published, (counter, stored, total_characters,
+                                   inserts, insert_seconds))
+    instrumentation.end_stage("ingest")
+    count_filter_matches(filter_stats)
     if version_change == True:
         print "\n VERSION CHANGE DETECTED!!"
         print mongo_version
+    if saved:
+        return saved
 
     # if no servers or meaningful events were found, exit
     if servers.count() == 0 and has_json == False:
         LOGGER.critical("No servers were found, exiting.")
-        return
+        return None
     if entries.count() == 0 and has_json == False:
         LOGGER.critical("No meaningful events were found, exiting.")
-        return
+        return None
 
     LOGGER.info("Finished reading from log files, performing post processing")
     LOGGER.info('-' * 64)
 
-    LOGGER.debug("\nTotal processing time for log files: " + str(datetime.now() - now))
+    # index the entries once they are all inserted, which is
+    # faster than updating the indexes with every insert
+    if not has_json:
+        with instrumentation.stage("build_indexes") as stats:
+            instrumentation.count("build_indexes", "indexes",
+                                  len(ensure_indexes(entries, ENTRY_INDEXES)))
+        LOGGER.info("Indexed entries in {0:.3f}s"
+                    .format(stats["wall"]))
 
     # Perform address matchup
-    if len(namespace.filename) > 1:
+    if len(file_args) > 1:
         LOGGER.info("Attempting to resolve server names")
-        result = address_matchup(db, coll_name)
+        with instrumentation.stage("address_matchup"):
+            result = address_matchup(run)
         if result == 1:
             LOGGER.info("Server names successfully resolved")
         else:
             LOGGER.warning("Could not resolve server names")
         LOGGER.info('-' * 64)
 
-    # Event matchup
-    LOGGER.info("Matching events across documents and logs...")
-    events = event_matchup(db, coll_name)
-    LOGGER.info("Completed event matchup")
-    LOGGER.info('-' * 64)
-
     # Create json file
     if not has_json:
         print "\nEdda is storing data under collection name {0}".format(coll_name)
-        frames = generate_frames(events, db, coll_name)
-        names = get_server_names(db, coll_name)
+        # Event matchup and frames are streamed through to the
+        # .frames collection, so only the entries and events within
+        # the matching window are held in memory.  Unless saving a
+        # binary file, frames are also written to the .json file
+        # as they are generated.
+        LOGGER.info("Matching events across documents and logs...")
+        server_nums = list(servers.distinct("server_num"))
+        writer = None
+        if not namespace.binary:
+            writer = json_stream.FrameWriter(open(out_name + ".json", "w"))
+        tracer = None
+        if namespace.trace:
+            tracer = chrome_trace.TraceWriter(
+                open(out_name + chrome_trace.TRACE_SUFFIX, "w"))
+        index = EventIndex()
+        counts = EventCounts()
+        queues["unframed_events"] = lambda: len(index.pending)
+        with instrumentation.stage("generate_frames") as stats:
+            events = instrumentation.count_items(
+                stream_events(run,
+                              timedelta(minutes=namespace.skew_window),
+                              namespace.match_workers),
+                "generate_frames", "events")
+            events = index.indexed(counts.counted(events))
+            if tracer:
+                events = tracer.traced(events)
+            if namespace.frame_workers > 1:
+                frames = iter_parallel_frames(events, server_nums,
+                                              namespace.frame_workers)
+            else:
+                frames = iter_frames(events, server_nums)
+            if namespace.coalesce:
+                frames = iter_coalesced(frames)
+            frames = index.indexed_frames(frames)
+            frames = instrumentation.count_items(
+                frames, "generate_frames", "frames")
+            if writer:
+                frames = writer.written(frames)
+            frames = store_frames(frames, run.frames)
+        LOGGER.info("Completed event matchup")
+        LOGGER.info('-' * 64)
+        names = get_server_names(run)
+        if tracer:
+            tracer.close(names)
         admin = get_admin_info(file_names)
-        large_json = open(coll_name + ".json", "w")
-        json.dump(dicts_to_json(frames, names, admin), large_json)
-    # No need to create json, one already provided.
-    elif has_json:
-        frames, names, admin = json_to_dicts(json_obj)
-    send_to_js(frames, names, admin, http_port)
-    LOGGER.info('-' * 64)
-    LOGGER.info('=' * 64)
-    LOGGER.warning('Completed post processing.\nExiting.')
-
-    # Drop the collections created for this run.
-    db.drop_collection(coll_name + ".servers")
-    db.drop_collection(coll_name + ".entries")
+        dates = frames.dates()
+        admin["timelines"] = timelines_from_dates(dates)
+        admin["event_index"] = index.postings
+        admin["density"] = counts.histograms(dates)
+        if writer:
+            writer.close(names, admin)
+        else:
+            with instrumentation.stage("write_incident"):
+                incident.write_incident(out_name + incident.INCIDENT_SUFFIX,
+                                        frames.itervalues(), names, admin)
+    metrics.remove_source("queues " + out_name)
+    return frames, names, admin
 
 
-def traffic_control(msg, date):
+def publish_ingest(before, after):
+    """Adds the progress made reading a log file between two
+    points, each a tuple of (lines read, documents written,
+    bytes read, inserts, seconds spent inserting), to the
+    'ingest' stage, where /metrics shows it as it goes."""
+    lines, documents, read, inserts, seconds = [
+        now - then for now, then in zip(after, before)]
+    instrumentation.count("ingest", "lines_read", lines)
+    instrumentation.count("ingest", "documents_written", documents)
+    instrumentation.count("ingest", "bytes_read", read)
+    if inserts:
+        instrumentation.observe("ingest", "insert", seconds, inserts)
+
+
+def count_filter_matches(stats):
+    """Records how many lines each filter matched while
+    reading the logs of a run, and the time it took, from
+    the statistics kept by traffic_control().
+    """
+    for f in stats.values():
+        if f["calls"]:
+            instrumentation.count_match("ingest", f["name"],
+                                        f["matches"], f["time"])
+
+
+def read_manifest(path):
+    """Reads a batch manifest, a json file mapping the name of
+    each cluster to the list of its log files, and returns a
+    sorted list of (name, log files) tuples.  Log files are
+    relative to the manifest.  Cluster names are used in urls,
+    so they may only contain letters, digits, '.', '-' and '_'.
+    """
+    manifest_file = open(path, "r")
+    try:
+        manifest = json.load(manifest_file)
+    finally:
+        manifest_file.close()
+    if not isinstance(manifest, dict):
+        raise ValueError("a batch manifest maps cluster names "
+                         "to lists of log files")
+    base = os.path.dirname(os.path.abspath(path))
+    clusters = []
+    for name in sorted(manifest):
+        if not CLUSTER_NAME.match(name):
+            raise ValueError("invalid cluster name '{0}'".format(name))
+        files = manifest[name]
+        if isinstance(files, basestring):
+            files = [files]
+        clusters.append((str(name), [os.path.join(base, str(f))
+                                     for f in files]))
+    return clusters
+
+
+def process_batch(clusters, db, namespace):
+    """Processes the log files of each cluster on a pool of
+    worker threads, which share the connection pool of 'db'.
+    Each cluster is saved to a file named after it.  Returns a
+    list of (name, storage, frames, names, admin) tuples for
+    each cluster that had events, in order.
+    """
+    workers = max(1, min(namespace.workers, len(clusters)))
+    LOGGER.warning("Processing {0} clusters with {1} workers"
+                   .format(len(clusters), workers))
+    pool = ThreadPool(workers)
+    try:
+        results = pool.map(process_cluster, [(name, files, db, namespace)
+                                             for name, files in clusters])
+    finally:
+        pool.close()
+        pool.join()
+    return [r for r in results if r]
+
+
+def process_cluster(args):
+    """Processes the log files of one cluster of a batch.
+    Returns (name, storage, frames, names, admin), or None
+    if the cluster had no events or failed.
+    """
+    name, files, db, namespace = args
+    run = storage.Storage(db, str(objectid.ObjectId()))
+    print "\nProcessing cluster {0}".format(name)
+    try:
+        result = process_logs(files, run, namespace,
+                              out_name=name, progress=False)
+    except Exception as e:
+        LOGGER.exception("Failed to process cluster {0}".format(name))
+        print "\nError: Unable to process cluster {0}: {1}".format(name, e)
+        run.drop()
+        return None
+    if not result:
+        print "\nNo events found for cluster {0}".format(name)
+        run.drop()
+        return None
+    frames, names, admin = result
+    return name, run, frames, names, admin
+
+
+def traffic_control(msg, date, stats=None):
     """ Passes given message through a number of filters.  If a
         it fits the criteria of a given filter, that filter returns
         a document, which this function will pass up to main().
+        Filter statistics are kept in 'stats', see filters.new_stats().
     """
+    return filters.run_filters(msg, date, PARSERS, stats)
+
 
-    for process in PARSERS:
-        doc = process(msg, date)
-        if doc:
-            return doc
+def identify_server(log_file, max_lines=1000):
+    """ Looks through the first lines of an open log file for
+        the address the server calls itself, then rewinds the file.
+        Returns a tuple (address, is_self_name) or None.
+    """
+    addr = None
+    for i in range(max_lines):
+        line = log_file.readline()
+        if not line:
+            break
+        date = date_parser(line)
+        if not date:
+            continue
+        for process in [init_and_listen.process, rs_status.process]:
+            doc = process(line, date)
+            if doc and "addr" in doc["info"]:
+                addr = (str(doc["info"]["addr"]), doc["type"] == "init")
+                break
+        if addr:
+            break
+    log_file.seek(0)
+    return addr
 
 
-def get_server_names(db, coll_name):
+def server_selected(file_name, addr, selected_servers):
+    """ Returns True if a log file should be read, given the servers
+        selected by the user.  Files from servers that could not be
+        identified are read, unless the user named other files.
+    """
+    if file_name.lower() in selected_servers:
+        return True
+    if os.path.basename(file_name).lower() in selected_servers:
+        return True
+    if addr:
+        return addr[0].lower() in selected_servers
+    for name in selected_servers:
+        if os.path.exists(name):
+            return False
+    return True
+
+
+def date_arg(s):
+    """ argparse type for the --since and --until options."""
+    date = parse_date_arg(s)
+    if not date:
+        raise argparse.ArgumentTypeError(
+            "invalid date '{0}', expected a date like 'Jun 11 15:56:16'"
+            .format(s))
+    return date
+
+
+def report_stats(namespace, profiler):
+    """ Prints the per-stage summary table, writing it out as
+        json and printing the hottest functions if requested.
+    """
+    print "\n\n" + instrumentation.report()
+    if namespace.stats_json:
+        stats_file = open(namespace.stats_json, "w")
+        stats_file.write(instrumentation.to_json())
+        stats_file.close()
+    if profiler:
+        profiler.disable()
+        if namespace.profile != '-':
+            profiler.dump_stats(namespace.profile)
+        print ""
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        stats.sort_stats("cumulative").print_stats(25)
+
+
+def get_server_names(run):
     """ Format the information in the .servers collection
         into a data structure to be sent to the JavaScript client.
     """
@@ -360,7 +805,7 @@ def get_server_names(db, coll_name):
     server_names["self_name"] = {}
     server_names["network_name"] = {}
     server_names["version"] = {}
-    for doc in db[coll_name].servers.find():
+    for doc in run.servers.find():
         server_names["self_name"][doc["server_num"]] = doc["self_name"]
         server_names["network_name"][doc["server_num"]] = doc["network_name"]
         try:
@@ -0,0 +1,112 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# The collections of a run of edda are all named after the run:
+# <name>.servers    : one document per server, see supporting_methods.py
+# <name>.servers.counter : the next server_num to hand out
+# <name>.entries    : one document per parsed log line
+# <name>.clock_skew : clock skew between each pair of servers
+# <name>.frames     : the generated frames, see ui/frames.py
+# A Storage object hands these out to every stage of the run, from
+# one client whose connection pool is shared by all of them.
+
+import logging
+
+from pymongo import Connection
+from pymongo.write_concern import WriteConcern
+
+LOGGER = logging.getLogger(__name__)
+
+DB_NAME = "edda"
+POOL_SIZE = 10
+# every collection is read back on other sockets than the one that
+# wrote it: .entries by the processes matching events, .frames by
+# the http server, so all writes are acknowledged
+SAFE_WRITES = WriteConcern(w=1)
+
+
+def connect(uri, db_name=DB_NAME, pool_size=POOL_SIZE):
+    """Connects to the mongod at 'uri' and returns its database
+    'db_name', with up to 'pool_size' pooled connections.
+    """
+    connection = Connection(uri, max_pool_size=pool_size)
+    LOGGER.debug("Connected to {0} with a pool of {1}"
+                 .format(uri, pool_size))
+    return connection[db_name]
+
+
+def reopen(location, pool_size=1):
+    """Opens the run at 'location', as given by Storage.location(),
+    on a new client.  Child processes use this, as they cannot
+    share the sockets of their parent's client.
+    """
+    uri, db_name, name = location
+    return Storage(connect(uri, db_name, pool_size), name)
+
+
+class Storage(object):
+    """The collections of one run of edda, named after the run,
+    in database 'db'.
+    """
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.collections = {}
+
+    def collection(self, suffix):
+        """Returns the collection '<name>.<suffix>', with
+        acknowledged writes.
+        """
+        if not suffix in self.collections:
+            self.collections[suffix] = self.db.get_collection(
+                self.name + "." + suffix, write_concern=SAFE_WRITES)
+        return self.collections[suffix]
+
+    @property
+    def servers(self):
+        return self.collection("servers")
+
+    @property
+    def entries(self):
+        return self.collection("entries")
+
+    @property
+    def clock_skew(self):
+        return self.collection("clock_skew")
+
+    @property
+    def frames(self):
+        return self.collection("frames")
+
+    def location(self):
+        """Returns (uri, database name, run name), from which
+        reopen() opens this run again in another process."""
+        client = self.db.client
+        uri = "mongodb://{0}:{1}".format(client.host, client.port)
+        return uri, self.db.name, self.name
+
+    def run(self, name):
+        """Returns the storage of another run, sharing
+        this one's client."""
+        return Storage(self.db, name)
+
+    def drop(self):
+        """Drops the collections of this run."""
+        for suffix in ["servers", "servers.counter", "entries",
+                       "clock_skew", "frames"]:
+            self.db.drop_collection(self.name + "." + suffix)
+        self.collections.clear()
@@ -17,8 +17,10 @@
 
 import logging
 import re
+import struct
 
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 
 # global variables
 ADDRESS = re.compile("\S+:[0-9]{1,5}")
@@ -33,6 +35,21 @@ MONTH_DICT = {
 DAY_DICT = {
     'Mon': 1, 'Tue': 2, 'Wed': 3, 'Thu': 4, 'Fri': 5, "Sat": 6, 'Sun': 7
 }
+# indexes for the queries run against the .entries collection:
+# entries of a server by date (event matchup, clock skew replacement)
+# and status messages of a server about another (clock skew detection)
+ENTRY_INDEXES = [
+    [("origin_server", 1), ("date", 1)],
+    [("type", 1), ("origin_server", 1), ("info.server", 1), ("date", 1)]
+]
+# servers are looked up by each of their names
+SERVER_INDEXES = [
+    [("server_num", 1)],
+    [("self_name", 1)],
+    [("network_name", 1)]
+]
+# server_nums are allocated from a counter kept beside .servers
+SERVER_COUNTER = "counter"
 
 
 def capture_address(msg):
@@ -63,30 +80,80 @@ def get_server_num(addr, self_name, servers):
     a new number.
     """
     logger = logging.getLogger(__name__)
-    num = None
     addr = addr.replace('\n', "")
     addr = addr.replace(" ", "")
 
-    if addr != "unknown":
-        if self_name:
-            num = servers.find_one({"self_name": addr})
-        if not num:
-            num = servers.find_one({"network_name": addr})
-        if num:
-            logger.debug("Found server number {0} for address {1}"
-                         .format(num["server_num"], addr))
-            return str(num["server_num"])
+    num = find_server_num(addr, servers, self_name)
+    if num is not None:
+        return num
 
     # no .servers entry found for this target, make a new one
-    # make sure that we do not overwrite an existing server's index
-    for i in range(1, 50):
-        if not servers.find_one({"server_num": str(i)}):
-            logger.info("No server entry found for target server {0}".format(addr))
-            logger.info("Adding {0} to the .servers collection with server_num {1}"
-                        .format(addr, i))
-            assign_address(str(i), addr, self_name, servers)
-            return str(i)
-    logger.critical("Ran out of server numbers!")
+    num = next_server_num(servers)
+    logger.info("No server entry found for target server {0}".format(addr))
+    logger.info("Adding {0} to the .servers collection with server_num {1}"
+                .format(addr, num))
+    assign_address(num, addr, self_name, servers)
+    # a concurrent worker may have stored this address since it was
+    # looked up, in which case assign_address() saved nothing and
+    # the stored number is the one to use
+    if addr != "unknown":
+        stored = find_server_num(addr, servers, self_name)
+        if stored is not None and stored != num:
+            logger.info("Server {0} was added as server_num {1} meanwhile"
+                        .format(addr, stored))
+            num = stored
+    return num
+
+
+def find_server_num(addr, servers, self_name=False):
+    """Returns, as a string, the server_num of an existing .servers
+    entry with 'addr', or None if there is none.  An 'unknown'
+    address never matches an existing server.
+    """
+    logger = logging.getLogger(__name__)
+    addr = addr.replace('\n', "")
+    addr = addr.replace(" ", "")
+    if addr == "unknown":
+        return None
+    num = None
+    if self_name:
+        num = servers.find_one({"self_name": addr})
+    if not num:
+        num = servers.find_one({"network_name": addr})
+    if not num:
+        return None
+    logger.debug("Found server number {0} for address {1}"
+                 .format(num["server_num"], addr))
+    return str(num["server_num"])
+
+
+def next_server_num(servers):
+    """Allocates and returns, as a string, a server_num that no
+    server in 'servers' has used yet.  Numbers come from a counter
+    document in the '<servers>.counter' collection, incremented
+    atomically, so concurrent workers never share a number.
+    """
+    counter = servers[SERVER_COUNTER]
+    while True:
+        try:
+            doc = counter.find_and_modify({"_id": "server_num"},
+                                          {"$inc": {"n": 1}},
+                                          upsert=True, new=True)
+        except DuplicateKeyError:
+            # another worker created the counter at the same time
+            continue
+        num = str(doc["n"])
+        if not servers.find_one({"server_num": num}):
+            return num
+        # some numbers were assigned without the counter,
+        # move it past the highest of them
+        top = 0
+        for s in servers.find({}, {"server_num": 1}):
+            n = str(s.get("server_num", ""))
+            if n.isdigit():
+                top = max(top, int(n))
+        counter.find_and_modify({"_id": "server_num", "n": {"$lt": top}},
+                                {"$set": {"n": top}})
 
 
 def update_mongo_version(version, server_num, servers):
@@ -186,6 +253,19 @@ def assign_address(num, addr, self_name, servers):
     servers.save(doc)
 
 
+def ensure_indexes(coll, indexes):
+    """Creates each of the given indexes on coll, if it
+    does not exist yet.  Returns the names of the indexes.
+    """
+    logger = logging.getLogger(__name__)
+    names = []
+    for keys in indexes:
+        name = coll.create_index(keys)
+        logger.debug("Ensured index {0} on {1}".format(name, coll.name))
+        names.append(name)
+    return names
+
+
 def date_parser(message):
     """extracts the date information from the given line.  If
     line contains incomplete or no date information, skip
@@ -199,7 +279,66 @@ def date_parser(message):
 
 
 def make_datetime_obj(message):
-    date = datetime(2012, MONTH_DICT[message[4:7]], DAY_DICT[message[0:3]],
+    date = datetime(2012, MONTH_DICT[message[4:7]], int(message[8:10]),
         int(message[11:13]), int(message[14:16]), int(message[17:19]))
 
     return date
+
+
+def parse_date_arg(s):
+    """Parses a date given by the user in the same format
+    the log files use, with or without the day of the week
+    ('Mon Jun 11 15:56:16' or 'Jun 11 15:56:16').  Returns a
+    datetime comparable to those made by date_parser(), or None
+    if s is not a valid date.
+    """
+    parts = s.split()
+    if parts and parts[0] in DAY_DICT:
+        parts = parts[1:]
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    return date_parser("--- {0} {1:>2} {2}".format(
+        parts[0], int(parts[1]), parts[2]))
+
+
+def gzip_size(path):
+    """Returns the uncompressed size of a gzipped file, modulo 2^32,
+    as recorded in the last four bytes of the file.  If that is
+    smaller than the file itself, which only happens when it has
+    wrapped around, returns the size of the file instead.
+    """
+    f = open(path, "rb")
+    f.seek(-4, 2)
+    size = struct.unpack("<I", f.read(4))[0]
+    compressed = f.tell()
+    f.close()
+    return max(size, compressed)
+
+
+def seek_to_date(f, date, size):
+    """Given a seekable log file f of 'size' bytes, sorted by
+    date, binary searches for the first line logged at or
+    after 'date' and leaves f positioned at the start of a
+    line at or shortly before it.  Returns the new offset.
+    """
+    low = 0
+    high = size
+    while high - low > 4096:
+        mid = (low + high) / 2
+        f.seek(mid)
+        # skip the partial line we landed in
+        f.readline()
+        found = None
+        while not found:
+            line = f.readline()
+            if not line:
+                break
+            found = date_parser(line)
+        if not found or found >= date:
+            high = mid
+        else:
+            low = mid
+    f.seek(low)
+    if low:
+        f.readline()
+    return f.tell()
@@ -14,11 +14,18 @@
 
 #!/usr/bin/env python
 
+import cgi
 import os
+import urllib
+import urlparse
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
 import socket
 import webbrowser
+from datetime import datetime
+from edda import metrics
+from edda.ui.event_index import EventIndex
+from edda.ui.frames import topology_at
 
 try:
     import json
@@ -29,6 +36,15 @@ import threading
 data = None
 server_list = None
 admin = None
+# in batch mode, the frames, servers and admin info
+# of each cluster, served under /<cluster name>/
+clusters = {}
+# the server, if started while the logs are read by start_server()
+httpd = None
+# admin info that is served on request instead of with the rest
+SERVED_APART = ["event_index", "density"]
+# accepted formats of the date of a '<date>.topology' request
+DATE_FORMATS = ["%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"]
 
 
 def run(http_port):
@@ -56,7 +72,39 @@ def send_to_js(frames, servers, info, http_port):
     admin = info
     data = frames
     server_list = servers
+    serve(http_port)
 
+
+def send_batch_to_js(incidents, http_port):
+    """Sends the information of many clusters to the
+    JavaScript client, given as a list of (name, frames,
+    servers, info) tuples.  An index page links to each."""
+    clusters.clear()
+    for name, frames, servers, info in incidents:
+        clusters[name] = (frames, servers, info)
+    serve(http_port)
+
+
+def start_server(http_port):
+    """Starts serving in the background, so that '/metrics'
+    can be followed while the logs are read.  serve() takes
+    the server over once the frames are ready.  Returns
+    False if the server could not be started."""
+    global httpd
+    try:
+        httpd = HTTPServer(('', int(http_port)), eddaHTTPRequest)
+    except socket.error as e:
+        print "Error: could not serve metrics on port {0}".format(http_port)
+        print e
+        return False
+    t = threading.Thread(target=httpd.serve_forever)
+    t.daemon = True
+    t.start()
+    return True
+
+
+def serve(http_port):
+    """Opens the page and serves it until interrupted"""
     # fork here!
     t = threading.Thread(target=run(http_port))
     t.start()
@@ -67,14 +115,19 @@ def send_to_js(frames, servers, info, http_port):
     print "================================================================="
     print "Opening server, kill with Ctrl+C once you are finished with edda."
     print "================================================================="
-    try:
-        server = HTTPServer(('', int(http_port)), eddaHTTPRequest)
-    except socket.error, (value, message):
-        if value == 98:
-            print "Error: could not bind to localhost:28018"
-        else:
-            print message
-            return
+    if httpd:
+        # stop serving in the background, and serve from here
+        httpd.shutdown()
+        server = httpd
+    else:
+        try:
+            server = HTTPServer(('', int(http_port)), eddaHTTPRequest)
+        except socket.error, (value, message):
+            if value == 98:
+                print "Error: could not bind to localhost:28018"
+            else:
+                print message
+                return
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -84,6 +137,68 @@ def send_to_js(frames, servers, info, http_port):
         return
 
 
+def frames_json(frames, numbers):
+    """Returns the json of a dictionary of the given frames,
+    by number.  Frames read lazily from a saved file are copied
+    from it as they are, without being parsed."""
+    if not hasattr(frames, "raw"):
+        return json.dumps(dict((str(i), frames[str(i)]) for i in numbers))
+    parts = ['"{0}": {1}'.format(i, frames.raw(str(i))) for i in numbers]
+    return "{" + ", ".join(parts) + "}"
+
+
+def topology_json(frames, text):
+    """Returns the json of the state of the network at the
+    date given as text, or None if it is not a valid date."""
+    text = urllib.unquote(text)
+    for date_format in DATE_FORMATS:
+        try:
+            date = datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+        return json.dumps(topology_at(frames, date))
+    return None
+
+
+def search_json(info, args):
+    """Returns the json of the frame numbers found by an event
+    search, given as the query string of the request: the 'type',
+    'target' and 'state' of the events, any of which may be left
+    out, and what to 'find': the 'next' or 'previous' frame showing
+    such an event, from 'frame', or 'all' of them (the default).
+    Returns None if the search is not valid."""
+    query = dict((k, v[0]) for k, v in urlparse.parse_qs(args).items())
+    index = EventIndex(info.get("event_index", {}))
+    fields = [query.get("type"), query.get("target"), query.get("state")]
+    find = query.get("find", "all")
+    if find == "all":
+        return json.dumps({"frames": index.frames(*fields)})
+    try:
+        frame = int(query.get("frame", ""))
+    except ValueError:
+        return None
+    if find == "next":
+        found = index.next(frame, *fields)
+    elif find == "previous":
+        found = index.previous(frame, *fields)
+    else:
+        return None
+    return json.dumps({"frames": [found] if found is not None else []})
+
+
+def index_page():
+    """Returns an html page linking to each cluster
+    served in batch mode."""
+    rows = []
+    for name in sorted(clusters):
+        frames, servers, info = clusters[name]
+        rows.append('<li><a href="{0}/">{0}</a> ({1} frames, {2} servers)'
+                    '</li>'.format(cgi.escape(name), len(frames),
+                                   len(servers["self_name"])))
+    return ("<html><head><title>edda</title></head><body>"
+            "<h1>edda</h1><ul>" + "".join(rows) + "</ul></body></html>")
+
+
 class eddaHTTPRequest(BaseHTTPRequestHandler):
 
     mimetypes = mimetypes = {"html": "text/html",
@@ -108,35 +223,78 @@ class eddaHTTPRequest(BaseHTTPRequestHandler):
 
         uri = uri.strip('/')
 
-        # default "/" to "edda.html"
+        # in batch mode, each cluster is served under its name
+        cluster = None
+        (name, slash, rest) = uri.partition('/')
+        if name in clusters:
+            cluster = name
+            uri = rest
+
+        # default "/" to "edda.html", or to the
+        # index of clusters in batch mode
         if len(uri) == 0:
-            uri = "edda.html"
+            if clusters and not cluster:
+                uri = "index.clusters"
+            else:
+                uri = "edda.html"
 
         # find type of file
         (temp, dot, file_type) = uri.rpartition('.')
         if len(dot) == 0:
             file_type = ""
+        if uri == "metrics":
+            file_type = "metrics"
 
-        return (uri, args, file_type)
+        return (uri, args, file_type, cluster)
 
     def do_GET(self):
         # do nothing with message
         # return data
-        (uri, args, file_type) = self.process_uri("GET")
+        (uri, args, file_type, cluster) = self.process_uri("GET")
 
         if len(file_type) == 0:
             return
 
-        if file_type == "admin":
+        # served while the logs are read, too
+        if file_type == "metrics":
+            self.send_response(200)
+            self.send_header("Content-type", metrics.CONTENT_TYPE)
+            self.end_headers()
+            self.wfile.write(metrics.render().encode("utf-8"))
+            return
+
+        if (data is None and not clusters and
+            not file_type in self.mimetypes):
+            self.send_error(503, 'Still reading the logs')
+            return
+
+        frames, servers, info = data, server_list, admin
+        if cluster:
+            # the page asks for its data relative to its own url
+            if self.path.partition('?')[0] == "/" + cluster:
+                self.send_response(301)
+                self.send_header("Location", "/" + cluster + "/")
+                self.end_headers()
+                return
+            frames, servers, info = clusters[cluster]
+
+        if file_type == "clusters":
+            self.send_response(200)
+            self.send_header("Content-type", 'text/html')
+            self.end_headers()
+            self.wfile.write(index_page())
+
+        elif file_type == "admin":
             #admin = {}
-            admin["total_frame_count"] = len(data)
+            info["total_frame_count"] = len(frames)
             self.send_response(200)
             self.send_header("Content-type", 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(admin))
+            self.wfile.write(json.dumps(dict(
+                (k, v) for k, v in info.items() if not k in SERVED_APART)))
 
         elif file_type == "all_frames":
-            self.wfile.write(json.dumps(data))
+            self.wfile.write(frames_json(frames, range(len(frames))))
 
         # format of a batch request is
         # 'start-end.batch'
@@ -151,34 +309,72 @@ class eddaHTTPRequest(BaseHTTPRequestHandler):
                 end = int(parts[2])
             except ValueError:
                 end = 0
-            batch = {}
-
             # check for entries out of range
             if end < 0:
                 return
             if start < 0:
                 start = 0;
-            if start >= len(data):
+            if start >= len(frames):
                 return
-            if end >= len(data):
-                end = len(data) - 1
+            if end >= len(frames):
+                end = len(frames) - 1
 
+            batch = []
             for i in range(start, end):
-                if not str(i) in data:
+                if not str(i) in frames:
                     break
-                batch[str(i)] = data[str(i)];
+                batch.append(i)
 
             self.send_response(200)
             self.send_header("Content-type", 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(batch))
+            self.wfile.write(frames_json(frames, batch))
 
 
+        # format of a topology request is
+        # 'YYYY-MM-DDTHH:MM:SS.topology'
+        elif file_type == "topology":
+            topology = topology_json(frames, uri[:len(uri) - 9])
+            if topology is None:
+                self.send_error(400, 'Invalid date: ' + uri)
+                return
+            self.send_response(200)
+            self.send_header("Content-type", 'application/json')
+            self.end_headers()
+            self.wfile.write(topology)
+
+        # format of an event search is 'events.search?type=status
+        # &target=3&state=DOWN&find=next&frame=120', see search_json()
+        elif file_type == "search":
+            found = search_json(info, args)
+            if found is None:
+                self.send_error(400, 'Invalid search: ' + args)
+                return
+            self.send_response(200)
+            self.send_header("Content-type", 'application/json')
+            self.end_headers()
+            self.wfile.write(found)
+
+        # format of a density request is '<resolution>.density',
+        # or 'all.density' for every level
+        elif file_type == "density":
+            density = info.get("density", {})
+            level = uri[:len(uri) - 8]
+            if level != "all":
+                if not level in density:
+                    self.send_error(404, 'No density level: ' + level)
+                    return
+                density = density[level]
+            self.send_response(200)
+            self.send_header("Content-type", 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(density, separators=(",", ":")))
+
         elif file_type == "servers":
             self.send_response(200)
             self.send_header("Content-type", 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(server_list))
+            self.wfile.write(json.dumps(servers))
 
         elif file_type in self.mimetypes and os.path.exists(self.docroot + uri):
             f = open(self.docroot + uri, 'r')
@@ -0,0 +1,76 @@
+# Copyright 2009-2012 10gen, Inc.
+#
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# The density of a run is a histogram of its events per time bucket,
+# at several resolutions, broken down by type and by server, that the
+# page draws as a strip above the slider.  Each level of the histogram
+# is a list of its non-empty buckets, in order by time, each given as
+# [start, events, {type: events}, {server: events}, first, last]:
+# start is the start of the bucket in seconds since the epoch, and
+# first and last are the numbers of the first and last frames dated
+# within it, or None.  It is saved with the frames as admin["density"].
+
+from edda.ui.frames import date_seconds
+
+# seconds per bucket in each level of the histogram
+DENSITY_RESOLUTIONS = [60, 3600, 86400]
+
+
+class EventCounts(object):
+    """Counts events per time bucket at each resolution,
+    by type and by server."""
+
+    def __init__(self, resolutions=DENSITY_RESOLUTIONS):
+        # bucket number -> [events, {type: events}, {server: events}],
+        # for each resolution
+        self.buckets = dict((r, {}) for r in resolutions)
+
+    def count(self, e):
+        """Counts event e in its bucket at each resolution."""
+        seconds = date_seconds(e["date"])
+        target = str(e["target"])
+        for resolution, buckets in self.buckets.items():
+            n = seconds / resolution
+            if not n in buckets:
+                buckets[n] = [0, {}, {}]
+            bucket = buckets[n]
+            bucket[0] += 1
+            bucket[1][e["type"]] = bucket[1].get(e["type"], 0) + 1
+            bucket[2][target] = bucket[2].get(target, 0) + 1
+
+    def counted(self, events):
+        """Passes on events, counting each."""
+        for e in events:
+            self.count(e)
+            yield e
+
+    def histograms(self, dates):
+        """Returns the levels of the histogram, keyed by resolution
+        as a string, given the date of each frame, as datetimes."""
+        levels = {}
+        for resolution, buckets in self.buckets.items():
+            # first and last frame of each bucket
+            frames = {}
+            for i, date in enumerate(dates):
+                n = date_seconds(date) / resolution
+                frames.setdefault(n, [i, i])[1] = i
+            level = []
+            for n in sorted(buckets):
+                events, types, servers = buckets[n]
+                first, last = frames.get(n, [None, None])
+                level.append([n * resolution, events, types, servers,
+                              first, last])
+            levels[str(resolution)] = level
+        return levels
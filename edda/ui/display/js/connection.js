@@ -12,6 +12,12 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+// batches of frames are fetched and decoded by a web worker,
+// see frame_worker.js, so that the page only has to draw them
+var frame_worker = null;
+// the batch last asked of the worker, as "start-end"
+var pending_batch = null;
+
 // without the async messing things up?
 function connect() {
 
@@ -22,7 +28,9 @@ function connect() {
     if (frame_top > total_frame_count) { frame_top = total_frame_count; }
 
     // poll for additional setup data
-    url_string = document.URL + "data.admin";
+    // urls are relative to the page, which batch mode
+    // serves under the name of each cluster
+    url_string = "data.admin";
     //console.log(document.URL );
     $.ajax({
         async: false,
@@ -35,7 +43,7 @@ function connect() {
     });
 
     // poll for the server names
-    url_string = document.URL + "data.servers";
+    url_string = "data.servers";
     $.ajax({
         async: false,
         url: url_string,
@@ -45,12 +53,16 @@ function connect() {
         }
     });
 
+    if (window.Worker) {
+        frame_worker = new Worker("js/frame_worker.js");
+        frame_worker.onmessage = batch_received;
+    }
 }
 
-// this function is not finished
+// fetch a batch of frames, waiting for it
 function get_batch(a, b) {
     // poll for a batch of frames
-    var s = document.URL + a + "-" + b + ".batch";
+    var s = a + "-" + b + ".batch";
     $.ajax({
         async: false,
         url: s,
@@ -60,3 +72,59 @@ function get_batch(a, b) {
         }
     });
 }
+
+// the next or previous frame from 'frame' showing an
+// event of the search 'query', or null if there is none
+function find_event(query, find, frame) {
+    var found = null;
+    $.ajax({
+        async: false,
+        url: "events.search?" + query + "&find=" + find + "&frame=" + frame,
+        dataType: "json",
+        success: function(data) {
+        if (data["frames"].length > 0) { found = data["frames"][0]; }
+        }
+    });
+    return found;
+}
+
+// every level of the event density histogram, by resolution
+function get_density() {
+    var levels = {};
+    $.ajax({
+        async: false,
+        url: "all.density",
+        dataType: "json",
+        success: function(data) {
+        levels = data;
+        }
+    });
+    return levels;
+}
+
+// ask the worker for a batch of frames, which are shown
+// once they arrive; without a worker, wait for them instead
+function request_batch(a, b) {
+    if (!frame_worker) {
+        get_batch(a, b);
+        return;
+    }
+    pending_batch = a + "-" + b;
+    frame_worker.postMessage({"batch" : pending_batch, "url" : page_url(pending_batch + ".batch")});
+}
+
+// a batch decoded by the worker
+function batch_received(e) {
+    // skip batches asked for before the latest one
+    if (e.data["batch"] !== pending_batch) { return; }
+    pending_batch = null;
+    frames = e.data["frames"];
+    show_frame(current_frame);
+}
+
+// the worker resolves urls against its own script,
+// so give it urls relative to the page instead
+function page_url(path) {
+    var url = document.URL.split("#")[0].split("?")[0];
+    return url.substring(0, url.lastIndexOf("/") + 1) + path;
+}
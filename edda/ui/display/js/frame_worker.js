@@ -0,0 +1,31 @@
+// Copyright 2009-2012 10gen, Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+// http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// A web worker fetching and decoding batches of frames for
+// the page (see request_batch() in connection.js), so that
+// large batches do not hold up drawing.
+// It is sent {"batch" : "start-end", "url" : url of the batch}
+// and answers {"batch" : "start-end", "frames" : frames by number}
+
+onmessage = function(e) {
+    var frames = {};
+    var request = new XMLHttpRequest();
+    // waiting here only holds up the worker
+    request.open("GET", e.data["url"], false);
+    request.send(null);
+    if (request.status === 200 && request.responseText) {
+        frames = JSON.parse(request.responseText);
+    }
+    postMessage({"batch" : e.data["batch"], "frames" : frames});
+};
@@ -12,106 +12,151 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+// server glyphs are drawn once for each state and size to an
+// offscreen canvas, then copied onto the server layer
+var sprites = {};
+// room left around a server's circle for its outline
+var sprite_pad = 12;
+// what the arrow and server layers currently show: the links,
+// broken links and syncs of the frame, and the state of each server
+var displayed = {"edges" : null, "servers" : {}};
+
 render = function(time) {
     // this function renders a single frame, based
-    // on the time
-    // could be more efficient than wiping everything every time...
+    // on the time.  Only the servers whose state changed
+    // since the last frame are repainted, and the links,
+    // broken links and syncs only when one of them changed.
 
     // check that there exists a corresponding frame
     if (frames[time]) {
+        render_edges(frames[time]);
+        render_servers(frames[time]);
+    }
+};
 
-    // wipe server layer and draw all servers
-    canvases["server"].width = canvases["server"].width;
-    var first = false;
-    var prevx, prevy;
-    var count = 0;
-    var xvals = [], yvals = [];
+render_edges = function(frame) {
+    // redraw the arrow layer if the links, broken links
+    // or syncs of this frame differ from those displayed
+    var edges = JSON.stringify([frame["links"], frame["broken_links"], frame["syncs"]]);
     var list, i;
-
-    clear_layers();
+    if (edges === displayed["edges"]) { return; }
+    displayed["edges"] = edges;
+    canvases["arrow"].width = canvases["arrow"].width;
 
     // draw links
-    for (var origin_server in frames[time]["links"]) {
-        list = frames[time]["links"][origin_server];
+    for (var origin_server in frame["links"]) {
+        list = frame["links"][origin_server];
         for (i = 0; i < list.length; i++) {
             one_line(servers[origin_server]["x"], servers[origin_server]["y"], servers[list[i]]["x"], servers[list[i]]["y"], contexts["arrow"]);
         }
     }
 
     // draw broken links
-    for (origin_server in frames[time]["broken_links"]) {
-        var list2 = frames[time]["broken_links"][origin_server];
-        for (i = 0; i < list2.length; i++) {
-            broken_link(servers[origin_server]["x"], servers[origin_server]["y"], servers[list2[i]]["x"], servers[list2[i]]["y"], contexts["arrow"]);
+    for (origin_server in frame["broken_links"]) {
+        list = frame["broken_links"][origin_server];
+        for (i = 0; i < list.length; i++) {
+            broken_link(servers[origin_server]["x"], servers[origin_server]["y"], servers[list[i]]["x"], servers[list[i]]["y"], contexts["arrow"]);
         }
     }
 
     // draw syncs
-    for (origin_server in frames[time]["syncs"]) {
-        list = frames[time]["syncs"][origin_server];
+    for (origin_server in frame["syncs"]) {
+        list = frame["syncs"][origin_server];
         for (i = 0; i < list.length; i++) {
             one_arrow(servers[list[i]]["x"], servers[list[i]]["y"], servers[origin_server]["x"], servers[origin_server]["y"], contexts["arrow"]);
         }
     }
+};
+
+render_servers = function(frame) {
+    // repaint the servers whose state differs from the one displayed
+    var ctx = contexts["server"];
+    for (var name in frame["servers"]) {
+        var state = frame["servers"][name];
+        if (displayed["servers"][name] === state) { continue; }
+        displayed["servers"][name] = state;
 
-    for (var name in frames[time]["servers"]) {
-        var state = frames[time]["servers"][name];
+        var s = servers[name];
+        var sprite = server_sprite(state, s["r"]);
+        var x = Math.round(s["x"]) - sprite.width/2;
+        var y = Math.round(s["y"]) - sprite.height/2;
+        ctx.clearRect(x, y, sprite.width, sprite.height);
+        ctx.drawImage(sprite, x, y);
+    }
+};
+
+server_sprite = function(state, r) {
+    // return the offscreen canvas showing a server
+    // in this state with radius r, drawing it if needed
+    var key = state + "/" + r;
+    if (!sprites[key]) {
+        var size = 2 * Math.ceil(r + sprite_pad);
+        var sprite = document.createElement("canvas");
+        sprite.width = size;
+        sprite.height = size;
+        draw_server(state, size/2, size/2, r, sprite.getContext("2d"));
+        sprites[key] = sprite;
+    }
+    return sprites[key];
+};
+
+draw_server = function(state, x, y, r, ctx) {
+    // draw a server in this state with radius r centered at (x, y)
     // add logic to parse out ".LOCKED"
     // to capture actual server state
     var n = state.split(".");
-    state = n[0];
-        switch(state) {
+    switch(n[0]) {
     case "STARTUP1":
-        startup1(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        startup1(x, y, r, ctx);
         break;
     case "STARTUP2":
-        startup2(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        startup2(x, y, r, ctx);
         break;
     case "PRIMARY":
-        primary(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        primary(x, y, r, ctx);
         break;
     case "SECONDARY":
-        //console.log("I found a secondary.");
-        secondary(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        secondary(x, y, r, ctx);
         break;
     case "ARBITER":
-        arbiter(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        arbiter(x, y, r, ctx);
         break;
     case "DOWN":
-        down(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        down(x, y, r, ctx);
         break;
     case "RECOVERING":
-        recovering(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        recovering(x, y, r, ctx);
         break;
     case "ROLLBACK":
-        rollback(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        rollback(x, y, r, ctx);
         break;
     case "FATAL":
-        fatal(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        fatal(x, y, r, ctx);
         break;
     case "UNKNOWN":
-        unknown(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        unknown(x, y, r, ctx);
         break;
     case "UNDISCOVERED":
-        undiscovered(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        undiscovered(x, y, r, ctx);
         break;
     case "REMOVED":
-        removed(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        removed(x, y, r, ctx);
         break;
     case "STALE":
-        stale(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
+        stale(x, y, r, ctx);
         break;
     }
 
     // add lock, if necessary
     if (n.length > 1) {
-        lock(servers[name]["x"], servers[name]["y"], servers[name]["r"], contexts["server"]);
-    }
-    }
+        lock(x, y, r, ctx);
     }
 };
 
 clear_layers = function() {
+    // wipe the arrow and server layers, so that
+    // the next frame is rendered in full
     canvases["arrow"].width = canvases["arrow"].width;
     canvases["server"].width = canvases["server"].width;
+    displayed = {"edges" : null, "servers" : {}};
 };
@@ -36,6 +36,29 @@ var frames;
 var admin;
 var total_frame_count;
 
+// frame numbers shown by the slider when zoomed out,
+// or null to show every frame
+var timeline = null;
+
+// the level of the event density histogram drawn above the
+// slider, as a list of buckets (see density.py), its resolution
+// in seconds, and the time at the left edge of the strip
+var density = null;
+var density_resolution;
+var density_start;
+var density_span;
+
+// the events the page can jump to, as event searches,
+// see search_json() in connection.py
+var event_queries = {
+    "elections" : "type=status&state=PRIMARY",
+    "servers going down" : "state=DOWN",
+    "status changes" : "type=status",
+    "syncs" : "type=sync",
+    "fsync locks" : "type=LOCKED",
+    "reconfigs" : "type=reconfig"
+};
+
 
 // call various setup functions
 function edda_setup() {
@@ -43,7 +66,10 @@ function edda_setup() {
     mouse_over_setup();
     connect();  // see connection.js
     time_setup(size(frames));
+    detail_setup();
     visual_setup();
+    search_setup();
+    density_setup();
     version_number();
     file_names();
 
@@ -75,6 +101,7 @@ function visual_setup() {
     for (var name in layers) {
     canvases[layers[name]].width = canvases[layers[name]].width;
     }
+    clear_layers();
 
     // color background
     var b_cvs = canvases["background"];
@@ -107,42 +134,203 @@ function visual_setup() {
 function time_setup(max_time) {
 
     $("#slider").slider({ slide: function(event, ui) {
+        var frame = frame_number(ui.value);
         // handle frame batches
-        if (ui.value >= current_frame) { direction = 1; }
+        if (frame >= current_frame) { direction = 1; }
         else { direction = -1; }
-        current_frame = ui.value;
+        current_frame = frame;
         handle_batches();
-        document.getElementById(
-            "timestamp").innerHTML = "Time: " + frames[ui.value]["date"].substring(5, 50);
-        document.getElementById(
-            "summary").innerHTML = "Event " + ui.value + ": " + frames[ui.value]["summary"];
-
-        // erase pop-up box
-        document.getElementById("message_box").style.visibility = "hidden";
-
-        // print witnesses, as hostnames
-        var w = "";
-        var s;
-        for (s in frames[ui.value]["witnesses"]) {
-            if (w !== "") {
-            w += "<br/>";
-            }
-            w += labels[frames[ui.value]["witnesses"][s]];
+        }});
+    $("#slider").slider( "option", "max", total_frame_count - 2);
+}
+
+
+// render a frame and describe it, if it is loaded;
+// otherwise it is shown once its batch arrives
+function show_frame(frame) {
+    if (!frames[frame]) { return; }
+    render(frame);
+    document.getElementById(
+        "timestamp").innerHTML = "Time: " + frames[frame]["date"].substring(5, 50);
+    document.getElementById(
+        "summary").innerHTML = "Event " + frame + ": " + frames[frame]["summary"];
+
+    // erase pop-up box
+    document.getElementById("message_box").style.visibility = "hidden";
+
+    // print witnesses, as hostnames
+    var w = "";
+    var s;
+    for (s in frames[frame]["witnesses"]) {
+        if (w !== "") {
+        w += "<br/>";
         }
-        document.getElementById("witnesses").innerHTML = "Witnessed event:<br/>" + w;
+        w += labels[frames[frame]["witnesses"][s]];
+    }
+    document.getElementById("witnesses").innerHTML = "Witnessed event:<br/>" + w;
 
-        // print dissenters, as hostnames
-        var d = "";
-        for (s in frames[ui.value]["dissenters"]) {
-            if (d !== "") {
-            d += "<br/>";
-            }
-            d += labels[frames[ui.value]["dissenters"][s]];
+    // print dissenters, as hostnames
+    var d = "";
+    for (s in frames[frame]["dissenters"]) {
+        if (d !== "") {
+        d += "<br/>";
         }
-        document.getElementById("dissenters").innerHTML = "Blind to event:<br/>" + d;
+        d += labels[frames[frame]["dissenters"][s]];
+    }
+    document.getElementById("dissenters").innerHTML = "Blind to event:<br/>" + d;
+}
 
-        }});
-    $("#slider").slider( "option", "max", total_frame_count - 2);
+
+// fill in the level of detail menu from the
+// timelines built by the server
+function detail_setup() {
+    var menu = document.getElementById("detail");
+    var names = {"1" : "per second", "60" : "per minute", "3600" : "per hour"};
+    var level;
+    if (!admin["timelines"] || size(admin["timelines"]) === 0) {
+        menu.style.visibility = "hidden";
+        return;
+    }
+    menu.options.add(new Option("every event", ""));
+    for (level in admin["timelines"]) {
+        if (names[level]) { menu.options.add(new Option(names[level], level)); }
+        else { menu.options.add(new Option("per " + level + " seconds", level)); }
+    }
+}
+
+
+// switch the slider to another level of detail
+function set_detail(level) {
+    var max;
+    if (level && admin["timelines"][level]) {
+        timeline = admin["timelines"][level];
+        max = timeline.length - 1;
+    }
+    else {
+        timeline = null;
+        max = total_frame_count - 2;
+    }
+    $("#slider").slider("option", "max", max);
+    $("#slider").slider("option", "value", slider_value(current_frame));
+}
+
+
+// fill in the event search menus, once the
+// servers have been labeled by visual_setup()
+function search_setup() {
+    var queries = document.getElementById("event_query");
+    var menu = document.getElementById("event_server");
+    var name;
+    for (name in event_queries) {
+        queries.options.add(new Option(name, event_queries[name]));
+    }
+    menu.options.add(new Option("any server", ""));
+    for (name in labels) {
+        menu.options.add(new Option(labels[name], name));
+    }
+}
+
+
+// move to the next or previous frame showing
+// the event chosen in the search menus
+function jump_to_event(find) {
+    var query = document.getElementById("event_query").value;
+    var server = document.getElementById("event_server").value;
+    if (server) { query += "&target=" + server; }
+    var frame = find_event(query, find, current_frame);
+    if (frame === null) { return; }
+    jump_to(frame);
+}
+
+
+// move the slider to a frame, loading only its batch
+function jump_to(frame) {
+    if (frame >= current_frame) { direction = 1; }
+    else { direction = -1; }
+    current_frame = frame;
+    $("#slider").slider("option", "value", slider_value(frame));
+    handle_batches();
+}
+
+
+// draw the density of events over time above the slider,
+// at the finest level with no more buckets than pixels
+function density_setup() {
+    var strip = document.getElementById("density_strip");
+    var levels = get_density();
+    var level, buckets, span, i;
+    var resolutions = [];
+    for (level in levels) {
+        if (levels[level].length > 0) { resolutions.push(parseInt(level, 10)); }
+    }
+    if (resolutions.length === 0) {
+        strip.style.display = "none";
+        return;
+    }
+    resolutions.sort(function(a, b) { return a - b; });
+    for (i = 0; i < resolutions.length; i++) {
+        buckets = levels[resolutions[i]];
+        span = buckets[buckets.length - 1][0] - buckets[0][0] + resolutions[i];
+        if (span / resolutions[i] <= strip.width) { break; }
+    }
+    if (i === resolutions.length) { i--; }
+    density = levels[resolutions[i]];
+    density_resolution = resolutions[i];
+    density_start = density[0][0];
+    density_span = density[density.length - 1][0] - density_start + density_resolution;
+    draw_density(strip);
+    strip.addEventListener("click", density_click, false);
+}
+
+
+// one bar per bucket, as high as its share of the busiest bucket
+function draw_density(strip) {
+    var ctx = strip.getContext("2d");
+    var most = 0;
+    var i, x, w, h;
+    for (i = 0; i < density.length; i++) {
+        if (density[i][1] > most) { most = density[i][1]; }
+    }
+    ctx.clearRect(0, 0, strip.width, strip.height);
+    ctx.fillStyle = "#4E3629";
+    w = Math.max(1, strip.width * density_resolution / density_span);
+    for (i = 0; i < density.length; i++) {
+        x = strip.width * (density[i][0] - density_start) / density_span;
+        h = Math.max(1, strip.height * density[i][1] / most);
+        ctx.fillRect(x, strip.height - h, w, h);
+    }
+}
+
+
+// jump to the first frame at or after the clicked time
+function density_click(e) {
+    var strip = document.getElementById("density_strip");
+    var x = e.clientX - strip.getBoundingClientRect().left;
+    var time = density_start + density_span * x / strip.width;
+    for (var i = 0; i < density.length; i++) {
+        if (density[i][0] + density_resolution > time && density[i][4] !== null) {
+            jump_to(density[i][4]);
+            return;
+        }
+    }
+}
+
+
+// the frame number shown at this slider position
+function frame_number(value) {
+    if (timeline) { return timeline[value]; }
+    return value;
+}
+
+
+// the slider position showing this frame, or the
+// closest one after it
+function slider_value(frame) {
+    if (!timeline) { return frame; }
+    for (var i = 0; i < timeline.length; i++) {
+        if (timeline[i] >= frame) { return i; }
+    }
+    return timeline.length - 1;
 }
 
 // handle frame batches
@@ -150,30 +338,30 @@ function handle_batches() {
 
     // do we even have to batch?
     if (total_frame_count <= batch_size) {
-    render(current_frame);
+    show_frame(current_frame);
     return;
     }
 
     // handle case where user clicked entirely outside
-    // aka load frames and then render
+    // aka load frames, which renders once they arrive
     if (current_frame > frame_top ||
     current_frame < frame_bottom) {
     // force some garbage collection?
     slide_batch_window();
-    render(current_frame);
+    show_frame(current_frame);
     }
 
     // handle case where use is still within frame buffer
     // but close enough to edge to reload
     else if ((frame_top - current_frame < trigger && frame_top !== total_frame_count) ||
          (current_frame - frame_bottom < trigger && frame_bottom !== 0)) {
-    render(current_frame);
+    show_frame(current_frame);
     // force some garbage collection?
     slide_batch_window();
     }
 
     // otherwise, just render
-    else { render(current_frame); }
+    else { show_frame(current_frame); }
 }
 
 
@@ -194,7 +382,7 @@ function slide_batch_window() {
     frame_top = total_frame_count - 1;
     frame_bottom = frame_top - batch_size;
     }
-    get_batch(frame_bottom, frame_top);
+    request_batch(frame_bottom, frame_top);
 }
 
 
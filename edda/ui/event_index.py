@@ -0,0 +1,107 @@
+# Copyright 2009-2012 10gen, Inc.
+#
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python
+
+# Frames are indexed by the events they show, so that the page can
+# jump straight to, say, the next frame where server 3 went DOWN.
+# Each event is indexed under its type, target and state, and under
+# every combination of them with a wildcard in place of some, so
+# that any of them can be left out of a query.  The index maps
+# each key to the sorted list of frame numbers with such an event,
+# and is saved with the frames as admin["event_index"].
+
+import bisect
+
+from collections import deque
+
+# stands for any type, target or state
+WILDCARD = "*"
+
+
+def index_key(type=None, target=None, state=None):
+    """Returns the key of the events of this type, target
+    and state, any of which may be None for any of them"""
+    return "/".join([str(field) if field is not None else WILDCARD
+                     for field in [type, target, state]])
+
+
+def event_keys(e):
+    """Returns the keys event e is indexed under."""
+    fields = [e["type"], e["target"], e.get("state")]
+    keys = set()
+    for mask in range(8):
+        keys.add(index_key(*[None if mask & (1 << i) else field
+                             for i, field in enumerate(fields)]))
+    return keys
+
+
+class EventIndex(object):
+    """An index of frame numbers by the events they show.
+    'postings', if given, is the dictionary of a saved index.
+    """
+
+    def __init__(self, postings=None):
+        if postings is None:
+            postings = {}
+        self.postings = postings
+        # keys of the events read by indexed()
+        # that no frame has shown yet
+        self.pending = deque()
+
+    def add(self, n, keys):
+        """Records that frame n shows an event with these keys.
+        Frames must be added in order."""
+        for key in keys:
+            frames = self.postings.setdefault(key, [])
+            if not frames or frames[-1] != n:
+                frames.append(n)
+
+    def indexed(self, events):
+        """Passes on events, given in order, noting their
+        keys for indexed_frames()."""
+        for e in events:
+            self.pending.append(event_keys(e))
+            yield e
+
+    def indexed_frames(self, frames):
+        """Passes on the frames generated from the events passed
+        through indexed(), in order, and indexes each under the
+        events it shows: one, or 'event_count' if coalesced."""
+        for n, f in enumerate(frames):
+            for i in range(f.get("event_count", 1)):
+                self.add(n, self.pending.popleft())
+            yield f
+
+    def frames(self, type=None, target=None, state=None):
+        """Returns the sorted numbers of the frames showing
+        an event of this type, target and state"""
+        return self.postings.get(index_key(type, target, state), [])
+
+    def next(self, frame, type=None, target=None, state=None):
+        """Returns the number of the first such frame after
+        'frame', or None"""
+        frames = self.frames(type, target, state)
+        i = bisect.bisect_right(frames, frame)
+        if i < len(frames):
+            return frames[i]
+        return None
+
+    def previous(self, frame, type=None, target=None, state=None):
+        """Returns the number of the last such frame before
+        'frame', or None"""
+        frames = self.frames(type, target, state)
+        i = bisect.bisect_left(frames, frame)
+        if i > 0:
+            return frames[i - 1]
+        return None
@@ -12,14 +12,29 @@
 # limitations under the License.
 
 #!/usr/bin/env python
+import bisect
 import logging
+import multiprocessing
 import string
 
+from collections import deque
 from copy import deepcopy
+from datetime import datetime
 from operator import itemgetter
 
 LOGGER = logging.getLogger(__name__)
 
+# the fields of a frame that make up the topology of the network
+TOPOLOGY = ["servers", "links", "broken_links", "syncs"]
+# the fields of a frame that each frame builds on
+CARRIED = TOPOLOGY + ["users"]
+# events per segment when frames are generated in several processes
+SEGMENT_EVENTS = 1000
+# most summaries kept for a frame made of several events
+MAX_SUMMARIES = 10
+# seconds per frame in each level of detail timeline
+TIMELINE_RESOLUTIONS = [1, 60, 3600]
+
 # The documents this module
 # generates will include the following information:
 
@@ -43,25 +58,37 @@ LOGGER = logging.getLogger(__name__)
 # users: {
        # server : [ list of users ]
 # }
+# Frames merged by coalesce_frames() also include:
+# end_date : (date of the last merged event, as string)
+# event_count : (number of events merged into this frame)
+# summaries : (list of the first MAX_SUMMARIES summaries)
 
 
-def generate_frames(unsorted_events, db, collName):
+def generate_frames(unsorted_events, storage):
     """Given a list of events, generates and returns a list of frames
     to be passed to JavaScript client to be animated"""
-    # for now, program will assume that all servers
-    # view the world in the same way.  If it detects something
-    # amiss between two or more servers, it will set the 'flag'
-    # to true, but will do nothing further.
-
-    frames = {}
-    last_frame = None
-    i = 0
-
     # sort events by date
     events = sorted(unsorted_events, key=itemgetter("date"))
 
     # get all servers
-    servers = list(db[collName + ".servers"].distinct("server_num"))
+    servers = list(storage.servers.distinct("server_num"))
+
+    frames = {}
+    for i, f in enumerate(iter_frames(events, servers)):
+        frames[str(i)] = f
+    return frames
+
+
+def iter_frames(events, servers, start=None):
+    """Given events in order by date and a list of server_nums,
+    generates one frame per event.  Only the last frame is kept
+    in memory.  The first frame builds on the CARRIED fields of
+    'start', if given, instead of on undiscovered servers."""
+    # for now, program will assume that all servers
+    # view the world in the same way.  If it detects something
+    # amiss between two or more servers, it will set the 'flag'
+    # to true, but will do nothing further.
+    last_frame = start
 
     for e in events:
         LOGGER.debug("Generating frame for a type {0} event with target {1}"
@@ -79,12 +106,71 @@ def generate_frames(unsorted_events, db, collName):
             f["broken_links"] = deepcopy(last_frame["broken_links"])
             f["users"] = deepcopy(last_frame["users"])
             f["syncs"] = deepcopy(last_frame["syncs"])
+        add_servers(f, e)
         f = witnesses_dissenters(f, e)
         f = info_by_type(f, e)
         last_frame = f
-        frames[str(i)] = f
-        i += 1
-    return frames
+        yield f
+
+
+def iter_checkpoints(events, servers, size=SEGMENT_EVENTS):
+    """Splits events, given in order by date, into segments of
+    'size' events, and generates (checkpoint, segment) tuples.  The
+    checkpoint holds the CARRIED fields that the first frame of the
+    segment builds on, or is None for the first segment.  Only one
+    state is updated from event to event, without building frames,
+    so this is much faster than iter_frames().  Servers first
+    mentioned by an event are added to the state, so checkpoints
+    carry them to the later segments.
+    """
+    state = new_frame(servers)
+    checkpoint = None
+    segment = []
+    for e in events:
+        segment.append(e)
+        add_servers(state, e)
+        witnesses_dissenters(state, e)
+        info_by_type(state, e)
+        if len(segment) == size:
+            yield checkpoint, segment
+            checkpoint = dict((field, deepcopy(state[field]))
+                              for field in CARRIED)
+            segment = []
+    if segment:
+        yield checkpoint, segment
+
+
+def iter_parallel_frames(events, servers, workers, size=SEGMENT_EVENTS):
+    """Generates the same frames as iter_frames(), expanding the
+    segments of iter_checkpoints() into frames in a pool of
+    'workers' processes.  At most two segments per worker are
+    pending at once, so memory use does not grow with the
+    number of events.
+    """
+    # the pool is started before reading any event, so that
+    # it does not fork the processes matching them
+    pool = multiprocessing.Pool(workers)
+    pending = deque()
+    try:
+        for checkpoint, segment in iter_checkpoints(events, servers, size):
+            pending.append(pool.apply_async(
+                expand_segment, [(servers, checkpoint, segment)]))
+            while len(pending) > 2 * workers:
+                for f in pending.popleft().get():
+                    yield f
+        while pending:
+            for f in pending.popleft().get():
+                yield f
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def expand_segment(segment):
+    """Generates the frames of one segment from its checkpoint.
+    Runs in a worker process, and returns the frames as a list."""
+    servers, checkpoint, events = segment
+    return list(iter_frames(events, servers, checkpoint))
 
 
 def new_frame(server_nums):
@@ -111,6 +197,30 @@ def new_frame(server_nums):
     return f
 
 
+def add_servers(f, e):
+    """Adds the servers event e mentions that frame f does not
+    have yet to it, as UNDISCOVERED.  Events are matched while
+    frames are generated, so servers registered by matching are
+    not in the list of servers that the first frame was built from.
+    """
+    mentioned = [e["target"]] + e["witnesses"] + e["dissenters"]
+    if e["type"] == "sync":
+        mentioned.append(e["sync_to"])
+    for s in mentioned:
+        s = str(s)
+        if s in f["servers"]:
+            continue
+        LOGGER.debug("Adding server {0}, first seen in this event"
+                     .format(s))
+        f["servers"][s] = "UNDISCOVERED"
+        f["links"][s] = []
+        f["broken_links"][s] = []
+        f["users"][s] = []
+        f["syncs"][s] = []
+    f["server_count"] = len(f["servers"])
+    return f
+
+
 def witnesses_dissenters(f, e):
     """Using the witnesses and dissenters
     lists in event e, determine links that should
@@ -249,6 +359,9 @@ def info_by_type(f, e):
     elif e["type"] == "end_conn":
         if e["conn_addr"] in f["users"][s]:
             f["users"][s].remove(e["conn_addr"])
+    elif e["type"] == "conn_stats":
+        # show the busiest clients of this time bucket
+        f["users"][s] = [c[0] for c in e["conn_stats"]["clients"]]
 
     # syncs
     elif e["type"] == "sync":
@@ -293,3 +406,190 @@ def info_by_type(f, e):
         if f["servers"][server] == "DOWN" and server in e["witnesses"] and len(e["witnesses"]) < 2:
             f['servers'][s] = "UNDISCOVERED"
     return f
+
+
+def coalesce_frames(frames):
+    """Given frames generated by generate_frames(), merges each run
+    of consecutive frames that do not change the topology (server
+    states, links, broken links and syncs) into a single frame.
+    Returns the new, renumbered, frames.
+    """
+    coalesced = {}
+    ordered = (frames[str(n)] for n in range(len(frames)))
+    for i, f in enumerate(iter_coalesced(ordered)):
+        coalesced[str(i)] = f
+    LOGGER.debug("Coalesced {0} frames into {1}"
+                 .format(len(frames), len(coalesced)))
+    return coalesced
+
+
+def iter_coalesced(frames):
+    """Generates the frames of coalesce_frames() from
+    frames given in order."""
+    last = None
+    for f in frames:
+        if last and same_topology(last, f):
+            merge_frame(last, f)
+            continue
+        if last:
+            yield last
+        f["end_date"] = f["date"]
+        f["event_count"] = 1
+        f["summaries"] = [f["summary"]]
+        last = f
+    if last:
+        yield last
+
+
+def same_topology(a, b):
+    """Returns True if frames a and b show the same topology."""
+    for field in TOPOLOGY:
+        if a[field] != b[field]:
+            return False
+    return True
+
+
+def merge_frame(f, later):
+    """Merges the frame 'later' into frame f."""
+    f["users"] = later["users"]
+    f["end_date"] = later["date"]
+    f["flag"] = f["flag"] or later["flag"]
+    f["event_count"] += 1
+    if len(f["summaries"]) < MAX_SUMMARIES:
+        f["summaries"].append(later["summary"])
+    more = f["event_count"] - 1
+    f["summary"] = "{0} (and {1} more event{2})".format(
+        f["summaries"][0], more, "s" if more > 1 else "")
+
+
+def build_timelines(frames, resolutions=TIMELINE_RESOLUTIONS):
+    """Builds a level of detail timeline for each resolution,
+    in seconds.  A timeline is the list of frame numbers to show
+    when zoomed out to that resolution: the last frame of each
+    time bucket that has any frames.  Levels that would not hide
+    any frames are left out.  Returns a dictionary of timelines,
+    keyed by resolution, as strings.
+    """
+    dates = [frame_date(frames[str(n)]) for n in range(len(frames))]
+    return timelines_from_dates(dates, resolutions)
+
+
+def timelines_from_dates(dates, resolutions=TIMELINE_RESOLUTIONS):
+    """Builds the timelines of build_timelines() from the
+    list of frame dates, as datetimes."""
+    timelines = {}
+    previous = len(dates)
+    for resolution in sorted(resolutions):
+        timeline = []
+        last_bucket = None
+        for n, date in enumerate(dates):
+            bucket = date_seconds(date) / resolution
+            if bucket == last_bucket:
+                timeline[-1] = n
+            else:
+                timeline.append(n)
+            last_bucket = bucket
+        if len(timeline) >= previous:
+            continue
+        timelines[str(resolution)] = timeline
+        previous = len(timeline)
+    return timelines
+
+
+def frame_date(f):
+    """Returns the date of frame f as a datetime."""
+    date = f.get("end_date", f["date"])
+    return datetime.strptime(date[:19], "%Y-%m-%d %H:%M:%S")
+
+
+class FrameDates(object):
+    """The date each frame starts at, as a read-only list of
+    datetimes that the bisect module can search.  Frames are
+    only read when their date is looked up."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, n):
+        date = self.frames[str(n)]["date"]
+        return datetime.strptime(date[:19], "%Y-%m-%d %H:%M:%S")
+
+
+def topology_at(frames, date):
+    """Returns the state of the network at 'date', a datetime:
+    the CARRIED fields of the last frame starting at or before it,
+    along with its number, as "frame", and date.  Returns None if
+    'date' is before the first frame.  Each frame holds the whole
+    state, and frames are in order by date, so this is a binary
+    search that only reads O(log n) frames.
+    """
+    n = bisect.bisect_right(FrameDates(frames), date) - 1
+    if n < 0:
+        return None
+    f = frames[str(n)]
+    topology = dict((field, f[field]) for field in CARRIED)
+    topology["frame"] = n
+    topology["date"] = f["date"]
+    return topology
+
+
+def date_seconds(date):
+    """Returns a datetime as a number of seconds."""
+    delta = date - datetime(1970, 1, 1)
+    return delta.days * 86400 + delta.seconds
+
+
+def store_frames(frames, coll):
+    """Saves frames, given in order, to the collection coll
+    as they are generated, numbering them from 0.  Returns a
+    StoredFrames over the collection."""
+    coll.drop()
+    for i, f in enumerate(frames):
+        coll.insert({"_id": i, "date": frame_date(f), "frame": f})
+    return StoredFrames(coll)
+
+
+class StoredFrames(object):
+    """Read-only dictionary of frames saved by store_frames(),
+    keyed by frame number as a string like the dictionary
+    returned by generate_frames().  Frames are read from the
+    collection when they are looked up.
+    """
+
+    def __init__(self, coll):
+        self.coll = coll
+        self.count = coll.count()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        try:
+            n = int(key)
+        except ValueError:
+            return False
+        return 0 <= n < self.count
+
+    def __getitem__(self, key):
+        if not key in self:
+            raise KeyError(key)
+        return self.coll.find_one({"_id": int(key)})["frame"]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [str(n) for n in range(self.count)]
+
+    def itervalues(self):
+        """Generates the frames in order"""
+        for doc in self.coll.find().sort("_id", 1):
+            yield doc["frame"]
+
+    def dates(self):
+        """Returns the date of each frame, in order"""
+        cursor = self.coll.find({}, {"date": 1}).sort("_id", 1)
+        return [doc["date"] for doc in cursor]
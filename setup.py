@@ -49,7 +49,7 @@ setup(
   #packages = find_packages('src'),  # include all packages under src
   #package_dir = {'':'src'},   # tell distutils packages are under src
   scripts=['scripts/edda'],
-  install_requires=['pymongo'],
+  install_requires=['pymongo>=2.9,<3'],
 
   package_data={
     # If any package contains *.txt files, include them:
@@ -18,6 +18,7 @@ import unittest
 from datetime import datetime, timedelta
 from edda.post.server_matchup import *
 from edda.run_edda import assign_address
+from edda.storage import Storage
 from pymongo import Connection
 
 
@@ -93,7 +94,7 @@ class test_addr_matchup(unittest.TestCase):
     def test_empty(self):
         """Test on an empty database"""
         servers, entries, clock_skew, db = self.db_setup()
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
 
 
     def test_one_unknown(self):
@@ -101,21 +102,21 @@ class test_addr_matchup(unittest.TestCase):
         servers, entries, clock_skew, db = self.db_setup()
         # insert one unknown server
         assign_address(1, "unknown", True, servers)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_one_known(self):
         """Test on one named server (self_name)"""
         servers, entries, clock_skew, db = self.db_setup()
         assign_address(1, "Dumbledore", True, servers)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_one_known_IP(self):
         """Test on one named server (network_name)"""
         servers, entries, clock_skew, db = self.db_setup()
         assign_address(1, "100.54.24.66", False, servers)
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
 
 
     def test_all_servers_unknown(self):
@@ -127,7 +128,7 @@ class test_addr_matchup(unittest.TestCase):
         assign_address(1, "unknown", True, servers)
         assign_address(2, "unknown", False, servers)
         assign_address(3, "unknown", True, servers)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_all_known(self):
@@ -138,7 +139,7 @@ class test_addr_matchup(unittest.TestCase):
         assign_address(1, "Harry", True, servers)
         assign_address(2, "Hermione", True, servers)
         assign_address(3, "Ron", True, servers)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_all_known_networkss(self):
@@ -149,7 +150,7 @@ class test_addr_matchup(unittest.TestCase):
         assign_address(1, "1.1.1.1", False, servers)
         assign_address(2, "2.2.2.2", False, servers)
         assign_address(3, "3.3.3.3", False, servers)
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
 
 
     def test_all_known_mixed(self):
@@ -163,7 +164,7 @@ class test_addr_matchup(unittest.TestCase):
         assign_address(2, "Hermione", True, servers)
         assign_address(3, "3.3.3.3", False, servers)
         assign_address(3, "Ron", True, servers)
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
 
 
     def test_one_known_one_unknown(self):
@@ -191,7 +192,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "2", "ARBITER", 7, "self", date))
 
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_one_known_one_unknown_networkss(self):
@@ -216,7 +217,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "2", "ARBITER", 7, "self", date))
 
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "2"})["network_name"] == "2.2.2.2"
         # check that entries were not changed
         assert entries.find({"origin_server": "2"}).count() == 3
@@ -244,7 +245,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "3", "SECONDARY", 2, "self", datetime.now()))
 
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_two_known_one_unknown_networkss(self):
@@ -268,7 +269,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
              "status", "3", "SECONDARY", 2, "self", datetime.now()))
 
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "3"})["network_name"] == "3.3.3.3"
         # check that entries were not changed
         assert entries.find({"origin_server": "3"}).count() == 2
@@ -313,7 +314,7 @@ class test_addr_matchup(unittest.TestCase):
             "status", "3", "FATAL", 4, "self", datetime.now()))
 
         # check name matching
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_one_known_two_unknown_networks(self):
@@ -355,7 +356,7 @@ class test_addr_matchup(unittest.TestCase):
             "status", "3", "FATAL", 4, "self", datetime.now()))
 
         # check name matching
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "1"})["network_name"] == "5.6.7.8"
         assert servers.find_one({"server_num": "3"})["network_name"] == "3.3.3.3"
         # check that entries were not changed
@@ -386,7 +387,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "3", "FATAL", 4, "2.2.2.2", datetime.now()))
         # check name matching
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one(
             {"server_num": "1"})["network_name"] == "1.1.1.1"
         assert servers.find_one(
@@ -424,7 +425,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
                 "status", "3", "FATAL", 4, "Crabbe", datetime.now()))
         # check name matching
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "1"})["network_name"] == "Malfoy"
         assert servers.find_one({"self_name": "1.1.1.1"})["network_name"] == "Malfoy"
         assert servers.find_one({"server_num": "2"})["network_name"] == "Crabbe"
@@ -465,7 +466,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
                 "status", "3", "PRIMARY", 1, "4.4.4.4", datetime.now()))
         # address_matchup will return -1
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
         # but Slytherin should be named
         assert servers.find_one({"server_num": "3"})["network_name"] == "3.3.3.3"
         assert servers.find_one({"self_name": "Slytherin"})["network_name"] == "3.3.3.3"
@@ -494,7 +495,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
                 "status", "2", "PRIMARY", 1, "4.4.4.4", datetime.now()))
         # address_matchup will return -1
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
         # but Ravenclaw should be named
         assert servers.find_one({"server_num": "2"})["network_name"] == "2.2.2.2"
         assert servers.find_one({"self_name": "Ravenclaw"})["network_name"] == "2.2.2.2"
@@ -531,7 +532,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
                 "status", "3", "PRIMARY", 1, "4.4.4.4", datetime.now()))
         # address_matchup will return -1
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
         # but Slytherin and Ravenclaw should be named
         assert servers.find_one({"server_num": "2"})["network_name"] == "2.2.2.2"
         assert servers.find_one({"self_name": "Ravenclaw"})["network_name"] == "2.2.2.2"
@@ -554,7 +555,7 @@ class test_addr_matchup(unittest.TestCase):
         entries.insert(self.generate_doc(
                 "status", "1", "PRIMARY", 1, "4.4.4.4", datetime.now()))
         # address_matchup will return -1
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_incomplete_graph_one(self):
@@ -571,7 +572,7 @@ class test_addr_matchup(unittest.TestCase):
         self.insert_unknown(3, servers)
         self.edge("A", "B", entries)
         self.edge("B", "C", entries)
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "1"})["self_name"] == "A"
         assert servers.find_one({"server_num": "2"})["self_name"] == "B"
         assert servers.find_one({"server_num": "3"})["self_name"] == "C"
@@ -589,7 +590,7 @@ class test_addr_matchup(unittest.TestCase):
         self.edge("B", "C", entries)
         self.edge("C", "D", entries)
         self.edge("D", "A", entries)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_incomplete_graph_three(self):
@@ -611,7 +612,7 @@ class test_addr_matchup(unittest.TestCase):
         self.edge("C", "D", entries)
         self.edge("D", "A", entries)
         self.edge("B", "D", entries)
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "1"})["self_name"] == "A"
         assert servers.find_one({"server_num": "2"})["self_name"] == "B"
         assert servers.find_one({"server_num": "3"})["self_name"] == "C"
@@ -635,7 +636,7 @@ class test_addr_matchup(unittest.TestCase):
         self.edge("B", "A", entries)
         self.edge("B", "D", entries)
         self.edge("B", "C", entries)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
         assert servers.find_one({"server_num": "2"})["self_name"] == "B"
 
 
@@ -651,7 +652,7 @@ class test_addr_matchup(unittest.TestCase):
         self.edge("B", "C", entries)
         self.edge("C", "D", entries)
         self.edge("D", "E", entries)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
 
 
     def test_incomplete_graph_six(self):
@@ -668,7 +669,7 @@ class test_addr_matchup(unittest.TestCase):
         servers, entries, clock_skew, db = self.db_setup()
         self.insert_unknown(3, servers)
         self.edge("A", "B", entries)
-        assert address_matchup(db, "hp") == -1
+        assert address_matchup(Storage(db, "hp")) == -1
         assert servers.find_one({"server_num": "1"})["self_name"] == "A"
         assert servers.find_one({"server_num": "2"})["self_name"] == "B"
 
@@ -688,13 +689,31 @@ class test_addr_matchup(unittest.TestCase):
         self.insert_unknown(4, servers)
         self.edge("A", "B", entries)
         self.edge("C", "D", entries)
-        assert address_matchup(db, "hp") == 1
+        assert address_matchup(Storage(db, "hp")) == 1
         assert servers.find_one({"server_num": "1"})["self_name"] == "A"
         assert servers.find_one({"server_num": "2"})["self_name"] == "B"
         assert servers.find_one({"server_num": "3"})["self_name"] == "C"
         assert servers.find_one({"server_num": "4"})["self_name"] == "D"
 
 
+    def test_mention_graph(self):
+        """The mention graph is built in both directions,
+        ignoring entries about the server itself
+        """
+        servers, entries, clock_skew, db = self.db_setup()
+        self.edge("A", "B", entries)
+        self.edge("A", "C", entries)
+        entries.insert(self.generate_doc(
+                "status", "1", "PRIMARY", 1, "self", datetime.now()))
+        mentions, mentioned_by = mention_graph(entries)
+        assert mentions == {"1": set(["B", "C"]),
+                            "2": set(["A"]),
+                            "3": set(["A"])}
+        assert mentioned_by == {"A": set(["2", "3"]),
+                                "B": set(["1"]),
+                                "C": set(["1"])}
+
+
     def insert_unknown(self, n, servers):
         """Inserts n unknown servers into .servers collection.
         Assumes, for these tests, that self_names are unknown
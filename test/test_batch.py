@@ -0,0 +1,113 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for batch mode in edda/run_edda.py
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from edda import metrics
+from edda.run_edda import BATCH_WORKERS
+from edda.run_edda import process_batch
+from edda.run_edda import read_manifest
+from pymongo import Connection
+
+SAMPLE_LOGS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "edda", "sample_logs")
+
+
+class test_batch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def manifest(self, clusters):
+        path = os.path.join(self.dir, "manifest.json")
+        f = open(path, "w")
+        json.dump(clusters, f)
+        f.close()
+        return path
+
+    def namespace(self):
+        """The options of a plain batch run"""
+        return argparse.Namespace(json=None, servers=None, conns=False,
+                                  conn_bucket=60, since=None, until=None,
+                                  no_index=True, binary=False,
+                                  coalesce=False, workers=BATCH_WORKERS,
+                                  match_workers=1, frame_workers=1,
+                                  skew_window=1440, trace=False)
+
+    def test_read_manifest(self):
+        """Clusters are sorted by name, with log files
+        relative to the manifest"""
+        path = self.manifest({"pr": ["pr/a.log", "/logs/b.log"],
+                              "hp": "hp.log"})
+        clusters = read_manifest(path)
+        assert clusters == [
+            ("hp", [os.path.join(self.dir, "hp.log")]),
+            ("pr", [os.path.join(self.dir, "pr/a.log"), "/logs/b.log"])]
+
+    def test_invalid_manifest(self):
+        """Manifests that are not a dictionary of clusters,
+        or have names that cannot be used in urls, are rejected"""
+        self.assertRaises(ValueError, read_manifest,
+                          self.manifest(["a.log"]))
+        self.assertRaises(ValueError, read_manifest,
+                          self.manifest({"a/b": ["a.log"]}))
+
+    def test_process_batch(self):
+        """Each cluster gets its own collections and file"""
+        db = Connection()["test_batch"]
+        clusters = [
+            ("hp", sorted(glob.glob(os.path.join(SAMPLE_LOGS, "hp", "*.log")))),
+            ("pr", sorted(glob.glob(os.path.join(SAMPLE_LOGS, "pr", "*.log")))),
+            ("empty", [])]
+        incidents = process_batch(clusters, db, self.namespace())
+        assert [i[0] for i in incidents] == ["hp", "pr"]
+        assert incidents[0][1].name != incidents[1][1].name
+        for name, run, frames, names, admin in incidents:
+            assert len(frames) > 0
+            assert os.path.exists(name + ".json")
+            run.drop()
+
+    def test_batch_filter_stats(self):
+        """Each cluster counts the lines its filters matched apart"""
+        db = Connection()["test_batch"]
+        files = sorted(glob.glob(os.path.join(SAMPLE_LOGS, "pr", "*.log")))
+        incidents = process_batch([("pr", files), ("pr2", files)],
+                                  db, self.namespace())
+        for incident in incidents:
+            incident[1].drop()
+        counts = {}
+        for name in ["pr", "pr2"]:
+            counts[name] = dict(
+                (labels["filter"], value) for family, labels, value
+                in metrics.SOURCES["filters " + name]()
+                if family == "edda_filter_matches_total")
+        assert counts["pr"]["rs_status"] > 0
+        assert counts["pr"] == counts["pr2"]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/chrome_trace.py
+
+import json
+import unittest
+
+from datetime import datetime
+from edda.chrome_trace import *
+from StringIO import StringIO
+
+
+class Output(StringIO):
+    """A file that can still be read once closed"""
+    def close(self):
+        self.closed_value = self.getvalue()
+
+
+class test_chrome_trace(unittest.TestCase):
+
+    def event(self, type, target, second, **fields):
+        e = {"type": type, "target": target, "summary": type,
+             "witnesses": [target], "dissenters": [],
+             "date": datetime(2012, 6, 11, 15, 0, second)}
+        e.update(fields)
+        return e
+
+    def names(self):
+        return {"self_name": {"1": "a:27017", "2": "unknown"},
+                "network_name": {"1": "a:27017", "2": "b:27017"}}
+
+    def trace(self, events):
+        out = Output()
+        writer = TraceWriter(out)
+        assert list(writer.traced(iter(events))) == events
+        writer.close(self.names())
+        return json.loads(out.closed_value)
+
+    def test_timestamp(self):
+        """Timestamps are in microseconds since the epoch"""
+        assert timestamp(datetime(1970, 1, 1, 0, 0, 1, 5)) == 1000005
+
+    def test_states(self):
+        """Each server's states are spans, ended by the next state
+        or by the last event"""
+        trace = self.trace([
+            self.event("status", "1", 0, state="STARTUP2"),
+            self.event("status", "1", 2, state="PRIMARY"),
+            self.event("status", "1", 3, state="PRIMARY"),
+            self.event("exit", "2", 4),
+            self.event("new_conn", "1", 5)])
+        spans = [(t["tid"], t["name"], t["dur"])
+                 for t in trace if t["ph"] == "X"]
+        assert spans == [(1, "STARTUP2", 2000000), (1, "PRIMARY", 3000000),
+                         (2, "DOWN", 1000000)]
+        instants = [t for t in trace if t["ph"] == "i"]
+        assert len(instants) == 5
+        assert instants[-1]["args"]["summary"] == "new_conn"
+
+    def test_locks_and_syncs(self):
+        """Locks are spans of their own, and syncs are flows
+        from the syncing server to its source"""
+        trace = self.trace([
+            self.event("sync", "2", 0, sync_to="1"),
+            self.event("LOCKED", "1", 1),
+            self.event("UNLOCKED", "1", 2),
+            self.event("LOCKED", "2", 3)])
+        locks = [(t["tid"], t["ph"]) for t in trace if t.get("cat") == "lock"]
+        assert locks == [(1, "b"), (1, "e"), (2, "b"), (2, "e")]
+        flows = [(t["tid"], t["ph"]) for t in trace if t.get("cat") == "sync"]
+        assert flows == [(2, "s"), (1, "f")]
+
+    def test_thread_names(self):
+        """Threads are named after their servers"""
+        trace = self.trace([])
+        names = dict((t["tid"], t["args"]["name"]) for t in trace
+                     if t["name"] == "thread_name")
+        assert names == {1: "a:27017 (1)", 2: "b:27017 (2)"}
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@
 import unittest
 from edda.post.clock_skew import *
 from edda.run_edda import assign_address
+from edda.storage import Storage
 import pymongo
 from datetime import datetime
 from pymongo import Connection
@@ -39,7 +40,7 @@ class test_clock_skew(unittest.TestCase):
     def test_clock_skew_none(self):
         """Test on an empty db"""
         servers, entries, clock_skew, db = self.db_setup()
-        server_clock_skew(db, "wildcats")
+        server_clock_skew(Storage(db, "wildcats"))
         cursor = clock_skew.find()
         assert cursor.count() == 0
 
@@ -52,7 +53,7 @@ class test_clock_skew(unittest.TestCase):
                 "status", "Sam", "STARTUP2", 5, "Gaya", datetime.now()))
         entries.insert(self.generate_doc(
                 "status", "Sam", "PRIMARY", 1, "self", datetime.now()))
-        server_clock_skew(db, "wildcats")
+        server_clock_skew(Storage(db, "wildcats"))
         doc = db["wildcats.clock_skew"].find_one()
         assert doc
         assert doc["server_num"] == "1"
@@ -79,7 +80,7 @@ class test_clock_skew(unittest.TestCase):
                 "status", "Nuni", "DOWN", 8, "self", datetime.now()))
         entries.insert(self.generate_doc(
                 "status", "Nuni", "STARTUP2", 5, "self", datetime.now()))
-        server_clock_skew(db, "wildcats")
+        server_clock_skew(Storage(db, "wildcats"))
         cursor = clock_skew.find()
         assert cursor.count() == 2
         # check first server entry
@@ -156,7 +157,7 @@ class test_clock_skew(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "Alison", "DOWN", 8, "Erica", datetime.now()))
         # check a - b
-        skews1 = detect("Erica", "Alison", db, "wildcats")
+        skews1 = detect("Erica", "Alison", Storage(db, "wildcats"))
         assert skews1
         assert len(skews1) == 1
         t1, wt1 = skews1.popitem()
@@ -165,7 +166,7 @@ class test_clock_skew(unittest.TestCase):
         assert -.01 < (abs(t1) - 3) < .01
         assert t1 > 0
         # check b - a
-        skews2 = detect("Alison", "Erica", db, "wildcats")
+        skews2 = detect("Alison", "Erica", Storage(db, "wildcats"))
         assert skews2
         assert len(skews2) == 1
         t2, wt2 = skews2.popitem()
@@ -203,7 +204,7 @@ class test_clock_skew(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "Alison", "PRIMARY", 1, "self", datetime.now()))
         # first pair doesn't match
-        skews1 = detect("Erica", "Alison", db, "wildcats")
+        skews1 = detect("Erica", "Alison", Storage(db, "wildcats"))
         assert skews1
         assert len(skews1) == 1
         t1, wt1 = skews1.popitem()
@@ -222,7 +223,7 @@ class test_clock_skew(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "Alison", "SECONDARY", 2, "self", datetime.now()))
         # second pair doesn't match
-        skews2 = detect("Erica", "Alison", db, "wildcats")
+        skews2 = detect("Erica", "Alison", Storage(db, "wildcats"))
         assert skews2
         assert len(skews2) == 1
         assert in_skews(3, skews2)
@@ -262,7 +263,7 @@ class test_clock_skew(unittest.TestCase):
         sleep(5)
         entries.insert(self.generate_doc(
             "status", "Mel", "SECONDARY", 2, "self", datetime.now()))
-        skews = detect("Hannah", "Mel", db, "wildcats")
+        skews = detect("Hannah", "Mel", Storage(db, "wildcats"))
         assert skews
         assert len(skews) == 2
         assert in_skews(5, skews)
@@ -303,8 +304,8 @@ class test_clock_skew(unittest.TestCase):
             "status", "Gaya", "STARTUP2", 5, "Sam", datetime.now()))
         entries.insert(self.generate_doc(
             "status", "Sam", "STARTUP2", 5, "self", datetime.now()))
-        skews1 = detect("Sam", "Gaya", db, "wildcats")
-        skews2 = detect("Gaya", "Sam", db, "wildcats")
+        skews1 = detect("Sam", "Gaya", Storage(db, "wildcats"))
+        skews2 = detect("Gaya", "Sam", Storage(db, "wildcats"))
         assert not skews1
         assert not skews2
 
@@ -346,8 +347,8 @@ class test_clock_skew(unittest.TestCase):
         entries.insert(self.generate_doc(
             "status", "Alison", "DOWN", 8, "Erica", datetime.now()))
         # run detect()!
-        skews1 = detect("Erica", "Alison", db, "wildcats")
-        skews2 = detect("Alison", "Erica", db, "wildcats")
+        skews1 = detect("Erica", "Alison", Storage(db, "wildcats"))
+        skews2 = detect("Alison", "Erica", Storage(db, "wildcats"))
         assert not skews1
         assert not skews2
 
@@ -0,0 +1,129 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/conn_stats.py
+
+import unittest
+
+from datetime import datetime
+from edda.conn_stats import *
+from edda.filters import conn_msg
+from edda.post.event_matchup import generate_summary
+from edda.ui.frames import info_by_type
+from edda.ui.frames import new_frame
+
+
+class Entries(list):
+    """Collects inserted documents in place of a collection"""
+    def insert(self, doc):
+        self.append(doc)
+
+
+class test_conn_stats(unittest.TestCase):
+
+    def new(self, addr, n, date):
+        return conn_msg.process(date.strftime("%a %b %d %H:%M:%S") +
+            " [initandlisten] connection accepted from "
+            "{0} #{1}".format(addr, n), date)
+
+    def end(self, addr, n, date):
+        return conn_msg.process(date.strftime("%a %b %d %H:%M:%S") +
+            " [conn{1}] end connection {0}".format(addr, n), date)
+
+    def test_bucket_start(self):
+        """Buckets start on multiples of their width"""
+        date = datetime(2012, 6, 11, 15, 56, 16)
+        assert bucket_start(date, 60) == datetime(2012, 6, 11, 15, 56, 0)
+        assert bucket_start(date, 10) == datetime(2012, 6, 11, 15, 56, 10)
+        assert bucket_start(date, 3600) == datetime(2012, 6, 11, 15, 0, 0)
+
+    def test_one_bucket(self):
+        """Connections in one bucket become one document"""
+        entries = Entries()
+        tracker = new_tracker(60)
+        date = datetime(2012, 6, 11, 15, 56, 1)
+        assert add_conn(tracker, "1", self.new("10.0.0.1:5000", 1, date), entries) == 0
+        assert add_conn(tracker, "1", self.new("10.0.0.1:5001", 2, date), entries) == 0
+        assert add_conn(tracker, "1", self.new("10.0.0.2:5000", 3, date), entries) == 0
+        assert add_conn(tracker, "1", self.end("10.0.0.1:5000", 1, date), entries) == 0
+        assert len(entries) == 0
+        assert flush(tracker, entries) == 1
+        doc = entries[0]
+        assert doc["type"] == "conn_stats"
+        assert doc["origin_server"] == "1"
+        assert doc["date"] == date
+        assert doc["info"]["start"] == datetime(2012, 6, 11, 15, 56, 0)
+        assert doc["info"]["opened"] == 3
+        assert doc["info"]["closed"] == 1
+        assert doc["info"]["open"] == 2
+        assert doc["info"]["max_open"] == 3
+        assert doc["info"]["clients"] == [["10.0.0.1", 2], ["10.0.0.2", 1]]
+
+    def test_many_buckets(self):
+        """A new bucket stores the previous one for that server,
+        and the open connection gauge carries over"""
+        entries = Entries()
+        tracker = new_tracker(60)
+        first = datetime(2012, 6, 11, 15, 56, 1)
+        second = datetime(2012, 6, 11, 15, 58, 1)
+        add_conn(tracker, "1", self.new("10.0.0.1:5000", 1, first), entries)
+        add_conn(tracker, "2", self.new("10.0.0.1:5001", 1, first), entries)
+        assert add_conn(tracker, "1", self.end("10.0.0.1:5000", 1, second), entries) == 1
+        assert len(entries) == 1
+        assert entries[0]["origin_server"] == "1"
+        assert flush(tracker, entries) == 2
+        later = [e for e in entries if e["date"] == second][0]
+        assert later["info"]["opened"] == 0
+        assert later["info"]["closed"] == 1
+        assert later["info"]["max_open"] == 1
+        assert later["info"]["open"] == 0
+
+    def test_open_never_negative(self):
+        """Closing connections opened before the log started
+        does not make the gauge negative"""
+        entries = Entries()
+        tracker = new_tracker(60)
+        date = datetime(2012, 6, 11, 15, 56, 1)
+        add_conn(tracker, "1", self.end("10.0.0.1:5000", 1, date), entries)
+        flush(tracker, entries)
+        assert entries[0]["info"]["open"] == 0
+
+    def test_top_clients(self):
+        """Only the busiest clients are kept"""
+        entries = Entries()
+        tracker = new_tracker(60)
+        date = datetime(2012, 6, 11, 15, 56, 1)
+        for i in range(TOP_CLIENTS + 3):
+            for j in range(i + 1):
+                add_conn(tracker, "1", self.new(
+                    "10.0.0.{0}:{1}".format(i, 5000 + j), j, date), entries)
+        flush(tracker, entries)
+        clients = entries[0]["info"]["clients"]
+        assert len(clients) == TOP_CLIENTS
+        assert clients[0] == ["10.0.0.{0}".format(TOP_CLIENTS + 2), TOP_CLIENTS + 3]
+
+    def test_summary_and_frame(self):
+        """conn_stats events are summarized and shown as users"""
+        stats = {"opened": 3, "closed": 1, "open": 2, "max_open": 3,
+                 "clients": [["10.0.0.1", 2], ["10.0.0.2", 1]]}
+        e = {"type": "conn_stats", "target": "1", "conn_stats": stats,
+             "witnesses": ["1"], "dissenters": []}
+        assert generate_summary(e, "sam:27017") == \
+            "sam:27017 opened 3 and closed 1 connections, 2 open"
+        f = info_by_type(new_frame(["1", "2"]), e)
+        assert f["users"]["1"] == ["10.0.0.1", "10.0.0.2"]
+        assert f["users"]["2"] == []
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,6 +17,7 @@ from edda.ui.connection import * #Relative import error.
 from time import sleep
 from datetime import datetime
 from copy import deepcopy
+from StringIO import StringIO
 from nose.plugins.skip import Skip, SkipTest
 
 
@@ -163,5 +164,153 @@ class test_connection(unittest.TestCase):
             break
         return frames
 
+
+class test_frames_json(unittest.TestCase):
+
+    class RawFrames(dict):
+        """Frames that can also be copied out as json"""
+        def raw(self, key):
+            return json.dumps(self[key])
+
+    def test_frames_json(self):
+        """Batches are the same whether or not frames are parsed"""
+        frames = {"0": {"summary": "a"}, "1": {"summary": "b"},
+                  "2": {"summary": "c"}}
+        expected = {"1": {"summary": "b"}, "2": {"summary": "c"}}
+        assert json.loads(frames_json(frames, [1, 2])) == expected
+        raw = self.RawFrames(frames)
+        assert json.loads(frames_json(raw, [1, 2])) == expected
+        assert json.loads(frames_json(raw, [])) == {}
+
+class Handler(eddaHTTPRequest):
+    """A request handler that is not connected to a socket"""
+    def __init__(self, path):
+        self.path = path
+        self.command = "GET"
+        self.request_version = "HTTP/1.0"
+        self.requestline = "GET " + path
+        self.client_address = ("127.0.0.1", 0)
+        self.wfile = StringIO()
+
+    def log_message(self, *args):
+        pass
+
+
+class test_batch_routes(unittest.TestCase):
+
+    def setUp(self):
+        servers = {"self_name": {"1": "a:27017"}, "network_name": {}}
+        clusters["pr"] = ({"0": {"summary": "a"}, "1": {"summary": "b"}},
+                          servers, {})
+        clusters["hp"] = ({"0": {"summary": "c"}}, servers, {})
+
+    def tearDown(self):
+        clusters.clear()
+
+    def get(self, path):
+        """Sends a GET request for path, returning the response"""
+        handler = Handler(path)
+        handler.do_GET()
+        return handler.wfile.getvalue()
+
+    def test_process_uri(self):
+        """Cluster names are split off the uri"""
+        assert Handler("/pr/0-2.batch").process_uri("GET") == \
+            ("0-2.batch", "", "batch", "pr")
+        assert Handler("/pr/").process_uri("GET") == \
+            ("edda.html", "", "html", "pr")
+        assert Handler("/").process_uri("GET") == \
+            ("index.clusters", "", "clusters", None)
+        assert Handler("/js/setup.js").process_uri("GET") == \
+            ("js/setup.js", "", "js", None)
+
+    def test_index(self):
+        """The index links to every cluster"""
+        page = self.get("/")
+        assert '<a href="hp/">hp</a> (1 frames' in page
+        assert '<a href="pr/">pr</a> (2 frames' in page
+
+    def test_cluster_data(self):
+        """Each cluster serves its own frames"""
+        body = self.get("/pr/0-1.batch").split("\r\n\r\n", 1)[1]
+        assert json.loads(body) == {"0": {"summary": "a"}}
+        body = self.get("/hp/data.admin").split("\r\n\r\n", 1)[1]
+        assert json.loads(body)["total_frame_count"] == 1
+
+    def test_redirect(self):
+        """Clusters are redirected to their trailing slash,
+        so that the page's relative urls work"""
+        response = self.get("/pr")
+        assert " 301 " in response.split("\r\n")[0]
+        assert "Location: /pr/" in response
+
+    def test_topology(self):
+        """The state at a date is served from the frame before it"""
+        frames = clusters["pr"][0]
+        frames["0"].update(date="2012-07-18 11:01:17", servers={"1": "PRIMARY"},
+                           links={}, broken_links={}, syncs={}, users={})
+        frames["1"].update(date="2012-07-18 11:05:00", servers={"1": "DOWN"},
+                           links={}, broken_links={}, syncs={}, users={})
+        body = self.get("/pr/2012-07-18T11:03:00.topology")
+        topology = json.loads(body.split("\r\n\r\n", 1)[1])
+        assert topology["frame"] == 0
+        assert topology["servers"] == {"1": "PRIMARY"}
+        body = self.get("/pr/2012-07-18%2011:05:00.topology")
+        assert json.loads(body.split("\r\n\r\n", 1)[1])["frame"] == 1
+        response = self.get("/pr/yesterday.topology")
+        assert " 400 " in response.split("\r\n")[0]
+
+    def test_search(self):
+        """Event searches are answered from the event index,
+        which is not sent with the admin info"""
+        clusters["pr"][2]["event_index"] = {"status/*/DOWN": [0, 1],
+                                            "status/1/DOWN": [1]}
+        body = self.get("/pr/events.search?type=status&state=DOWN")
+        assert json.loads(body.split("\r\n\r\n", 1)[1]) == \
+            {"frames": [0, 1]}
+        body = self.get("/pr/events.search?type=status&state=DOWN"
+                        "&find=next&frame=0")
+        assert json.loads(body.split("\r\n\r\n", 1)[1]) == {"frames": [1]}
+        body = self.get("/pr/events.search?type=status&target=1"
+                        "&state=DOWN&find=previous&frame=1")
+        assert json.loads(body.split("\r\n\r\n", 1)[1]) == {"frames": []}
+        response = self.get("/pr/events.search?find=next")
+        assert " 400 " in response.split("\r\n")[0]
+        body = self.get("/pr/data.admin").split("\r\n\r\n", 1)[1]
+        assert not "event_index" in json.loads(body)
+
+    def test_density(self):
+        """Density levels are served one at a time or all at once"""
+        level = [[1339426800, 2, {"status": 2}, {"1": 2}, 0, 1]]
+        clusters["pr"][2]["density"] = {"60": level}
+        body = self.get("/pr/60.density").split("\r\n\r\n", 1)[1]
+        assert json.loads(body) == level
+        body = self.get("/pr/all.density").split("\r\n\r\n", 1)[1]
+        assert json.loads(body) == {"60": level}
+        response = self.get("/pr/3600.density")
+        assert " 404 " in response.split("\r\n")[0]
+        body = self.get("/pr/data.admin").split("\r\n\r\n", 1)[1]
+        assert not "density" in json.loads(body)
+
+    def test_metrics(self):
+        """Metrics are served in the Prometheus text format"""
+        response = self.get("/metrics")
+        assert "Content-type: text/plain; version=0.0.4" in response
+        body = response.split("\r\n\r\n", 1)[1]
+        assert "# TYPE edda_resident_memory_bytes gauge" in body
+
+
+class test_reading_routes(unittest.TestCase):
+
+    def test_still_reading(self):
+        """Until the logs are read, only metrics and
+        the page's own files are served"""
+        handler = Handler("/data.admin")
+        handler.do_GET()
+        assert " 503 " in handler.wfile.getvalue().split("\r\n")[0]
+        handler = Handler("/metrics")
+        handler.do_GET()
+        assert " 200 " in handler.wfile.getvalue().split("\r\n")[0]
+
 if __name__ == '__main__':
     unittest.main()
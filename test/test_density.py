@@ -0,0 +1,65 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/ui/density.py
+
+import unittest
+
+from datetime import datetime
+from edda.ui.density import *
+
+
+class test_density(unittest.TestCase):
+
+    def event(self, type, target, minute, second=0):
+        return {"type": type, "target": target,
+                "date": datetime(2012, 6, 11, 15, minute, second)}
+
+    def test_histograms(self):
+        """Events are counted per bucket, by type and server, and
+        buckets know their first and last frames"""
+        counts = EventCounts([60, 3600])
+        events = [self.event("status", "1", 0),
+                  self.event("status", "2", 0, 30),
+                  self.event("new_conn", "1", 5),
+                  self.event("exit", "2", 59)]
+        assert list(counts.counted(iter(events))) == events
+        dates = [e["date"] for e in events]
+        levels = counts.histograms(dates)
+        assert sorted(levels) == ["3600", "60"]
+        start = 1339426800
+        assert levels["60"] == [
+            [start, 2, {"status": 2}, {"1": 1, "2": 1}, 0, 1],
+            [start + 300, 1, {"new_conn": 1}, {"1": 1}, 2, 2],
+            [start + 3540, 1, {"exit": 1}, {"2": 1}, 3, 3]]
+        assert levels["3600"] == [
+            [start, 4, {"status": 2, "new_conn": 1, "exit": 1},
+             {"1": 2, "2": 2}, 0, 3]]
+
+    def test_bucket_without_frames(self):
+        """Buckets whose events are shown by frames dated later,
+        as coalesced frames are, have no frames"""
+        counts = EventCounts([60])
+        counts.count(self.event("status", "1", 0))
+        counts.count(self.event("status", "1", 1))
+        levels = counts.histograms([datetime(2012, 6, 11, 15, 1, 0)])
+        assert [b[4:] for b in levels["60"]] == [[None, None], [0, 0]]
+
+    def test_empty(self):
+        """Runs without events have empty levels"""
+        assert EventCounts().histograms([]) == \
+            dict((str(r), []) for r in DENSITY_RESOLUTIONS)
+
+if __name__ == '__main__':
+    unittest.main()
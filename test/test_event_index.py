@@ -0,0 +1,70 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/ui/event_index.py
+
+import unittest
+
+from edda.ui.event_index import *
+
+
+class test_event_index(unittest.TestCase):
+
+    def event(self, type, target, state=None):
+        e = {"type": type, "target": target}
+        if state:
+            e["state"] = state
+        return e
+
+    def test_event_keys(self):
+        """Events are indexed under every combination of wildcards"""
+        keys = event_keys(self.event("status", "3", "DOWN"))
+        assert len(keys) == 8
+        assert "status/3/DOWN" in keys
+        assert "*/3/*" in keys
+        assert "*/*/*" in keys
+        assert event_keys(self.event("LOCKED", "1")) == set(
+            ["LOCKED/1/*", "*/1/*", "LOCKED/*/*", "*/*/*"])
+
+    def test_indexed_frames(self):
+        """Frames are indexed under the events they show,
+        including each event of a coalesced frame"""
+        index = EventIndex()
+        events = [self.event("status", "1", "PRIMARY"),
+                  self.event("new_conn", "1"),
+                  self.event("new_conn", "2"),
+                  self.event("status", "2", "DOWN")]
+        frames = [{"event_count": 1}, {"event_count": 2}, {}]
+        passed = list(index.indexed(iter(events)))
+        assert passed == events
+        assert list(index.indexed_frames(iter(frames))) == frames
+        assert index.frames("new_conn") == [1]
+        assert index.frames(target="2") == [1, 2]
+        assert index.frames(state="DOWN") == [2]
+        assert index.frames() == [0, 1, 2]
+        assert index.frames("exit") == []
+
+    def test_next_previous(self):
+        """The next and previous frames are found on either side"""
+        index = EventIndex({"status/*/PRIMARY": [3, 10, 42]})
+        assert index.next(0, "status", state="PRIMARY") == 3
+        assert index.next(3, "status", state="PRIMARY") == 10
+        assert index.next(42, "status", state="PRIMARY") == None
+        assert index.previous(10, "status", state="PRIMARY") == 3
+        assert index.previous(11, "status", state="PRIMARY") == 10
+        assert index.previous(3, "status", state="PRIMARY") == None
+        assert index.next(0, "status") == None
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,6 +23,8 @@ from datetime import datetime
 from datetime import timedelta
 from edda.run_edda import assign_address
 from edda.post.event_matchup import *
+from edda.storage import Storage
+from operator import itemgetter
 from pymongo import Connection
 
 
@@ -121,7 +123,7 @@ class test_event_matchup(unittest.TestCase):
         date = datetime.now()
         e1 = self.one_entry("status", "1", date, info)
         server_entries["1"].append(e1)
-        event = next_event(server_nums, server_entries, db, "AdventureTime")
+        event = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event
         assert event["witnesses"]
         assert len(event["witnesses"]) == 1
@@ -150,7 +152,7 @@ class test_event_matchup(unittest.TestCase):
         server_entries["1"].append(e1)
         server_entries["2"].append(e2)
         # run next_event()
-        event = next_event(server_nums, server_entries, db, "AdventureTime")
+        event = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event
         assert event["witnesses"]
         assert len(event["witnesses"]) == 2
@@ -186,7 +188,7 @@ class test_event_matchup(unittest.TestCase):
         server_entries["3"].append(e3)
         server_entries["4"].append(e4)
         # run next_event()
-        event = next_event(server_nums, server_entries, db, "AdventureTime")
+        event = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event
         assert event["witnesses"]
         assert len(event["witnesses"]) == 4
@@ -219,8 +221,8 @@ class test_event_matchup(unittest.TestCase):
         server_entries["1"].append(e1)
         server_entries["2"].append(e2)
         # run next_event()
-        event1 = next_event(server_nums, server_entries, db, "AdventureTime")
-        event2 = next_event(server_nums, server_entries, db, "AdventureTime")
+        event1 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
+        event2 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event1
         assert event2
         assert event1["witnesses"]
@@ -257,8 +259,8 @@ class test_event_matchup(unittest.TestCase):
         server_entries["1"].append(e1)
         server_entries["2"].append(e2)
         # run next_event()
-        event1 = next_event(server_nums, server_entries, db, "AdventureTime")
-        event2 = next_event(server_nums, server_entries, db, "AdventureTime")
+        event1 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
+        event2 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event1
         assert event2
         assert event1["witnesses"]
@@ -295,9 +297,9 @@ class test_event_matchup(unittest.TestCase):
         server_entries["2"].append(e2)
         server_entries["3"].append(e3)
         # run next_event()
-        event1 = next_event(server_nums, server_entries, db, "AdventureTime")
-        event2 = next_event(server_nums, server_entries, db, "AdventureTime")
-        assert not next_event(server_nums, server_entries, db, "AdventureTime")
+        event1 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
+        event2 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
+        assert not next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event1
         assert event2
         assert event1["witnesses"]
@@ -332,7 +334,7 @@ class test_event_matchup(unittest.TestCase):
         e1 = self.one_entry("status", "1", datetime.now(), info)
         server_entries["1"].append(e1)
         # run next_event()
-        event = next_event(server_nums, server_entries, db, "AdventureTime")
+        event = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event
         assert event["witnesses"]
         assert len(event["witnesses"]) == 1
@@ -351,7 +353,7 @@ class test_event_matchup(unittest.TestCase):
         server_entries["1"] = []
         server_entries["2"] = []
         # run next_event()
-        assert not next_event(server_nums, server_entries, db, "AdventureTime")
+        assert not next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
 
 
     def test_next_event_all_empty_but_one(self):
@@ -375,7 +377,7 @@ class test_event_matchup(unittest.TestCase):
         e1 = self.one_entry("status", "1", datetime.now(), info)
         server_entries["1"].append(e1)
         # run next_event()
-        event = next_event(server_nums, server_entries, db, "AdventureTime")
+        event = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event
         assert event["witnesses"]
         assert len(event["witnesses"]) == 1
@@ -412,9 +414,9 @@ class test_event_matchup(unittest.TestCase):
         server_entries["1"].append(e3)
         server_entries["2"].append(e4)
         # run next_event()
-        event = next_event(server_nums, server_entries, db, "AdventureTime")
-        event2 = next_event(server_nums, server_entries, db, "AdventureTime")
-        assert not next_event(server_nums, server_entries, db, "AdventureTime")
+        event = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
+        event2 = next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
+        assert not next_event(server_nums, server_entries, Storage(db, "AdventureTime"))
         assert event
         assert event2
         assert event["witnesses"]
@@ -693,5 +695,210 @@ class test_event_matchup(unittest.TestCase):
         that should remain unchanged by resolve_dissenters()"""
         pass
 
+
+    # ----------------------------------------------
+    # test the streaming versions of the above
+    # ----------------------------------------------
+
+
+    def test_iter_resolve_dissenters_window(self):
+        """iter_resolve_dissenters() only merges events
+        within the skew window, and keeps them in order"""
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        events = []
+        for i, (skew, witness) in enumerate([(0, "1"), (5, "2"),
+                                             (600, "1"), (1300, "2")]):
+            e = self.one_event("status", "finn@adventure.time",
+                               date + timedelta(seconds=skew))
+            e["witnesses"] = [witness]
+            e["dissenters"] = ["2" if witness == "1" else "1"]
+            events.append(e)
+        resolved = list(iter_resolve_dissenters(iter(events),
+                                                timedelta(minutes=5)))
+        assert len(resolved) == 3
+        assert sorted(resolved[0]["witnesses"]) == ["1", "2"]
+        assert resolved[0]["date"] == date + timedelta(seconds=5)
+        assert resolved[1]["witnesses"] == ["1"]
+        assert resolved[2]["witnesses"] == ["2"]
+
+
+    def test_iter_resolve_dissenters_hours_apart(self):
+        """By default, events seen by servers whose clocks are
+        hours apart are merged, as resolve_dissenters() does"""
+        date = datetime(2012, 7, 16, 10, 24, 8)
+        events = []
+        for target, skew, witness in [("snape@hogwarts", 0, "1"),
+                                      ("harry@hogwarts", 60, "2"),
+                                      ("snape@hogwarts", 10217, "2")]:
+            e = self.one_event("status", target,
+                               date + timedelta(seconds=skew))
+            e["witnesses"] = [witness]
+            e["dissenters"] = ["2" if witness == "1" else "1"]
+            events.append(e)
+        expected = resolve_dissenters(deepcopy(events))
+        resolved = list(iter_resolve_dissenters(iter(deepcopy(events))))
+        assert len(resolved) == 2
+        assert resolved == expected
+        assert sorted(resolved[1]["witnesses"]) == ["1", "2"]
+        assert len(list(iter_resolve_dissenters(
+            iter(deepcopy(events)), timedelta(minutes=5)))) == 3
+
+
+    def test_iter_resolve_dissenters_same_as_list(self):
+        """Without a window limit, iter_resolve_dissenters()
+        resolves the same events as resolve_dissenters()"""
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        events = []
+        for i in range(10):
+            e = self.one_event("status", "finn@adventure.time",
+                               date + timedelta(seconds=i * 30))
+            e["witnesses"] = [str(i % 3)]
+            e["dissenters"] = [str((i + 1) % 3)]
+            events.append(e)
+        expected = resolve_dissenters(deepcopy(events))
+        resolved = list(iter_resolve_dissenters(iter(deepcopy(events)),
+                                                timedelta(days=1)))
+        assert resolved == expected
+
+
+    def test_entry_queue(self):
+        """An EntryQueue reads from its cursor only as needed"""
+        read = []
+        def cursor():
+            for i in range(5):
+                read.append(i)
+                yield {"n": i}
+        q = EntryQueue(cursor())
+        assert read == []
+        assert q
+        assert read == [0]
+        assert q[0]["n"] == 0
+        for entry in q:
+            if entry["n"] == 2:
+                break
+        assert read == [0, 1, 2]
+        q.remove({"n": 1})
+        assert q.pop(0)["n"] == 0
+        assert [e["n"] for e in q] == [2, 3, 4]
+        assert len(q) == 3
+
+
+    def test_stream_events(self):
+        """stream_events() matches entries stored in the db"""
+        servers, entries, db = self.db_setup_n_servers(2)
+        info = {}
+        info["state"] = "SECONDARY"
+        info["state_code"] = 2
+        info["server"] = "llama@the.zoo"
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        entries.insert(self.one_entry("status", "2",
+                                      date + timedelta(seconds=1), info))
+        entries.insert(self.one_entry("status", "1", date, info))
+        entries.insert(self.one_entry("status", "1",
+                                      date + timedelta(seconds=30), info))
+        events = list(stream_events(Storage(db, "AdventureTime")))
+        assert len(events) == 2
+        assert events[0]["date"] == date
+        assert sorted(events[0]["witnesses"]) == ["1", "2"]
+        assert events[1]["witnesses"] == ["1"]
+
+
+    def test_partition_timeline(self):
+        """The timeline is only split where no entries are
+        within DELAY of each other"""
+        servers, entries, db = self.db_setup_n_servers(2)
+        info = {}
+        info["state"] = "PRIMARY"
+        info["state_code"] = 1
+        info["server"] = "llama@the.zoo"
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        for minute in [0, 10, 20]:
+            for second in [0, 1, 2, 3]:
+                d = date + timedelta(minutes=minute, seconds=second)
+                entries.insert(self.one_entry("status", str(second % 2 + 1),
+                                              d, info))
+        storage = Storage(db, "AdventureTime")
+        starts = partition_timeline(["1", "2"], storage, 3)
+        assert starts == [date + timedelta(minutes=10),
+                          date + timedelta(minutes=20)]
+        assert partition_timeline(["1", "2"], storage, 1) == []
+        # partitioning registers no servers
+        assert not servers.find_one({"network_name": "llama@the.zoo"})
+
+
+    def test_partitioned_events(self):
+        """Matching the partitions of the timeline in separate
+        processes finds the same events as a single pass"""
+        servers, entries, db = self.db_setup_n_servers(3)
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        for i, state in enumerate(["PRIMARY", "SECONDARY", "DOWN",
+                                   "RECOVERING", "PRIMARY"]):
+            info = {}
+            info["state"] = state
+            info["server"] = "host{0}:27017".format(i % 2)
+            d = date + timedelta(minutes=i)
+            entries.insert(self.one_entry("status", "1", d, info))
+            entries.insert(self.one_entry("status", "2",
+                                          d + timedelta(seconds=1), info))
+            if i % 2:
+                entries.insert(self.one_entry("status", "3",
+                                              d + timedelta(seconds=30),
+                                              info))
+        storage = Storage(db, "AdventureTime")
+        # register the servers the entries mention first, as
+        # servers without entries are dissenters of every event
+        list(stream_events(storage))
+        parallel = list(stream_events(storage, workers=2))
+        single = list(stream_events(storage))
+        assert len(single) == 5
+        assert partition_timeline(servers.distinct("server_num"),
+                                  storage, 8)
+        assert parallel == single
+
+
+    def test_partitioned_servers(self):
+        """Matching the partitions of the timeline in separate
+        processes registers the same servers as a single pass,
+        also for addresses that are never matched to a server"""
+        servers, entries, db = self.db_setup_n_servers(3)
+        # a server whose network name is not known
+        assign_address(4, "4@10gen.com", True, servers)
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        for i in range(4):
+            d = date + timedelta(minutes=i)
+            # server 1 sees server 4 under an address no server
+            # has, and is only a witness of its status change
+            info = {"state": "PRIMARY", "server": "self"}
+            entries.insert(self.one_entry("status", "4", d, info))
+            info = {"state": "PRIMARY", "server": "host4:27017"}
+            entries.insert(self.one_entry("status", "1",
+                                          d + timedelta(seconds=1), info))
+            # each sync to an unknown server adds a server
+            info = {"state": "SECONDARY", "server": "self",
+                    "sync_server": ["unknown", "host9:27017"][i % 2]}
+            entries.insert(self.one_entry("sync", "2",
+                                          d + timedelta(seconds=30), info))
+        fixture = list(servers.find({}, {"_id": 0}))
+
+        def run(workers):
+            db.drop_collection(servers)
+            db.drop_collection(servers["counter"])
+            for doc in fixture:
+                servers.insert(dict(doc))
+            storage = Storage(db, "AdventureTime")
+            events = list(stream_events(storage, workers=workers))
+            docs = sorted(servers.find({}, {"_id": 0}),
+                          key=itemgetter("server_num"))
+            return events, docs
+
+        single, single_servers = run(1)
+        parallel, parallel_servers = run(2)
+        assert partition_timeline(["1", "2", "3", "4"],
+                                  Storage(db, "AdventureTime"), 8)
+        assert not servers.find_one({"network_name": "host4:27017"})
+        assert len(single_servers) == len(fixture) + 3
+        assert parallel_servers == single_servers
+        assert parallel == single
+
 if __name__ == '__main__':
     unittest.main()
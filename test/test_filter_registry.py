@@ -0,0 +1,109 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for the filter registry in edda/filters/__init__.py
+
+import unittest
+
+from datetime import datetime
+from edda import filters
+
+
+class custom_filter(object):
+    """A filter declared by an object, as an entry point might be"""
+    calls = []
+
+    @staticmethod
+    def process(msg, date):
+        custom_filter.calls.append(msg)
+        if "needle" in msg:
+            return {"type": "custom", "date": date, "msg": msg,
+                    "info": {"server": "self"}}
+
+
+class test_filter_registry(unittest.TestCase):
+
+    def setUp(self):
+        filters.reset_stats()
+        custom_filter.calls = []
+
+    def tearDown(self):
+        filters.FILTERS.pop("custom", None)
+
+    def test_discovery(self):
+        """Every filter module is registered, except the template"""
+        for name in ["rs_status", "fsync_lock", "rs_sync", "init_and_listen",
+                     "stale_secondary", "rs_exit", "rs_reconfig", "conn_msg"]:
+            assert name in filters.FILTERS
+            assert name in filters.__all__
+        assert not "template" in filters.FILTERS
+        assert filters.FILTERS["rs_status"]["event_types"] == ["status"]
+
+    def test_enabled_order(self):
+        """Filters run in order of priority, and optional
+        filters only run when asked for"""
+        names = [f["name"] for f in filters.enabled_filters()]
+        assert names == ["rs_status", "fsync_lock", "rs_sync",
+                         "init_and_listen", "stale_secondary", "rs_exit",
+                         "rs_reconfig"]
+        names = [f["name"] for f in filters.enabled_filters(["conn_msg"])]
+        assert names[-1] == "conn_msg"
+
+    def test_defaults(self):
+        """Objects without declarations get the defaults"""
+        f = filters.register_module(custom_filter, "custom")
+        assert f["name"] == "custom"
+        assert f["triggers"] == None
+        assert f["priority"] == filters.DEFAULT_PRIORITY
+        assert f in filters.enabled_filters()
+
+    def test_triggers(self):
+        """Lines without a trigger are not passed to a filter"""
+        f = filters.register(custom_filter.process, "custom",
+                             triggers=["hay", "needle"])
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        assert not filters.run_filters("nothing here", date, [f])
+        assert custom_filter.calls == []
+        assert not filters.run_filters("a hay stack", date, [f])
+        doc = filters.run_filters("a needle", date, [f])
+        assert doc["type"] == "custom"
+        assert f["calls"] == 2
+        assert f["matches"] == 1
+        assert f["time"] >= 0
+
+    def test_run_stats(self):
+        """Statistics kept apart for a run leave the registry alone"""
+        f = filters.register(custom_filter.process, "custom",
+                             triggers=["needle"])
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        stats = filters.new_stats([f])
+        filters.run_filters("a needle", date, [f], stats)
+        filters.run_filters("no needle", date, [f], stats)
+        assert stats["custom"]["calls"] == 2
+        assert stats["custom"]["matches"] == 2
+        assert f["calls"] == 0
+        assert f["matches"] == 0
+
+    def test_first_match_wins(self):
+        """Only the first matching filter returns a document"""
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        msg = ("Wed Jul 18 14:48:19 [rsMgr] replSet "
+               "info electSelf 1 needle PRIMARY")
+        filters.register(custom_filter.process, "custom", priority=0)
+        doc = filters.run_filters(msg, date, filters.enabled_filters())
+        assert doc["type"] == "custom"
+        assert filters.FILTERS["rs_status"]["calls"] == 0
+
+if __name__ == '__main__':
+    unittest.main()
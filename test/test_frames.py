@@ -17,8 +17,12 @@ import unittest #this doesn't exist any more...
 
 from datetime import datetime
 from edda.post.event_matchup import generate_summary
+from edda.post.event_matchup import stream_events
+from edda.storage import Storage
+from edda.supporting_methods import assign_address
 from edda.ui.frames import *
 from nose.plugins.skip import Skip, SkipTest
+from pymongo import Connection
 
 #-------------------------
 # helper methods for tests
@@ -308,5 +312,255 @@ class test_frames(unittest.TestCase):
         that creates a chain of syncing by the last frame"""
         pass
 
+
+    #-----------------------
+    # test coalesce_frames()
+    #-----------------------
+
+
+    def numbered_frames(self, servers, states, start=0):
+        """Generate one frame per entry of states, where each
+        entry is the state of the first server in that frame,
+        with frames one second apart"""
+        frames = {}
+        for i, state in enumerate(states):
+            f = new_frame(servers)
+            f["servers"][servers[0]] = state
+            f["date"] = "2012-06-11 15:{0:02d}:{1:02d}".format(
+                (start + i) / 60, (start + i) % 60)
+            f["summary"] = "event " + str(i)
+            f["witnesses"] = []
+            f["dissenters"] = []
+            frames[str(i)] = f
+        return frames
+
+
+    def test_coalesce_no_changes(self):
+        """Frames with the same topology become one frame"""
+        frames = self.numbered_frames(["1", "2"], ["PRIMARY"] * 4)
+        frames["3"]["users"]["1"] = ["10.0.0.1:5000"]
+        c = coalesce_frames(frames)
+        assert len(c) == 1
+        assert c["0"]["event_count"] == 4
+        assert c["0"]["date"] == frames["0"]["date"]
+        assert c["0"]["end_date"] == frames["3"]["date"]
+        assert c["0"]["summaries"] == ["event 0", "event 1", "event 2", "event 3"]
+        assert c["0"]["summary"] == "event 0 (and 3 more events)"
+        assert c["0"]["users"]["1"] == ["10.0.0.1:5000"]
+
+
+    def test_coalesce_changes(self):
+        """Frames that change the topology are kept"""
+        frames = self.numbered_frames(["1", "2"], ["PRIMARY", "PRIMARY",
+            "SECONDARY", "PRIMARY", "PRIMARY"])
+        frames["4"]["links"]["1"] = ["2"]
+        c = coalesce_frames(frames)
+        assert len(c) == 4
+        assert [c[str(i)]["event_count"] for i in range(4)] == [2, 1, 1, 1]
+        assert c["1"]["servers"]["1"] == "SECONDARY"
+        assert c["3"]["links"]["1"] == ["2"]
+
+
+    def test_coalesce_empty(self):
+        """Test coalesce_frames() with no frames"""
+        assert coalesce_frames({}) == {}
+
+
+    #-----------------------
+    # test build_timelines()
+    #-----------------------
+
+
+    def test_timelines(self):
+        """Each timeline keeps the last frame of each time bucket"""
+        # two frames per second for three minutes
+        frames = {}
+        for i in range(360):
+            f = new_frame(["1"])
+            f["date"] = "2012-06-11 15:{0:02d}:{1:02d}".format(
+                i / 120, (i / 2) % 60)
+            frames[str(i)] = f
+        timelines = build_timelines(frames)
+        assert len(timelines["1"]) == 180
+        assert timelines["1"][:3] == [1, 3, 5]
+        assert timelines["60"] == [119, 239, 359]
+        assert timelines["3600"] == [359]
+
+
+    def test_timelines_no_reduction(self):
+        """Levels that would not hide any frames are left out"""
+        frames = self.numbered_frames(["1"], ["PRIMARY"] * 3)
+        timelines = build_timelines(frames)
+        assert not "1" in timelines
+        assert timelines["60"] == [2]
+
+
+    #------------------------------------------
+    # test the streaming versions of the above
+    #------------------------------------------
+
+
+    def test_iter_frames_lazy(self):
+        """iter_frames() builds each frame only when it is asked for"""
+        def events():
+            e = self.generate_event("1", "status",
+                {"state": "PRIMARY"}, ["1", "2"], [])
+            e["date"] = datetime(2012, 6, 11, 15, 0, 0)
+            e["summary"] = "1 is now PRIMARY"
+            yield e
+            raise Exception("read too far")
+        frames = iter_frames(events(), ["1", "2"])
+        f = next(frames)
+        assert f["servers"]["1"] == "PRIMARY"
+
+
+    def test_iter_frames_new_servers(self):
+        """Servers registered while events are matched are added
+        to the frames from the first event that mentions them"""
+        db = Connection()["test_frames"]
+        storage = Storage(db, "bubblegum")
+        storage.drop()
+        assign_address("1", "1.1.1.1:27017", False, storage.servers)
+        info = {"state": "SECONDARY", "state_code": 2,
+                "server": "2.2.2.2:27017"}
+        storage.entries.insert({"type": "status", "origin_server": "1",
+                                "date": datetime(2012, 6, 11, 15, 0, 0),
+                                "info": info})
+        servers = storage.servers.distinct("server_num")
+        frames = list(iter_frames(stream_events(storage), servers))
+        storage.drop()
+        assert servers == ["1"]
+        assert len(frames) == 1
+        assert frames[0]["servers"] == {"1": "UNDISCOVERED",
+                                        "2": "SECONDARY"}
+        assert frames[0]["links"] == {"1": [], "2": ["1"]}
+        assert frames[0]["server_count"] == 2
+
+
+    def timeline_events(self):
+        """A few events changing states, links and syncs"""
+        events = []
+        for target, type, more, w, d in [
+                ("1", "status", {"state": "PRIMARY"}, ["1", "2"], ["3"]),
+                ("2", "status", {"state": "SECONDARY"}, ["1", "2"], []),
+                ("2", "sync", {"sync_to": "1"}, ["2"], []),
+                ("3", "status", {"state": "SECONDARY"}, ["2", "3"], []),
+                ("3", "new_conn", {"conn_addr": "1.2.3.4",
+                                   "conn_number": "7"}, ["3"], []),
+                ("1", "status", {"state": "DOWN"}, ["2", "3"], ["1"]),
+                ("2", "status", {"state": "PRIMARY"}, ["2", "3"], [])]:
+            e = self.generate_event(target, type, more, w, d)
+            e["date"] = datetime(2012, 6, 11, 15, 0, len(events))
+            e["summary"] = "event {0}".format(len(events))
+            events.append(e)
+        return events
+
+
+    def test_iter_checkpoints(self):
+        """Each checkpoint holds the state of the frame before
+        its segment"""
+        servers = ["1", "2", "3"]
+        frames = list(iter_frames(self.timeline_events(), servers))
+        segments = list(iter_checkpoints(self.timeline_events(), servers, 3))
+        assert [len(s) for c, s in segments] == [3, 3, 1]
+        assert segments[0][0] == None
+        for i, (checkpoint, segment) in enumerate(segments[1:]):
+            last = frames[3 * i + 2]
+            assert checkpoint == dict((k, last[k]) for k in CARRIED)
+
+
+    def test_iter_parallel_frames(self):
+        """Frames expanded from checkpoints in several processes
+        are the same as frames generated one after another"""
+        servers = ["1", "2", "3"]
+        frames = list(iter_frames(self.timeline_events(), servers))
+        for size in [1, 3, 10]:
+            parallel = list(iter_parallel_frames(self.timeline_events(),
+                                                 servers, 2, size))
+            assert parallel == frames
+        assert list(iter_parallel_frames([], servers, 2)) == []
+
+
+    def test_iter_parallel_frames_new_servers(self):
+        """Servers first mentioned after the first segment reach
+        the checkpoints and frames of the later segments"""
+        servers = ["1", "2", "3"]
+        events = self.timeline_events()
+        for target, type, more, w, d in [
+                ("4", "status", {"state": "SECONDARY"}, ["2", "4"], []),
+                ("4", "sync", {"sync_to": "5"}, ["4"], []),
+                ("2", "status", {"state": "SECONDARY"}, ["2", "4"], [])]:
+            e = self.generate_event(target, type, more, w, d)
+            e["date"] = datetime(2012, 6, 11, 15, 0, len(events))
+            e["summary"] = "event {0}".format(len(events))
+            events.append(e)
+        frames = list(iter_frames(events, servers))
+        assert frames[-1]["servers"]["4"] == "SECONDARY"
+        assert frames[-1]["syncs"]["4"] == ["5"]
+        segments = list(iter_checkpoints(events, servers, 3))
+        assert "4" not in segments[2][0]["servers"]
+        assert segments[3][0]["servers"]["4"] == "SECONDARY"
+        assert segments[3][0]["servers"]["5"] == "UNDISCOVERED"
+        for size in [1, 3, 8]:
+            parallel = list(iter_parallel_frames(events, servers, 2, size))
+            assert parallel == frames
+
+
+    def test_iter_coalesced(self):
+        """iter_coalesced() merges the same frames as coalesce_frames()"""
+        states = ["PRIMARY", "PRIMARY", "SECONDARY", "PRIMARY", "PRIMARY"]
+        frames = self.numbered_frames(["1", "2"], states)
+        c = list(iter_coalesced(
+            self.numbered_frames(["1", "2"], states)[str(i)]
+            for i in range(len(states))))
+        assert c == [v for k, v in sorted(coalesce_frames(frames).items())]
+        assert list(iter_coalesced([])) == []
+
+
+    def test_topology_at(self):
+        """The state of the network at a date is that of the
+        last frame at or before it"""
+        frames = self.numbered_frames(["1", "2"], ["STARTUP2", "SECONDARY",
+                                                   "PRIMARY", "DOWN"])
+        frames["2"]["links"]["1"] = ["2"]
+        date = datetime(2012, 6, 11, 15, 0, 0)
+        assert topology_at(frames, datetime(2012, 6, 11, 14, 59, 59)) == None
+        t = topology_at(frames, date)
+        assert t["frame"] == 0
+        assert t["servers"]["1"] == "STARTUP2"
+        t = topology_at(frames, datetime(2012, 6, 11, 15, 0, 2))
+        assert t["frame"] == 2
+        assert t["date"] == "2012-06-11 15:00:02"
+        assert t["links"]["1"] == ["2"]
+        assert sorted(t) == ["broken_links", "date", "frame", "links",
+                             "servers", "syncs", "users"]
+        t = topology_at(frames, datetime(2012, 6, 12))
+        assert t["servers"]["1"] == "DOWN"
+        assert topology_at({}, date) == None
+
+
+    def test_timelines_from_dates(self):
+        """Timelines can be built from frame dates alone"""
+        frames = self.numbered_frames(["1"], ["PRIMARY"] * 3)
+        dates = [frame_date(frames[str(i)]) for i in range(3)]
+        assert timelines_from_dates(dates) == build_timelines(frames)
+
+
+    def test_stored_frames(self):
+        """Frames saved by store_frames() read back like a dictionary"""
+        frames = self.numbered_frames(["1", "2"], ["PRIMARY", "SECONDARY"])
+        coll = Connection()["test_frames"]["frames"]
+        stored = store_frames((frames[str(i)] for i in range(2)), coll)
+        assert len(stored) == 2
+        assert "1" in stored
+        assert not "2" in stored
+        assert stored["1"]["servers"]["1"] == "SECONDARY"
+        assert sorted(stored.keys()) == ["0", "1"]
+        assert [f["summary"] for f in stored.itervalues()] == \
+            ["event 0", "event 1"]
+        assert stored.dates() == [frame_date(frames["0"]),
+                                  frame_date(frames["1"])]
+        coll.drop()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/incident.py
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from edda.incident import *
+from edda.ui.frames import new_frame
+
+
+class test_incident(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.edda")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def frames(self, n):
+        """Generate n frames, one second apart"""
+        frames = []
+        for i in range(n):
+            f = new_frame(["1", "2"])
+            f["date"] = "2012-06-11 15:00:{0:02d}".format(i)
+            f["summary"] = "event " + str(i)
+            frames.append(f)
+        return frames
+
+    def test_round_trip(self):
+        """Frames, names and admin read back as they were written"""
+        frames = self.frames(20)
+        names = {"1": "sam:27017", "2": "frodo:27017"}
+        admin = {"name": "test", "timelines": {"60": [19]}}
+        assert write_incident(self.path, iter(frames), names, admin) == 20
+        assert is_incident(self.path)
+        read, read_names, read_admin = open_incident(self.path)
+        assert len(read) == 20
+        assert read_names == names
+        assert read_admin == admin
+        assert read["7"] == frames[7]
+        assert json.loads(read.raw("19")) == frames[19]
+        assert "19" in read
+        assert not "20" in read
+        assert not "x" in read
+        assert list(read.itervalues()) == frames
+        assert dict(read) == dict((str(i), f) for i, f in enumerate(frames))
+        read.close()
+
+    def test_empty(self):
+        """An incident with no frames"""
+        write_incident(self.path, [], {}, {})
+        frames, names, admin = open_incident(self.path)
+        assert len(frames) == 0
+        self.assertRaises(KeyError, frames.__getitem__, "0")
+        frames.close()
+
+    def test_not_an_incident(self):
+        """Other files are rejected"""
+        f = open(self.path, "w")
+        f.write('{"frames": {}}')
+        f.close()
+        assert not is_incident(self.path)
+        assert not is_incident(os.path.join(self.dir, "missing.edda"))
+        self.assertRaises(ValueError, open_incident, self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for ensure_indexes() in edda/supporting_methods.py
+
+import unittest
+
+from edda.supporting_methods import *
+from pymongo import Connection
+
+
+class test_indexes(unittest.TestCase):
+
+    def db_setup(self):
+        """Set up a database for use by tests"""
+        c = Connection()
+        db = c["test_indexes"]
+        servers = db["idx.servers"]
+        entries = db["idx.entries"]
+        db.drop_collection(servers)
+        db.drop_collection(entries)
+        return [servers, entries, db]
+
+    def test_entry_indexes(self):
+        """The entries indexes are created, and creating
+        them again changes nothing"""
+        servers, entries, db = self.db_setup()
+        names = ensure_indexes(entries, ENTRY_INDEXES)
+        assert len(names) == len(ENTRY_INDEXES)
+        info = entries.index_information()
+        for name in names:
+            assert name in info
+        assert info["origin_server_1_date_1"]["key"] == \
+            [("origin_server", 1), ("date", 1)]
+        assert ensure_indexes(entries, ENTRY_INDEXES) == names
+        assert len(entries.index_information()) == len(info)
+
+    def test_server_indexes(self):
+        """Servers are indexed by each of their names"""
+        servers, entries, db = self.db_setup()
+        ensure_indexes(servers, SERVER_INDEXES)
+        info = servers.index_information()
+        assert "server_num_1" in info
+        assert "self_name_1" in info
+        assert "network_name_1" in info
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import unittest
+
+from edda import instrumentation
+
+
+class test_instrumentation(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+
+    def test_stage_order(self):
+        """Stages are reported in the order they were first started"""
+        with instrumentation.stage("b"):
+            pass
+        with instrumentation.stage("a"):
+            pass
+        assert instrumentation.STAGES == ["b", "a"]
+
+    def test_stage_timing(self):
+        """A stage records non-negative wall and cpu times"""
+        with instrumentation.stage("ingest") as doc:
+            sum(range(10000))
+        assert doc["wall"] >= 0
+        assert doc["cpu"] >= 0
+        assert doc["peak_rss"] >= 0
+
+    def test_restart_stage(self):
+        """Restarting a stage adds to its totals"""
+        instrumentation.start_stage("ingest")
+        instrumentation.end_stage("ingest")
+        first = instrumentation.STATS["ingest"]["wall"]
+        instrumentation.start_stage("ingest")
+        instrumentation.end_stage("ingest")
+        assert instrumentation.STATS["ingest"]["wall"] >= first
+        assert instrumentation.STAGES == ["ingest"]
+
+    def test_end_without_start(self):
+        """Ending a stage that never started is harmless"""
+        instrumentation.end_stage("nothing")
+        assert not "nothing" in instrumentation.STATS
+
+    def test_threads(self):
+        """The same stage can run in several threads at once"""
+        started = threading.Event()
+        done = threading.Event()
+
+        def worker():
+            with instrumentation.stage("ingest"):
+                started.set()
+                done.wait()
+                instrumentation.count("ingest", "lines_read")
+        t = threading.Thread(target=worker)
+        t.start()
+        started.wait()
+        with instrumentation.stage("ingest"):
+            instrumentation.count("ingest", "lines_read")
+        done.set()
+        t.join()
+        assert instrumentation.RUNNING == {}
+        assert instrumentation.STATS["ingest"]["counters"]["lines_read"] == 2
+
+    def test_counters(self):
+        """Test count() and count_match()"""
+        instrumentation.count("ingest", "lines_read", 10)
+        instrumentation.count("ingest", "lines_read")
+        instrumentation.count_match("ingest", "rs_status")
+        instrumentation.count_match("ingest", "rs_status")
+        instrumentation.count_match("ingest", "rs_sync", 5, 0.25)
+        doc = instrumentation.STATS["ingest"]
+        assert doc["counters"]["lines_read"] == 11
+        assert doc["matches"]["rs_status"] == 2
+        assert doc["matches"]["rs_sync"] == 5
+        assert doc["filter_time"] == {"rs_sync": 0.25}
+
+    def test_observe(self):
+        """Latencies add up per operation"""
+        instrumentation.observe("ingest", "insert", 0.5, 10)
+        instrumentation.observe("ingest", "insert", 0.25)
+        assert instrumentation.STATS["ingest"]["latency"] == \
+            {"insert": {"count": 11, "seconds": 0.75}}
+        assert "insert latency" in instrumentation.report()
+
+    def test_running_stages(self):
+        """Only the stages running now are returned"""
+        with instrumentation.stage("ingest"):
+            pass
+        with instrumentation.stage("generate_frames"):
+            running = instrumentation.running_stages()
+        assert running.keys() == ["generate_frames"]
+        assert running["generate_frames"] >= 0
+        assert instrumentation.running_stages() == {}
+
+    def test_report(self):
+        """The report includes every stage, counter and filter"""
+        with instrumentation.stage("ingest"):
+            instrumentation.count("ingest", "documents_written", 3)
+            instrumentation.count_match("ingest", "rs_sync")
+        report = instrumentation.report()
+        assert "ingest" in report
+        assert "documents_written" in report
+        assert "matched by rs_sync" in report
+
+    def test_to_json(self):
+        """to_json() produces a list of stage documents"""
+        with instrumentation.stage("ingest"):
+            instrumentation.count("ingest", "lines_read", 5)
+        stages = json.loads(instrumentation.to_json())
+        assert len(stages) == 1
+        assert stages[0]["name"] == "ingest"
+        assert stages[0]["counters"]["lines_read"] == 5
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/json_stream.py
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from edda.json_stream import *
+from edda.ui.frames import new_frame
+from StringIO import StringIO
+
+
+class Output(StringIO):
+    """A StringIO that keeps its contents once closed,
+    and counts flushes"""
+    flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.contents = self.getvalue()
+
+
+def make_frames(n):
+    """Generate n frames, one second apart"""
+    frames = []
+    for i in range(n):
+        f = new_frame(["1", "2"])
+        f["date"] = "2012-06-11 15:00:{0:02d}".format(i)
+        f["summary"] = "event\n" + str(i)
+        frames.append(f)
+    return frames
+
+
+class test_json_stream(unittest.TestCase):
+
+    def write(self, frames, flush_every=FLUSH_EVERY):
+        out = Output()
+        writer = FrameWriter(out, flush_every)
+        assert list(writer.written(frames)) == frames
+        writer.close({"self_name": {"1": "sam"}}, {"version": "0.7.0"})
+        return out
+
+    def test_valid_json(self):
+        """The output is the same json document as before"""
+        frames = make_frames(5)
+        doc = json.loads(self.write(frames).contents)
+        assert doc["frames"] == dict((str(i), f) for i, f in enumerate(frames))
+        assert doc["names"] == {"self_name": {"1": "sam"}}
+        assert doc["admin"] == {"version": "0.7.0"}
+
+    def test_one_frame_per_line(self):
+        """Each frame is on its own line, and the file
+        is flushed as frames are written"""
+        out = self.write(make_frames(10), flush_every=4)
+        assert len(out.contents.splitlines()) == 1 + 10 + 2
+        assert out.flushes == 2
+
+    def test_round_trip(self):
+        """load() reads back what was written"""
+        frames = make_frames(5)
+        read, names, admin = load(StringIO(self.write(frames).contents))
+        assert read == dict((str(i), f) for i, f in enumerate(frames))
+        assert names == {"self_name": {"1": "sam"}}
+        assert admin == {"version": "0.7.0"}
+
+    def test_empty(self):
+        """A run with no frames"""
+        frames, names, admin = load(StringIO(self.write([]).contents))
+        assert frames == {}
+        assert admin == {"version": "0.7.0"}
+
+    def test_incomplete(self):
+        """Frames written before a crash can be recovered"""
+        frames = make_frames(5)
+        out = Output()
+        writer = FrameWriter(out)
+        for f in frames:
+            writer.write_frame(f)
+        read, names, admin = load(StringIO(out.getvalue()[:-20]))
+        assert read == dict((str(i), f) for i, f in enumerate(frames[:4]))
+        assert names == {}
+        assert admin == {}
+
+    def test_old_format(self):
+        """Files written all at once by json.dump() still load"""
+        frames = make_frames(3)
+        doc = {"frames": dict((str(i), f) for i, f in enumerate(frames)),
+               "names": {}, "admin": {"version": "0.6.1"}}
+        read, names, admin = load(StringIO(json.dumps(doc)))
+        assert read == doc["frames"]
+        assert admin == {"version": "0.6.1"}
+
+
+class test_json_frames(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, n):
+        frames = make_frames(n)
+        writer = FrameWriter(open(self.path, "w"))
+        for f in frames:
+            writer.write_frame(f)
+        writer.close({"self_name": {}}, {"version": "0.7.0"})
+        return frames
+
+    def test_open_json(self):
+        """Frames are found by offset and parsed when looked up"""
+        frames = self.write(12)
+        read, names, admin = open_json(self.path)
+        assert isinstance(read, JsonFrames)
+        assert len(read) == 12
+        assert admin == {"version": "0.7.0"}
+        assert read["0"] == frames[0]
+        assert read["11"] == frames[11]
+        assert json.loads(read.raw("5")) == frames[5]
+        assert not "12" in read
+        assert list(read.itervalues()) == frames
+        read.close()
+
+    def test_open_incomplete(self):
+        """Complete frames of an incomplete file can be opened"""
+        frames = self.write(6)
+        text = open(self.path).read()
+        f = open(self.path, "w")
+        f.write(text[:text.index(',"5"') + 10])
+        f.close()
+        read, names, admin = open_json(self.path)
+        assert len(read) == 5
+        assert read["4"] == frames[4]
+        assert admin == {}
+        read.close()
+
+    def test_open_old_format(self):
+        """Files written all at once are loaded as a dictionary"""
+        f = open(self.path, "w")
+        json.dump({"frames": {"0": {"summary": "x"}}, "names": {},
+                   "admin": {}}, f)
+        f.close()
+        read, names, admin = open_json(self.path)
+        assert read == {"0": {"summary": "x"}}
+
+if __name__ == '__main__':
+    unittest.main()
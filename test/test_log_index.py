@@ -0,0 +1,136 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/log_index.py
+
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from datetime import datetime
+from datetime import timedelta
+from edda.log_index import *
+from edda.supporting_methods import date_parser
+from edda.supporting_methods import gzip_size
+
+
+class test_log_index(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_log(self, name, n, gzipped=False):
+        """Write a log with one line per second for n seconds,
+        returning its path and contents"""
+        start = datetime(2012, 6, 11, 15, 0, 0)
+        lines = []
+        for i in range(n):
+            date = start + timedelta(seconds=i)
+            lines.append(date.strftime("%a %b %d %H:%M:%S") +
+                         " [conn1] line number {0}\n".format(i))
+        text = "".join(lines)
+        path = os.path.join(self.dir, name)
+        if gzipped:
+            f = gzip.open(path, "wb")
+        else:
+            f = open(path, "w")
+        f.write(text)
+        f.close()
+        return path, text
+
+    def build(self, path, text, every):
+        """Index every 'every'th line of text"""
+        index = new_index(path, every)
+        offset = 0
+        for i, line in enumerate(text.splitlines(True)):
+            if i % every == 0:
+                add_entry(index, date_parser(line), offset)
+            offset += len(line)
+        return index
+
+    def test_find_offset(self):
+        """find_offset() returns an indexed line before the date"""
+        path, text = self.write_log("1.log", 5000)
+        index = self.build(path, text, 100)
+        target = datetime(2012, 6, 11, 15, 30, 50)
+        offset = find_offset(index, target)
+        line = text[offset:].split("\n", 1)[0]
+        date = date_parser(line)
+        assert date < target
+        assert target - date <= timedelta(seconds=100)
+        # dates before the first entry start at the beginning
+        assert find_offset(index, datetime(2012, 1, 1)) == 0
+
+    def test_save_and_load(self):
+        """A saved index loads back with the same entries"""
+        path, text = self.write_log("1.log", 2000)
+        index = self.build(path, text, 100)
+        assert save_index(path, index)
+        assert os.path.exists(index_path(path))
+        loaded = load_index(path)
+        assert loaded
+        assert loaded["entries"] == index["entries"]
+        assert loaded["dates"] == index["dates"]
+
+    def test_missing_index(self):
+        """load_index() returns None if there is no index"""
+        path, text = self.write_log("1.log", 10)
+        assert load_index(path) == None
+
+    def test_stale_index(self):
+        """An index is ignored once its log file changes"""
+        path, text = self.write_log("1.log", 2000)
+        save_index(path, self.build(path, text, 100))
+        f = open(path, "a")
+        f.write("Mon Jun 11 16:00:00 [conn1] one more line\n")
+        f.close()
+        assert load_index(path) == None
+
+    def test_corrupt_index(self):
+        """An unreadable index is ignored"""
+        path, text = self.write_log("1.log", 10)
+        f = open(index_path(path), "w")
+        f.write("{not json")
+        f.close()
+        assert load_index(path) == None
+
+    def test_gzipped_seek(self):
+        """Offsets into gzipped logs count uncompressed bytes"""
+        path, text = self.write_log("1.log.gz", 3000, True)
+        assert gzip_size(path) == len(text)
+        index = self.build(path, text, 100)
+        offset = find_offset(index, datetime(2012, 6, 11, 15, 40, 0))
+        f = gzip.open(path, "r")
+        f.seek(offset)
+        assert f.readline() == text[offset:].split("\n", 1)[0] + "\n"
+        f.close()
+
+    def test_gzip_size_wrapped(self):
+        """A gzipped size that wrapped around below the size of
+        the file falls back to the size of the file"""
+        path, text = self.write_log("1.log.gz", 3000, True)
+        f = open(path, "r+b")
+        f.seek(-4, 2)
+        f.write(struct.pack("<I", 10))
+        f.close()
+        assert gzip_size(path) == os.path.getsize(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/metrics.py
+
+import unittest
+
+from edda import instrumentation
+from edda import metrics
+
+
+class test_metrics(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+        metrics.SOURCES.clear()
+
+    def tearDown(self):
+        metrics.SOURCES.clear()
+
+    def samples(self):
+        """The sample lines of render(), without comments"""
+        return [line for line in metrics.render().splitlines()
+                if not line.startswith("#")]
+
+    def test_stages(self):
+        """Stages give their counters, rates and latencies"""
+        with instrumentation.stage("ingest"):
+            instrumentation.count("ingest", "lines_read", 10)
+            instrumentation.observe("ingest", "insert", 0.5, 4)
+        samples = self.samples()
+        assert 'edda_stage_running{stage="ingest"} 0' in samples
+        assert ('edda_stage_items_total{counter="lines_read",'
+                'stage="ingest"} 10') in samples
+        assert [s for s in samples if s.startswith(
+            'edda_stage_items_per_second{counter="lines_read"')]
+        assert ('edda_latency_seconds_count{operation="insert",'
+                'stage="ingest"} 4') in samples
+        assert ('edda_latency_seconds_sum{operation="insert",'
+                'stage="ingest"} 0.5') in samples
+
+    def test_running(self):
+        """The stage running now is marked"""
+        with instrumentation.stage("generate_frames"):
+            samples = self.samples()
+        assert 'edda_stage_running{stage="generate_frames"} 1' in samples
+
+    def test_families(self):
+        """Each family is described once, before its samples"""
+        with instrumentation.stage("ingest"):
+            instrumentation.observe("ingest", "insert", 0.5)
+        lines = metrics.render().splitlines()
+        assert lines.count("# TYPE edda_latency_seconds summary") == 1
+        i = lines.index("# TYPE edda_latency_seconds summary")
+        assert lines[i + 1].startswith("edda_latency_seconds_count")
+        assert "# TYPE edda_resident_memory_bytes gauge" in lines
+
+    def test_sources(self):
+        """Sources add samples until they are removed"""
+        metrics.add_source("queues", lambda: [
+            ("edda_queue_depth", {"queue": "a \"b\""}, 3)])
+        metrics.add_source("filters", lambda: metrics.filter_samples(
+            [{"name": "rs_sync", "matches": 2, "time": 0.25}]))
+        samples = self.samples()
+        assert 'edda_queue_depth{queue="a \\"b\\""} 3' in samples
+        assert 'edda_filter_matches_total{filter="rs_sync"} 2' in samples
+        assert 'edda_filter_seconds_total{filter="rs_sync"} 0.25' in samples
+        metrics.remove_source("queues")
+        assert not [s for s in self.samples()
+                    if s.startswith("edda_queue_depth")]
+
+    def test_non_ascii_labels(self):
+        """Label values may be unicode or UTF-8 byte strings,
+        and the body is valid UTF-8"""
+        metrics.add_source("queues caf\xc3\xa9", lambda: [
+            ("edda_queue_depth", {"run": u"caf\xe9"}, 1),
+            ("edda_queue_depth", {"run": "th\xc3\xa9"}, 2)])
+        body = metrics.render().encode("utf-8")
+        lines = body.decode("utf-8").splitlines()
+        assert u'edda_queue_depth{run="caf\xe9"} 1' in lines
+        assert u'edda_queue_depth{run="th\xe9"} 2' in lines
+
+    def test_failing_source(self):
+        """A failing source does not stop the others"""
+        metrics.add_source("broken", lambda: 1 / 0)
+        assert [s for s in self.samples()
+                if s.startswith("edda_resident_memory_bytes")]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@
 import unittest #organizing servers uses the supporting methods module and is going to have the same import problem that replacing clock skew has. TO BE FIXED.
 from edda.post.event_matchup import organize_servers
 from edda.run_edda import assign_address
+from edda.storage import Storage
 import pymongo
 import logging
 from datetime import *
@@ -50,7 +51,7 @@ class test_organizing_servers(unittest.TestCase):
         assign_address(self, 1, "apple", servers)
         assign_address(self, 2, "pear", servers)
 
-        organized_servers = organize_servers(db, "fruit")
+        organized_servers = organize_servers(Storage(db, "fruit"))
         logger.debug("Organized servers Printing: {}".format(organized_servers))
         for server_name in organized_servers:
             logger.debug("Server Name: {}".format(server_name))
@@ -85,7 +86,7 @@ class test_organizing_servers(unittest.TestCase):
         servers.insert(self.generate_server_doc("status", "pear", "STARTUP2"
             "", 5, "apple", original_date + timedelta(seconds=6)))
 
-        organized_servers = organize_servers(db, "fruit")
+        organized_servers = organize_servers(Storage(db, "fruit"))
         logger.debug("Organized servers Printing: {}".format(organized_servers))
         for server_name in organized_servers:
             logger.debug("Server Name: {}".format(server_name))
@@ -128,7 +129,7 @@ class test_organizing_servers(unittest.TestCase):
         servers.insert(self.generate_server_doc(
             "status", "pear", "STARTUP2", 5, "apple", original_date))
 
-        organized_servers = organize_servers(db, "fruit")
+        organized_servers = organize_servers(Storage(db, "fruit"))
         logger.debug("Organized servers Printing: {}".format(organized_servers))
         for server_name in organized_servers:
             logger.debug("Server Name: {}".format(server_name))
@@ -17,6 +17,7 @@ import unittest #replacing clock skew uses supporting methods, so there is the p
 
 from edda.post.replace_clock_skew import replace_clock_skew
 from edda.supporting_methods import assign_address
+from edda.storage import Storage
 from datetime import *
 from pymongo import Connection #The tests fail, but this module is not currently used. 
 
@@ -54,7 +55,7 @@ class test_replacing_clock_skew(unittest.TestCase):
         doc1["partners"]["5"]["0"] = 5
         clock_skew.insert(doc1)
 
-        replace_clock_skew(db, "fruit")
+        replace_clock_skew(Storage(db, "fruit"))
 
         docs = entries.find({"origin_server": "apple"})
         for doc in docs:
@@ -92,7 +93,7 @@ class test_replacing_clock_skew(unittest.TestCase):
         clock_skew.insert(doc1)
 
         clock_skew.insert(doc1)
-        replace_clock_skew(db, "fruit")
+        replace_clock_skew(Storage(db, "fruit"))
 
         docs = entries.find({"origin_server": "apple"})
         for doc in docs:
@@ -148,7 +149,7 @@ class test_replacing_clock_skew(unittest.TestCase):
         doc1["partners"]["4"][neg_skew] = weight
         doc1["partners"]["5"][neg_skew] = weight
         clock_skew.insert(doc1)
-        replace_clock_skew(db, "fruit")
+        replace_clock_skew(Storage(db, "fruit"))
         docs = entries.find({"origin_server": "plum"})
         for doc in docs:
             logger.debug("Original Date: {}".format(doc["date"]))
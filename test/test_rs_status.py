@@ -43,6 +43,29 @@ class test_rs_status(unittest.TestCase):
         assert criteria("replSet member is now in state REMOVED") == 10
         return
 
+    def test_criteria_false_positives(self):
+        """State names outside of a replSet status message
+        do not match"""
+        assert criteria("Mon Jun 11 15:56:16 [conn4] run command "
+            "admin.$cmd { replSetStepDown: 60 } SECONDARY") < 0
+        assert criteria("Mon Jun 11 15:56:16 [rsMgr] "
+            "replSet info electSelf 1 PRIMARY") < 0
+        assert criteria("Mon Jun 11 15:56:16 [conn4] DOWN the hall") < 0
+        assert criteria("Mon Jun 11 15:56:16 [rsHealthPoll] replSet "
+            "member localhost:27019 is now in state SECONDARY, "
+            "or so it says") < 0
+
+    def test_match(self):
+        """test that match() extracts state and address at once"""
+        assert match("Mon Jun 11 15:56:16 [rsStart] "
+            "replSet I am localhost:27018") == (0, "localhost:27018")
+        assert match("Mon Jun 11 15:56:16 [rsStart] replSet I am") == (0, None)
+        assert match("Mon Jun 11 15:56:58 [rsHealthPoll] replSet member "
+            "localhost:27017 is now in state DOWN") == (8, "localhost:27017")
+        assert match("Mon Jun 11 15:57:04 [rsMgr] replSet PRIMARY") == (1, None)
+        assert match("Mon Jun 11 15:56:18 [rsHealthPoll] "
+            "replSet member localhost:27019 is up") == None
+
     def test_process(self):
         """test the process() method of this module"""
         date = datetime.now()
@@ -0,0 +1,90 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for server_num allocation in edda/supporting_methods.py
+
+import threading
+import unittest
+
+from edda.storage import Storage
+from edda.supporting_methods import *
+from pymongo import Connection
+
+
+class test_server_num(unittest.TestCase):
+
+    def setUp(self):
+        self.run = Storage(Connection()["test_server_num"], "zoo")
+        self.run.drop()
+        self.servers = self.run.servers
+
+    def tearDown(self):
+        self.run.drop()
+
+    def test_new_servers(self):
+        """New servers are numbered from 1, known ones keep their number"""
+        assert get_server_num("a:27017", False, self.servers) == "1"
+        assert get_server_num("b:27017", True, self.servers) == "2"
+        assert get_server_num("a:27017", False, self.servers) == "1"
+        assert get_server_num("b:27017", True, self.servers) == "2"
+        assert get_server_num("unknown", False, self.servers) == "3"
+
+    def test_many_servers(self):
+        """There is no limit on the number of servers"""
+        for i in range(1, 201):
+            addr = "host{0}:27017".format(i)
+            assert get_server_num(addr, False, self.servers) == str(i)
+        assert self.servers.find().count() == 200
+
+    def test_assigned_servers(self):
+        """Numbers assigned without the counter are not handed out again"""
+        assign_address("1", "a:27017", False, self.servers)
+        assign_address("2", "b:27017", False, self.servers)
+        assert get_server_num("c:27017", False, self.servers) == "3"
+        assert get_server_num("d:27017", False, self.servers) == "4"
+
+    def test_added_meanwhile(self):
+        """An address stored by another worker while a number was
+        allocated for it keeps the stored number"""
+        import edda.supporting_methods as methods
+        allocate = methods.next_server_num
+
+        def racing_allocate(servers):
+            num = allocate(servers)
+            assign_address(allocate(servers), "a:27017", False, servers)
+            return num
+        methods.next_server_num = racing_allocate
+        try:
+            assert get_server_num("a:27017", False, self.servers) == "2"
+        finally:
+            methods.next_server_num = allocate
+        assert self.servers.find({"network_name": "a:27017"}).count() == 1
+        assert not self.servers.find_one({"server_num": "1"})
+
+    def test_threads(self):
+        """Workers allocating at once never share a number"""
+        nums = []
+
+        def allocate():
+            for i in range(50):
+                nums.append(next_server_num(self.servers))
+        workers = [threading.Thread(target=allocate) for i in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        assert sorted(nums, key=int) == [str(i) for i in range(1, 201)]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for edda/storage.py
+
+import unittest
+
+from edda.storage import *
+from pymongo import Connection
+
+
+class test_storage(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Connection()["test_storage"]
+        self.run = Storage(self.db, "fruit")
+        self.run.drop()
+
+    def tearDown(self):
+        self.run.drop()
+
+    def test_collections(self):
+        """Collections are named after the run, and reused"""
+        assert self.run.servers.name == "fruit.servers"
+        assert self.run.entries.name == "fruit.entries"
+        assert self.run.clock_skew.name == "fruit.clock_skew"
+        assert self.run.frames.name == "fruit.frames"
+        assert self.run.entries is self.run.entries
+
+    def test_write_concern(self):
+        """Writes are acknowledged, as other connections read them"""
+        assert self.w(self.run.servers) == 1
+        assert self.w(self.run.clock_skew) == 1
+        assert self.w(self.run.entries) == 1
+        assert self.w(self.run.frames) == 1
+
+    def w(self, coll):
+        """The 'w' option of a collection's write concern, which
+        pymongo gives as a dictionary"""
+        concern = coll.write_concern
+        return getattr(concern, "document", concern).get("w")
+
+    def test_run(self):
+        """Other runs share the database, but not its collections"""
+        other = self.run.run("vegetables")
+        assert other.db is self.db
+        assert other.entries.name == "vegetables.entries"
+
+    def test_drop(self):
+        """Dropping a run drops each of its collections"""
+        self.run.servers.insert({"server_num": "1"})
+        self.run.collection("servers.counter").insert({"n": 1})
+        self.run.entries.insert({"origin_server": "1"})
+        other = self.run.run("vegetables")
+        other.entries.insert({"origin_server": "1"})
+        self.run.drop()
+        assert self.run.servers.find_one() == None
+        assert self.run.collection("servers.counter").find_one() == None
+        assert self.run.entries.find_one() == None
+        assert other.entries.find_one() != None
+        other.drop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Copyright 2012 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# testing file for the --since, --until and --servers options
+
+import unittest
+
+from datetime import datetime
+from datetime import timedelta
+from edda.run_edda import identify_server
+from edda.run_edda import server_selected
+from edda.supporting_methods import *
+from StringIO import StringIO
+
+
+class test_time_window(unittest.TestCase):
+
+    def generate_log(self, n):
+        """Generate a log with one line per second for n seconds,
+        starting at Jun 11 23:50:00"""
+        start = datetime(2012, 6, 11, 23, 50, 0)
+        lines = []
+        for i in range(n):
+            date = start + timedelta(seconds=i)
+            lines.append(date.strftime("%a %b %d %H:%M:%S") +
+                         " [conn1] line number {0}\n".format(i))
+        return "".join(lines)
+
+    def test_date_parser_day_of_month(self):
+        """Dates use the day of the month, not the day of the week"""
+        assert date_parser("Mon Jun 11 15:56:16 [rsStart] replSet I am") == \
+            datetime(2012, 6, 11, 15, 56, 16)
+        assert date_parser("Mon Jul  2 10:00:11 [conn2] command") == \
+            datetime(2012, 7, 2, 10, 0, 11)
+
+    def test_parse_date_arg(self):
+        """Test parse_date_arg() on valid and invalid dates"""
+        date = datetime(2012, 6, 11, 15, 56, 16)
+        assert parse_date_arg("Jun 11 15:56:16") == date
+        assert parse_date_arg("Mon Jun 11 15:56:16") == date
+        assert parse_date_arg("Jul 2 10:00:11") == datetime(2012, 7, 2, 10, 0, 11)
+        assert parse_date_arg("Jun 11") == None
+        assert parse_date_arg("Foo 11 15:56:16") == None
+        assert parse_date_arg("Jun 11 15:56") == None
+        assert parse_date_arg("") == None
+
+    def test_seek_to_date(self):
+        """seek_to_date() lands at or just before the first line
+        of the window, across a change of day"""
+        text = self.generate_log(20000)
+        f = StringIO(text)
+        target = datetime(2012, 6, 12, 1, 0, 0)
+        offset = seek_to_date(f, target, len(text))
+        assert offset > 0
+        # we are at the start of a line
+        assert text[offset - 1] == "\n"
+        line = f.readline()
+        assert date_parser(line) <= target
+        # and within one search block of the target
+        for line in f:
+            if date_parser(line) >= target:
+                break
+        assert f.tell() - offset <= 4096 + 2 * len(line) + 8192
+
+    def test_seek_before_start(self):
+        """Seeking to a date before the log starts stays at 0"""
+        text = self.generate_log(10000)
+        f = StringIO(text)
+        assert seek_to_date(f, datetime(2012, 1, 1), len(text)) == 0
+
+    def test_seek_after_end(self):
+        """Seeking to a date after the log ends goes near the end"""
+        text = self.generate_log(10000)
+        f = StringIO(text)
+        offset = seek_to_date(f, datetime(2012, 12, 1), len(text))
+        assert len(text) - offset <= 4096 + 100
+
+    def test_identify_server(self):
+        """Test identify_server() with startup and rs_status messages"""
+        f = StringIO("Mon Jun 11 15:56:16 [conn1] nothing here\n"
+                     "Mon Jun 11 15:56:16 [initandlisten] MongoDB starting :"
+                     " pid=1 port=27018 dbpath=/data 64-bit host=sam\n")
+        assert identify_server(f) == ("sam:27018", True)
+        assert f.tell() == 0
+        f = StringIO("Mon Jun 11 15:56:16 [rsStart] replSet I am "
+                     "10.4.65.7:27018\n")
+        assert identify_server(f) == ("10.4.65.7:27018", False)
+        f = StringIO("Mon Jun 11 15:56:16 [conn1] nothing here\n")
+        assert identify_server(f) == None
+
+    def test_server_selected(self):
+        """Test server_selected() with addresses and file names"""
+        selected = ["sam:27018", "2.log"]
+        assert server_selected("logs/1.log", ("sam:27018", True), selected)
+        assert server_selected("logs/1.log", ("SAM:27018", True), selected)
+        assert not server_selected("logs/1.log", ("kristina:27018", True), selected)
+        assert server_selected("logs/2.log", ("kristina:27018", True), selected)
+        assert server_selected("logs/3.log", None, ["sam:27018"])
+
+if __name__ == '__main__':
+    unittest.main()